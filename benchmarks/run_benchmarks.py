@@ -0,0 +1,512 @@
+"""
+基准测试
+启动本地桩服务器（模拟 GitHub 与通义千问），对不同规模的合成仓库测量：
+- /analyze 端到端延迟（首次分析与缓存命中）
+- 推送修改少量文件的新提交后再次分析（增量分析）的延迟与出站请求数
+- get_repo_structure / generate_dependency_data / generate_code_quality_data 等阶段的耗时
+- 按类型统计的出站请求数与下载字节数
+- 进程峰值内存（RSS，含解析子进程）
+- 响应大小（JSON 与列式格式，原始与 gzip）
+- /api/explain-code 的延迟
+- 工作进程的启动开销：导入 app 的耗时与 RSS、预热（加载延迟导入的依赖并创建客户端）的耗时与 RSS
+每个场景在独立的子进程中运行，缓存目录为新建的临时目录，保证每次都是冷启动。
+结果写入 benchmarks/results/，compare 子命令对比两次运行。
+
+    python benchmarks/run_benchmarks.py run --sizes 100,1000,10000 --latency 0.02
+    python benchmarks/run_benchmarks.py startup --repeat 10             # 只测量启动开销
+    python benchmarks/run_benchmarks.py run --sizes 100000 --mode archive
+    python benchmarks/run_benchmarks.py compare                  # 对比最近两次运行
+    python benchmarks/run_benchmarks.py compare A.json B.json
+"""
+import argparse
+import datetime
+import functools
+import gzip
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'src', 'backend')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+OWNER = 'bench'
+
+# 计时的分析函数，按 app 模块中的名称替换为计时包装
+TIMED_FUNCTIONS = [
+    'get_repo_info', 'get_repo_structure', 'get_local_structure', 'generate_dependency_data',
+    'generate_code_quality_data', 'generate_mermaid_chart', 'generate_mermaid_chart_with_ai', 'compute_graph_layout'
+]
+
+# compare 输出的指标：(名称, 取值函数)
+COMPARE_METRICS = [
+    ('cold_ms', lambda s: s['analyze']['cold_ms']),
+    ('warm_ms', lambda s: s['analyze']['warm_ms']),
+    ('reanalyze_ms', lambda s: (s.get('reanalyze') or {}).get('ms')),
+    ('reanalyze_calls', lambda s: ((s.get('reanalyze') or {}).get('outbound') or {}).get('total')),
+    ('structure_ms', lambda s: s['stages'].get('get_repo_structure', s['stages'].get('get_local_structure'))),
+    ('dependency_ms', lambda s: s['stages'].get('generate_dependency_data')),
+    ('quality_ms', lambda s: s['stages'].get('generate_code_quality_data')),
+    ('layout_ms', lambda s: s['stages'].get('compute_graph_layout')),
+    ('calls', lambda s: s['outbound']['total']),
+    ('peak_rss_mb', lambda s: s['memory']['peak_rss_mb']),
+    ('json_gzip_kb', lambda s: s['payload']['json_gzip_bytes'] / 1024),
+    ('compact_gzip_kb', lambda s: s['payload']['compact_gzip_bytes'] / 1024),
+    ('explain_ms', lambda s: s['explain']['ms']),
+]
+
+
+# compare 输出的启动指标
+STARTUP_METRICS = ['import_ms', 'import_rss_mb', 'warm_up_ms', 'warm_rss_mb']
+
+# 启动时是否加载的依赖，导入 app 后记录其中已加载的模块
+HEAVY_MODULES = ['openai', 'httpx', 'requests', 'numpy', 'flask']
+
+
+def stub_request(stub_url, path, method='GET'):
+    request = urllib.request.Request(f"{stub_url}{path}", method=method, data=b'{}' if method == 'POST' else None)
+    with urllib.request.urlopen(request, timeout=600) as resp:
+        return json.loads(resp.read())
+
+
+def peak_rss_mb():
+    """本进程与已结束子进程（解析进程池）的峰值 RSS（MB）"""
+    scale = 1024 if sys.platform != 'darwin' else 1
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return round(own / 1024 / 1024, 1), round(children / 1024 / 1024, 1)
+
+
+def current_rss_mb():
+    """本进程当前的 RSS（MB），没有 /proc 时使用峰值"""
+    try:
+        with open('/proc/self/statm') as f:
+            return round(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024, 1)
+    except (OSError, ValueError):
+        return peak_rss_mb()[0]
+
+
+def instrument(module, names):
+    """将模块中的函数替换为计时包装，返回记录耗时（毫秒）的字典"""
+    timings = {}
+    lock = threading.Lock()
+
+    def wrap(name, fn):
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    timings[name] = round(timings.get(name, 0) + elapsed, 1)
+        return timed
+
+    for name in names:
+        if hasattr(module, name):
+            setattr(module, name, wrap(name, getattr(module, name)))
+    return timings
+
+
+def timed_post(client, path, body, headers=None):
+    start = time.perf_counter()
+    response = client.post(path, json=body, headers=headers or {})
+    data = response.get_data()
+    return response, data, round((time.perf_counter() - start) * 1000, 1)
+
+
+def run_scenario(args):
+    """在当前（子）进程中运行一个场景，返回结果字典；环境变量由父进程设置"""
+    from synthetic_repo import SyntheticRepo
+
+    sys.path.insert(0, BACKEND_DIR)
+    start = time.perf_counter()
+    import app as backend
+    import_ms = round((time.perf_counter() - start) * 1000, 1)
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+
+    repo = SyntheticRepo(args.size, args.depth, args.fanout, args.seed)
+    if args.mode == 'local':
+        body = {'path': os.path.join(os.environ['LOCAL_REPO_ROOTS'], repo.name)}
+        explain_body = {'repo_path': body['path']}
+    else:
+        body = {'url': f"https://github.com/{OWNER}/{repo.name}"}
+        explain_body = {'repo_url': body['url']}
+    body['useAi'] = args.ai
+
+    timings = instrument(backend, TIMED_FUNCTIONS)
+    client = backend.app.test_client()
+
+    stub_request(args.stub, '/__reset', 'POST')
+    response, data, cold_ms = timed_post(client, '/analyze', body)
+    if response.status_code != 200:
+        raise RuntimeError(f"/analyze 返回 {response.status_code}: {data[:500]!r}")
+    outbound = stub_request(args.stub, '/__stats')
+    result = json.loads(data)
+
+    _, _, warm_ms = timed_post(client, '/analyze', body)
+    compact_headers = {'Accept': 'application/vnd.repo-analyzer.compact+json'}
+    compact_response, compact, _ = timed_post(client, '/analyze', body, compact_headers)
+
+    stub_request(args.stub, '/__reset', 'POST')
+    explain_response, _, explain_ms = timed_post(
+        client, '/api/explain-code', dict(explain_body, file_path=repo.largest_source()))
+    explain_calls = stub_request(args.stub, '/__stats')
+
+    # 推送修改少量文件的新提交后再次分析；本地目录无法推送，不测量
+    reanalyze = None
+    if args.mode != 'local' and args.push_changes > 0:
+        stub_request(args.stub, f"/__push?repo={repo.name}&changes={args.push_changes}", 'POST')
+        try:
+            stub_request(args.stub, '/__reset', 'POST')
+            reanalyze_response, reanalyze_data, reanalyze_ms = timed_post(client, '/analyze', body)
+            reanalyze = {
+                'status': reanalyze_response.status_code,
+                'changes': args.push_changes,
+                'ms': reanalyze_ms,
+                'degraded': json.loads(reanalyze_data).get('degraded', []),
+                'outbound': stub_request(args.stub, '/__stats')
+            }
+        finally:
+            stub_request(args.stub, f"/__push?repo={repo.name}&revisions=0", 'POST')
+
+    own_rss, children_rss = peak_rss_mb()
+    dependency = result.get('dependencyData') or {}
+    return {
+        'mode': args.mode,
+        'size': args.size,
+        'depth': args.depth,
+        'fanout': args.fanout,
+        'seed': args.seed,
+        'ai': args.ai,
+        'files': len(repo.paths),
+        'dirs': len(repo.dirs),
+        'import_ms': import_ms,
+        'analyze': {
+            'cold_ms': cold_ms,
+            'warm_ms': warm_ms,
+            'degraded': result.get('degraded', []),
+            'nodes': len(dependency.get('nodes', [])),
+            'links': len(dependency.get('links', [])),
+            'truncated': bool((result.get('fileStructure') or {}).get('truncated'))
+        },
+        'stages': timings,
+        'outbound': outbound,
+        'memory': {'peak_rss_mb': own_rss, 'children_peak_rss_mb': children_rss},
+        'payload': {
+            'json_bytes': len(data),
+            'json_gzip_bytes': len(gzip.compress(data)),
+            'compact_bytes': len(compact),
+            'compact_gzip_bytes': len(gzip.compress(compact)),
+            'compact_content_type': compact_response.headers.get('Content-Type')
+        },
+        'explain': {
+            'status': explain_response.status_code,
+            'ms': explain_ms,
+            'outbound': explain_calls
+        },
+        'reanalyze': reanalyze
+    }
+
+
+def run_startup_probe():
+    """在当前（子）进程中导入 app 并同步预热，返回启动耗时与内存；环境变量由父进程设置"""
+    sys.path.insert(0, BACKEND_DIR)
+    interpreter_rss = current_rss_mb()
+    start = time.perf_counter()
+    import app as backend
+    import_ms = round((time.perf_counter() - start) * 1000, 1)
+    import_rss = current_rss_mb()
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    start = time.perf_counter()
+    backend.warm_up()
+    return {
+        'import_ms': import_ms,
+        'import_rss_mb': import_rss,
+        'warm_up_ms': round((time.perf_counter() - start) * 1000, 1),
+        'warm_rss_mb': current_rss_mb(),
+        'interpreter_rss_mb': interpreter_rss,
+        'loaded_at_import': loaded
+    }
+
+
+def startup_env(args, cache_dir, stub_url=''):
+    env = dict(os.environ)
+    env.update({
+        'GITHUB_API_URL': stub_url or 'http://127.0.0.1:9',
+        'DASHSCOPE_BASE_URL': f"{stub_url or 'http://127.0.0.1:9'}/v1",
+        'DASHSCOPE_API_KEY': 'bench',
+        'CACHE_DIR': cache_dir,
+        'PYTHONPATH': os.pathsep.join([BENCH_DIR, BACKEND_DIR])
+    })
+    for item in args.env:
+        key, _, value = item.partition('=')
+        env[key] = value
+    return env
+
+
+def measure_startup(args, workdir, repeat, stub_url=''):
+    """在 repeat 个新进程中分别测量启动开销，返回各指标的中位数和每次的结果"""
+    samples = []
+    for attempt in range(repeat):
+        cache_dir = tempfile.mkdtemp(prefix='startup-', dir=workdir)
+        command = [sys.executable, os.path.abspath(__file__), 'startup-probe']
+        completed = subprocess.run(command, env=startup_env(args, cache_dir, stub_url), capture_output=True,
+                                   text=True, timeout=120)
+        if completed.returncode != 0:
+            print(completed.stderr[-4000:], file=sys.stderr)
+            raise RuntimeError(f"启动测量失败（退出码 {completed.returncode}）")
+        samples.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    summary = {}
+    for name in STARTUP_METRICS:
+        values = sorted(sample[name] for sample in samples)
+        summary[name] = values[len(values) // 2]
+    summary['loaded_at_import'] = samples[-1]['loaded_at_import']
+    summary['samples'] = samples
+    print(f"启动：导入 {summary['import_ms']} ms（RSS {summary['import_rss_mb']} MB），"
+          f"预热 {summary['warm_up_ms']} ms（RSS {summary['warm_rss_mb']} MB），"
+          f"导入时加载 {summary['loaded_at_import']}", file=sys.stderr, flush=True)
+    return summary
+
+
+def startup(args):
+    workdir = tempfile.mkdtemp(prefix='repo-analyzer-startup-')
+    try:
+        summary = measure_startup(args, workdir, args.repeat)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps({name: value for name, value in summary.items() if name != 'samples'}, ensure_ascii=False))
+    return 0
+
+
+def start_stub(args):
+    """在子进程中启动桩服务器，返回 (进程, 地址)"""
+    command = [sys.executable, os.path.join(BENCH_DIR, 'stub_server.py'), '--latency', str(args.latency),
+               '--chat-latency', str(args.chat_latency), '--token-delay', str(args.token_delay)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True, cwd=BENCH_DIR)
+    return process, process.stdout.readline().strip()
+
+
+def scenario_env(args, stub_url, cache_dir, local_root, size):
+    env = dict(os.environ)
+    env.update({
+        'GITHUB_API_URL': stub_url,
+        'GITHUB_RAW_URL': f"{stub_url}/raw",
+        'GITHUB_TOKEN': '',
+        'GITHUB_TOKENS': '',
+        'DASHSCOPE_BASE_URL': f"{stub_url}/v1",
+        'DASHSCOPE_API_KEY': 'bench',
+        'CACHE_DIR': cache_dir,
+        'INGEST_MODE': 'archive' if args.mode == 'archive' else 'api',
+        'LOCAL_REPO_ROOTS': local_root,
+        'MAX_FILES': str(args.max_files or max(size, 10000)),
+        'PYTHONPATH': os.pathsep.join([BENCH_DIR, BACKEND_DIR])
+    })
+    for item in args.env:
+        key, _, value = item.partition('=')
+        env[key] = value
+    return env
+
+
+def warm_stub(stub_url, args, repo_name):
+    """预先生成桩服务器中的合成仓库（和归档包），避免生成时间计入测量"""
+    stub_request(stub_url, f"/repos/{OWNER}/{repo_name}")
+    if args.mode == 'archive':
+        with urllib.request.urlopen(f"{stub_url}/repos/{OWNER}/{repo_name}/tarball/main", timeout=600) as resp:
+            resp.read()
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(args):
+    from synthetic_repo import SyntheticRepo
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    stub, stub_url = start_stub(args)
+    workdir = tempfile.mkdtemp(prefix='repo-analyzer-bench-')
+    scenarios = []
+    startup_summary = None
+    try:
+        if args.startup_repeat > 0:
+            startup_summary = measure_startup(args, workdir, args.startup_repeat, stub_url)
+        for size in sizes:
+            repo = SyntheticRepo(size, args.depth, args.fanout, args.seed)
+            local_root = os.path.join(workdir, 'repos')
+            if args.mode == 'local':
+                repo.write_to(local_root)
+            else:
+                warm_stub(stub_url, args, repo.name)
+
+            for attempt in range(args.repeat):
+                cache_dir = tempfile.mkdtemp(prefix='cache-', dir=workdir)
+                command = [sys.executable, os.path.abspath(__file__), 'scenario', '--stub', stub_url,
+                           '--size', str(size), '--depth', str(args.depth), '--fanout', str(args.fanout),
+                           '--seed', str(args.seed), '--mode', args.mode,
+                           '--push-changes', str(args.push_changes)] + (['--ai'] if args.ai else [])
+                print(f"[{args.mode}] {size} 个文件，第 {attempt + 1}/{args.repeat} 次...", file=sys.stderr, flush=True)
+                completed = subprocess.run(command, env=scenario_env(args, stub_url, cache_dir, local_root, size),
+                                           capture_output=True, text=True, timeout=args.timeout)
+                if completed.returncode != 0:
+                    print(completed.stderr[-4000:], file=sys.stderr)
+                    raise RuntimeError(f"场景 {size} 运行失败（退出码 {completed.returncode}）")
+                scenario = json.loads(completed.stdout.strip().splitlines()[-1])
+                scenario['repeat'] = attempt
+                scenarios.append(scenario)
+                print(f"  首次 {scenario['analyze']['cold_ms']} ms，缓存命中 {scenario['analyze']['warm_ms']} ms，"
+                      f"出站请求 {scenario['outbound']['total']} 次，峰值内存 {scenario['memory']['peak_rss_mb']} MB",
+                      file=sys.stderr, flush=True)
+                reanalyze = scenario.get('reanalyze')
+                if reanalyze:
+                    print(f"  新提交后再次分析 {reanalyze['ms']} ms，出站请求 {reanalyze['outbound']['total']} 次",
+                          file=sys.stderr, flush=True)
+    finally:
+        stub.terminate()
+        stub.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    revision = git_revision()
+    stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'revision': revision,
+            'label': args.label,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'latency': args.latency,
+            'chat_latency': args.chat_latency,
+            'env': args.env
+        },
+        'startup': startup_summary,
+        'scenarios': scenarios
+    }
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"{stamp}-{revision}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(path)
+    return 0
+
+
+def load_report(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def summarize(report):
+    """按 (模式, 规模) 汇总各指标，多次重复取中位数"""
+    groups = {}
+    for scenario in report['scenarios']:
+        groups.setdefault((scenario['mode'], scenario['size']), []).append(scenario)
+    summary = {}
+    for key, scenarios in groups.items():
+        metrics = {}
+        for name, getter in COMPARE_METRICS:
+            values = sorted(v for v in (getter(s) for s in scenarios) if v is not None)
+            metrics[name] = values[len(values) // 2] if values else None
+        summary[key] = metrics
+    return summary
+
+
+def compare(args):
+    paths = args.reports
+    if not paths:
+        paths = sorted(os.path.join(args.output, name) for name in os.listdir(args.output) if name.endswith('.json'))[-2:]
+    if len(paths) != 2:
+        print('需要两份结果进行对比', file=sys.stderr)
+        return 1
+
+    reports = [load_report(path) for path in paths]
+    base, head = (summarize(report) for report in reports)
+    print(f"基准: {os.path.basename(paths[0])}\n对比: {os.path.basename(paths[1])}\n")
+    print(f"{'场景':<16}{'指标':<18}{'基准':>12}{'对比':>12}{'变化':>10}")
+
+    def row(label, name, old, new):
+        change = f"{(new - old) / old * 100:+.1f}%" if old and new is not None else '-'
+        fmt = lambda v: '-' if v is None else f"{v:.1f}"
+        print(f"{label:<16}{name:<18}{fmt(old):>12}{fmt(new):>12}{change:>10}")
+
+    old_startup, new_startup = (report.get('startup') or {} for report in reports)
+    if old_startup or new_startup:
+        for name in STARTUP_METRICS:
+            row('startup', name, old_startup.get(name), new_startup.get(name))
+    for key in sorted(set(base) | set(head)):
+        for name, _ in COMPARE_METRICS:
+            row(f"{key[0]}/{key[1]}", name, base.get(key, {}).get(name), head.get(key, {}).get(name))
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='仓库分析接口的基准测试')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_repo_args(p):
+        p.add_argument('--depth', type=int, default=4, help='合成仓库的最大目录深度')
+        p.add_argument('--fanout', type=int, default=8, help='每个目录最多的子目录数')
+        p.add_argument('--seed', type=int, default=0, help='随机种子')
+        p.add_argument('--mode', choices=['api', 'archive', 'local'], default='api',
+                       help='仓库获取方式：api（Git Trees + raw）、archive（归档包）或 local（本地目录）')
+        p.add_argument('--ai', action='store_true', help='项目结构图通过模型接口生成')
+        p.add_argument('--push-changes', type=int, default=5, help='增量分析场景中新提交修改的文件数，0 表示不测量')
+
+    run_parser = subparsers.add_parser('run', help='运行基准测试并保存结果')
+    run_parser.add_argument('--sizes', default='100,1000,10000', help='合成仓库的文件数，逗号分隔')
+    run_parser.add_argument('--repeat', type=int, default=1, help='每个规模重复的次数')
+    run_parser.add_argument('--latency', type=float, default=0.02, help='GitHub 请求的模拟延迟（秒）')
+    run_parser.add_argument('--chat-latency', type=float, default=0.2, help='模型接口的模拟延迟（秒）')
+    run_parser.add_argument('--token-delay', type=float, default=0.0, help='流式响应分片之间的间隔（秒）')
+    run_parser.add_argument('--max-files', type=int, default=0, help='MAX_FILES，默认不小于仓库文件数')
+    run_parser.add_argument('--timeout', type=float, default=1800, help='单个场景的超时时间（秒）')
+    run_parser.add_argument('--env', action='append', default=[], help='传给被测进程的环境变量，KEY=VALUE')
+    run_parser.add_argument('--label', default='', help='本次运行的说明')
+    run_parser.add_argument('--output', default=RESULTS_DIR, help='结果目录')
+    run_parser.add_argument('--startup-repeat', type=int, default=5, help='测量启动开销的进程数，0 表示不测量')
+    add_repo_args(run_parser)
+
+    startup_parser = subparsers.add_parser('startup', help='只测量工作进程的启动开销')
+    startup_parser.add_argument('--repeat', type=int, default=5, help='测量的进程数，取中位数')
+    startup_parser.add_argument('--env', action='append', default=[], help='传给被测进程的环境变量，KEY=VALUE')
+
+    subparsers.add_parser('startup-probe', help=argparse.SUPPRESS)
+
+    compare_parser = subparsers.add_parser('compare', help='对比两次运行的结果')
+    compare_parser.add_argument('reports', nargs='*', help='两份结果文件，默认为结果目录中最近的两份')
+    compare_parser.add_argument('--output', default=RESULTS_DIR, help='结果目录')
+
+    scenario_parser = subparsers.add_parser('scenario', help=argparse.SUPPRESS)
+    scenario_parser.add_argument('--stub', required=True)
+    scenario_parser.add_argument('--size', type=int, required=True)
+    add_repo_args(scenario_parser)
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        return run(args)
+    if args.command == 'compare':
+        return compare(args)
+    if args.command == 'startup':
+        return startup(args)
+    if args.command == 'startup-probe':
+        print(json.dumps(run_startup_probe(), ensure_ascii=False))
+        return 0
+    print(json.dumps(run_scenario(args), ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
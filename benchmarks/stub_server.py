@@ -0,0 +1,358 @@
+"""
+基准测试桩服务器
+在本地模拟 GitHub REST API（仓库元数据、提交、Git Trees、contents、blobs、tarball/zipball）、
+raw.githubusercontent.com（路径前缀 /raw）和 OpenAI 兼容的 /v1/chat/completions 接口。
+仓库内容由 synthetic_repo 按仓库名生成，不依赖外部网络。
+
+GET /orgs/synth-org-{数量}-{文件数}/repos 列出该数量的合成仓库（种子依次为 0、1、2……），
+GET /users/synth-user-{数量}-{文件数}/repos 相同，用于批量分析接口。
+
+每类请求可以配置固定延迟；GET /__stats 返回各类请求的次数和响应字节数，POST /__reset 清零。
+POST /__push?repo=名称&changes=5&added=0&revisions=1 模拟向仓库推送新提交：仓库变为初始提交之后
+连续 revisions 次提交（每次修改 changes 个文件、新增 added 个文件）的状态，revisions=0 时恢复初始提交。
+
+    python benchmarks/stub_server.py --port 8900 --latency 0.05 --chat-latency 0.5
+"""
+import argparse
+import base64
+import hashlib
+import json
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+from synthetic_repo import SyntheticRepo
+
+TREE_TRUNCATE_LIMIT = 100000  # 与 GitHub 一致，递归树超过该条目数时返回 truncated
+CHAT_CHUNK_CHARS = 16  # 流式响应每个分片的字符数
+OWNER_PATTERN = re.compile(r'^synth-(?P<scope>org|user)-(?P<count>\d+)-(?P<files>\d+)$')
+
+ROUTES = [
+    ('repo', re.compile(r'^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)$')),
+    ('commit', re.compile(r'^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/commits/(?P<ref>[^/]+)$')),
+    ('tree', re.compile(r'^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/git/trees/(?P<sha>[^/]+)$')),
+    ('blob', re.compile(r'^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/git/blobs/(?P<sha>[^/]+)$')),
+    ('contents', re.compile(r'^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/contents/(?P<path>.+)$')),
+    ('archive', re.compile(r'^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/(?P<kind>tarball|zipball)/(?P<ref>[^/]+)$')),
+    ('raw', re.compile(r'^/raw/(?P<owner>[^/]+)/(?P<repo>[^/]+)/(?P<ref>[^/]+)/(?P<path>.+)$')),
+    ('owner_repos', re.compile(r'^/(?P<scope>orgs|users)/(?P<owner>[^/]+)/repos$')),
+]
+
+
+class StubState:
+    """桩服务器的共享状态：合成仓库缓存、延迟配置和请求统计"""
+
+    def __init__(self, latency, raw_latency, archive_latency, chat_latency, token_delay):
+        self.latency = {
+            'repo': latency, 'commit': latency, 'tree': latency, 'blob': latency, 'contents': latency,
+            'archive': archive_latency, 'raw': raw_latency, 'chat': chat_latency, 'owner_repos': latency
+        }
+        self.token_delay = token_delay
+        self.repos = {}
+        self.archives = {}
+        self.requests = Counter()
+        self.bytes = Counter()
+        self._lock = threading.Lock()
+        self._repo_locks = {}
+
+    def repo(self, name):
+        """按仓库名获取合成仓库，同一仓库只生成一次"""
+        with self._lock:
+            lock = self._repo_locks.setdefault(name, threading.Lock())
+        with lock:
+            if name not in self.repos:
+                self.repos[name] = SyntheticRepo.from_name(name)
+            return self.repos[name]
+
+    def push(self, name, changes, added, revisions):
+        """将仓库设置为初始提交之后 revisions 次提交的状态，返回新的提交 SHA"""
+        base = SyntheticRepo.from_name(name)
+        if base is None:
+            return None
+        repo = SyntheticRepo(base.files, base.depth, base.fanout, base.seed, ((changes, added),) * revisions)
+        with self._lock:
+            self.repos[name] = repo
+        return repo.commit
+
+    def archive(self, owner, repo, fmt):
+        with self._lock:
+            lock = self._repo_locks.setdefault(f"{repo.name}.{fmt}", threading.Lock())
+        with lock:
+            key = (owner, repo.name, repo.commit, fmt)
+            if key not in self.archives:
+                self.archives[key] = repo.archive(owner, fmt)
+            return self.archives[key]
+
+    def record(self, kind, size):
+        with self._lock:
+            self.requests[kind] += 1
+            self.bytes[kind] += size
+
+    def stats(self):
+        with self._lock:
+            return {'requests': dict(self.requests), 'bytes': dict(self.bytes),
+                    'total': sum(self.requests.values())}
+
+    def reset(self):
+        with self._lock:
+            self.requests.clear()
+            self.bytes.clear()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, kind, body, content_type='application/json', status=200, headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+        elif isinstance(body, str):
+            body = body.encode()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if kind != 'raw' and self.headers.get('If-None-Match') == etag:
+            # 条件请求命中，与 GitHub 一致返回 304 且不计入配额
+            status, body = 304, b''
+        if kind != 'stats':
+            self.state.record(kind, len(body))
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if kind != 'raw' and kind != 'chat':
+            self.send_header('ETag', etag)
+            self.send_header('X-RateLimit-Limit', '5000')
+            self.send_header('X-RateLimit-Remaining', '4999')
+            self.send_header('X-RateLimit-Reset', str(int(time.time()) + 3600))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def not_found(self, kind='other'):
+        self.send_body(kind, {'message': 'Not Found'}, status=404)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/__stats':
+            return self.send_body('stats', self.state.stats())
+
+        for kind, pattern in ROUTES:
+            match = pattern.match(url.path)
+            if match:
+                break
+        else:
+            return self.not_found()
+
+        time.sleep(self.state.latency[kind])
+        params = match.groupdict()
+        query = parse_qs(url.query)
+        if kind == 'owner_repos':
+            return self.get_owner_repos(params, query)
+        repo = self.state.repo(params['repo'])
+        if repo is None:
+            return self.not_found(kind)
+        getattr(self, f"get_{kind}")(repo, params, query)
+
+    def get_repo(self, repo, params, query):
+        owner = params['owner']
+        self.send_body('repo', {
+            'name': repo.name,
+            'full_name': f"{owner}/{repo.name}",
+            'owner': {'login': owner},
+            'description': f"合成仓库，{repo.files} 个文件",
+            'language': 'Python',
+            'stargazers_count': 0,
+            'forks_count': 0,
+            'created_at': '2024-01-01T00:00:00Z',
+            'updated_at': '2024-01-01T00:00:00Z',
+            'html_url': f"https://github.com/{owner}/{repo.name}",
+            'default_branch': 'main'
+        })
+
+    def get_owner_repos(self, params, query):
+        owner = params['owner']
+        match = OWNER_PATTERN.match(owner)
+        if match is None or match['scope'] != params['scope'][:-1]:
+            return self.not_found('owner_repos')
+        per_page = int(query.get('per_page', ['30'])[0])
+        page = int(query.get('page', ['1'])[0])
+        start = (page - 1) * per_page
+        seeds = range(start, min(start + per_page, int(match['count'])))
+        # 与 SyntheticRepo 的默认深度和分支数一致，只生成名称，仓库在首次访问时才构建
+        names = [f"synth-{match['files']}-d4-f8-s{seed}" for seed in seeds]
+        self.send_body('owner_repos', [{'name': name, 'full_name': f"{owner}/{name}"} for name in names])
+
+    def get_commit(self, repo, params, query):
+        self.send_body('commit', repo.commit, content_type='text/plain')
+
+    def get_tree(self, repo, params, query):
+        sha = unquote(params['sha'])
+        directory = '' if sha in (repo.commit, 'main', 'HEAD') else repo.tree_paths.get(sha)
+        if directory is None:
+            return self.not_found('tree')
+        if query.get('recursive'):
+            entries = repo.tree_entries()
+            if directory:
+                prefix = f"{directory}/"
+                entries = [dict(e, path=e['path'][len(prefix):]) for e in entries if e['path'].startswith(prefix)]
+            truncated = len(entries) > TREE_TRUNCATE_LIMIT
+            entries = entries[:TREE_TRUNCATE_LIMIT]
+        else:
+            entries, truncated = repo.tree_entries(directory), False
+        self.send_body('tree', {'sha': sha, 'tree': entries, 'truncated': truncated})
+
+    def get_blob(self, repo, params, query):
+        path = repo.blob_paths.get(params['sha'])
+        if path is None:
+            return self.not_found('blob')
+        self.send_body('blob', repo.content(path), content_type='application/vnd.github.raw')
+
+    def get_contents(self, repo, params, query):
+        path = unquote(params['path'])
+        if path not in repo.blobs:
+            return self.not_found('contents')
+        sha, size = repo.blobs[path]
+        self.send_body('contents', {
+            'type': 'file',
+            'name': path.rsplit('/', 1)[-1],
+            'path': path,
+            'sha': sha,
+            'size': size,
+            'encoding': 'base64',
+            'content': base64.b64encode(repo.content(path)).decode()
+        })
+
+    def get_archive(self, repo, params, query):
+        fmt = 'zip' if params['kind'] == 'zipball' else 'tar'
+        body = self.state.archive(params['owner'], repo, fmt)
+        self.send_body('archive', body, content_type='application/x-gzip' if fmt == 'tar' else 'application/zip')
+
+    def get_raw(self, repo, params, query):
+        path = unquote(params['path'])
+        if path not in repo.blobs:
+            return self.not_found('raw')
+        self.send_body('raw', repo.content(path), content_type='text/plain; charset=utf-8')
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = json.loads(self.rfile.read(length) or b'{}')
+
+        if url.path == '/__reset':
+            self.state.reset()
+            return self.send_body('stats', {'ok': True})
+        if url.path == '/__push':
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            commit = self.state.push(query.get('repo', ''), int(query.get('changes', 5)), int(query.get('added', 0)),
+                                     int(query.get('revisions', 1)))
+            if commit is None:
+                return self.not_found('stats')
+            return self.send_body('stats', {'commit': commit})
+        if not url.path.endswith('/chat/completions'):
+            return self.not_found()
+
+        time.sleep(self.state.latency['chat'])
+        content = self.chat_reply(payload)
+        if payload.get('stream'):
+            return self.stream_chat(payload, content)
+        self.send_body('chat', {
+            'id': 'chatcmpl-bench',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': payload.get('model', 'bench'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': self.chat_usage(payload, content)
+        })
+
+    @staticmethod
+    def chat_usage(payload, content):
+        """按字符数粗略估算令牌用量"""
+        prompt_tokens = sum(len(str(m.get('content', ''))) for m in payload.get('messages', [])) // 2
+        completion_tokens = len(content) // 2
+        return {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens}
+
+    def chat_reply(self, payload):
+        prompt = ''.join(str(m.get('content', '')) for m in payload.get('messages', []))
+        if 'Mermaid' in prompt:
+            return 'flowchart TD\n    node1["仓库"] --> node2["src"]\n    style node1 fill:#f9f,stroke:#333,stroke-width:2px'
+        return f"## 代码功能\n\n这是一段模拟的代码解释，输入共 {len(prompt)} 个字符。\n\n" + '- 要点\n' * 20
+
+    def stream_chat(self, payload, content):
+        """以 SSE 分片返回，分片之间按 token_delay 间隔"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        size = 0
+        for start in range(0, len(content), CHAT_CHUNK_CHARS):
+            chunk = {
+                'id': 'chatcmpl-bench',
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': payload.get('model', 'bench'),
+                'choices': [{'index': 0, 'delta': {'content': content[start:start + CHAT_CHUNK_CHARS]},
+                             'finish_reason': None}]
+            }
+            data = f"data: {json.dumps(chunk)}\n\n".encode()
+            size += len(data)
+            self.wfile.write(data)
+            self.wfile.flush()
+            time.sleep(self.state.token_delay)
+        if (payload.get('stream_options') or {}).get('include_usage'):
+            # 与 OpenAI 一致：最后一个分片不含 choices，只携带令牌用量
+            chunk = {'id': 'chatcmpl-bench', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                     'model': payload.get('model', 'bench'), 'choices': [], 'usage': self.chat_usage(payload, content)}
+            data = f"data: {json.dumps(chunk)}\n\n".encode()
+            size += len(data)
+            self.wfile.write(data)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.state.record('chat', size)
+
+
+class StubServer(ThreadingHTTPServer):
+    # 默认的监听队列只有 5，高并发客户端同时建立连接时会被丢弃并等待 TCP 重传
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+def create_server(port=0, latency=0.0, raw_latency=None, archive_latency=None, chat_latency=0.0, token_delay=0.0):
+    """创建桩服务器（未启动），port 为 0 时随机选择端口"""
+    state = StubState(latency, latency if raw_latency is None else raw_latency,
+                      latency if archive_latency is None else archive_latency, chat_latency, token_delay)
+    handler = type('BoundStubHandler', (StubHandler,), {'state': state})
+    return StubServer(('127.0.0.1', port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='GitHub / 通义千问接口的本地桩服务器')
+    parser.add_argument('--port', type=int, default=0, help='监听端口，0 表示随机选择')
+    parser.add_argument('--latency', type=float, default=0.0, help='GitHub API 请求的固定延迟（秒）')
+    parser.add_argument('--raw-latency', type=float, default=None, help='raw 文件下载的延迟，默认同 --latency')
+    parser.add_argument('--archive-latency', type=float, default=None, help='归档包下载的延迟，默认同 --latency')
+    parser.add_argument('--chat-latency', type=float, default=0.0, help='模型接口首个响应的延迟（秒）')
+    parser.add_argument('--token-delay', type=float, default=0.0, help='流式响应分片之间的间隔（秒）')
+    args = parser.parse_args()
+
+    server = create_server(args.port, args.latency, args.raw_latency, args.archive_latency,
+                           args.chat_latency, args.token_delay)
+    # 第一行输出监听地址，供启动方读取
+    print(f"http://127.0.0.1:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""
+合成仓库模块
+按文件数、目录深度和扇出确定性地生成仓库：目录树、带仓库内导入语句的 Python/JS 源码、Git 对象 SHA 和归档包。
+桩服务器据此模拟 GitHub，也可以写入磁盘用于本地仓库分析。相同的参数总是生成相同的仓库。
+advance() 模拟新的提交：修改部分文件、新增文件，只有受影响目录的 tree SHA 发生变化，用于测量增量分析。
+"""
+import hashlib
+import io
+import os
+import posixpath
+import random
+import re
+import tarfile
+import time
+import zipfile
+
+# 文件类型及其权重
+LANGUAGES = [('.py', 40), ('.js', 20), ('.ts', 10), ('.md', 10), ('.json', 8), ('.css', 6), ('.txt', 6)]
+FILES_PER_DIR = 10  # 平均每个目录的文件数，决定生成的目录数
+EDITABLE_EXTENSIONS = {'.py': '# ', '.js': '// ', '.ts': '// ', '.md': '', '.txt': ''}  # 新提交可以修改的文件类型及追加行的前缀
+THIRD_PARTY = {'.py': ['requests', 'numpy', 'flask'], '.js': ['react', 'lodash', 'd3'], '.ts': ['react', 'rxjs']}
+
+NAME_PATTERN = re.compile(r'^synth-(\d+)-d(\d+)-f(\d+)-s(\d+)$')
+
+
+def git_sha(kind, data):
+    """计算 Git 对象的 SHA-1"""
+    return hashlib.sha1(f"{kind} {len(data)}\0".encode() + data).hexdigest()
+
+
+class SyntheticRepo:
+    """合成仓库
+
+    files 为文件数，depth 为最大目录深度，fanout 为每个目录的最多子目录数，seed 决定随机选择。
+    仓库名编码了全部参数，桩服务器可以只凭仓库名重建同一个仓库。
+    history 为初始提交之后的各次提交 [(修改的文件数, 新增的文件数)]，不影响仓库名。
+    """
+
+    def __init__(self, files, depth=4, fanout=8, seed=0, history=()):
+        self.files = files
+        self.depth = depth
+        self.fanout = fanout
+        self.seed = seed
+        self.history = tuple(history)
+        self.name = f"synth-{files}-d{depth}-f{fanout}-s{seed}"
+        self._build()
+        # 初始提交的 SHA 只由仓库名决定，之后的提交还取决于文件树
+        self.commit = hashlib.sha1(self.name.encode()).hexdigest() if not self.history else \
+            hashlib.sha1(f"{self.name}:{self.tree_shas['']}".encode()).hexdigest()
+
+    @classmethod
+    def from_name(cls, name):
+        """按仓库名重建仓库，名称不是合成仓库时返回 None"""
+        match = NAME_PATTERN.match(name)
+        if not match:
+            return None
+        return cls(*(int(group) for group in match.groups()))
+
+    def advance(self, changes, added=0):
+        """返回下一次提交后的仓库：修改 changes 个已有文件，新增 added 个 Python 模块"""
+        return SyntheticRepo(self.files, self.depth, self.fanout, self.seed, self.history + ((changes, added),))
+
+    def _build(self):
+        rng = random.Random(self.seed)
+
+        # 按广度优先生成目录，直到目录数足够或达到最大深度
+        dirs = ['']
+        frontier = ['']
+        target_dirs = max(1, self.files // FILES_PER_DIR)
+        for level in range(self.depth):
+            next_frontier = []
+            for parent in frontier:
+                for i in range(rng.randint(1, self.fanout)):
+                    if len(dirs) >= target_dirs:
+                        break
+                    path = posixpath.join(parent, f"pkg_{level}_{i}")
+                    dirs.append(path)
+                    next_frontier.append(path)
+            frontier = next_frontier
+            if len(dirs) >= target_dirs or not frontier:
+                break
+
+        extensions = [ext for ext, _ in LANGUAGES]
+        weights = [weight for _, weight in LANGUAGES]
+        paths = ['requirements.txt', 'package.json', 'README.md']
+        for i in range(max(self.files - len(paths), 0)):
+            directory = rng.choice(dirs)
+            paths.append(posixpath.join(directory, f"module_{i}{rng.choices(extensions, weights)[0]}"))
+        self.paths = sorted(paths[:self.files])
+        self.dirs = sorted(d for d in dirs if d)
+        # 导入语句只引用初始提交中的模块，新增文件不会改变已有文件的内容
+        self.python_modules = [p for p in self.paths if p.endswith('.py')]
+        self.js_modules = [p for p in self.paths if p.endswith(('.js', '.ts'))]
+
+        # 依次应用之后的提交，revisions 记录每个文件最后一次被修改的提交序号
+        self.revisions = {}
+        for revision, (changes, added) in enumerate(self.history, 1):
+            rng = random.Random(f"{self.seed}:revision:{revision}")
+            editable = [p for p in self.paths if posixpath.splitext(p)[1] in EDITABLE_EXTENSIONS]
+            for path in rng.sample(editable, min(changes, len(editable))):
+                self.revisions[path] = revision
+            for i in range(added):
+                self.paths.append(posixpath.join(rng.choice(dirs), f"module_r{revision}_{i}.py"))
+        self.paths.sort()
+
+        # 文件内容按需生成，只保存大小和 SHA
+        self.blobs = {}
+        for path in self.paths:
+            data = self.content(path)
+            self.blobs[path] = (git_sha('blob', data), len(data))
+        self.blob_paths = {sha: path for path, (sha, _) in self.blobs.items()}
+
+        # 每个目录的直接子项，按名称排序；tree SHA 自底向上由子项计算，只有内容变化的目录 SHA 才会变化
+        self.children = {d: [] for d in [''] + self.dirs}
+        for path in self.paths:
+            sha, size = self.blobs[path]
+            self.children[posixpath.dirname(path)].append(
+                {'path': posixpath.basename(path), 'mode': '100644', 'type': 'blob', 'sha': sha, 'size': size})
+        self.tree_shas = {}
+        for d in sorted(self.dirs, key=lambda d: d.count('/'), reverse=True) + ['']:
+            children = self.children[d]
+            children.sort(key=lambda entry: entry['path'])
+            listing = ''.join(f"{entry['type']} {entry['path']} {entry['sha']}\n" for entry in children)
+            self.tree_shas[d] = git_sha('tree', listing.encode('utf-8'))
+            if d:
+                self.children[posixpath.dirname(d)].append(
+                    {'path': posixpath.basename(d), 'mode': '040000', 'type': 'tree', 'sha': self.tree_shas[d]})
+        self.tree_paths = {sha: d for d, sha in self.tree_shas.items()}
+
+    def content(self, path):
+        """生成文件内容（字节串）"""
+        rng = random.Random(f"{self.seed}:{path}")
+        ext = posixpath.splitext(path)[1]
+        revision = self.revisions.get(path)
+        if revision:
+            return self._base_content(rng, path, ext) + f"{EDITABLE_EXTENSIONS[ext]}revision {revision}\n".encode()
+        return self._base_content(rng, path, ext)
+
+    def _base_content(self, rng, path, ext):
+        if path == 'requirements.txt':
+            return ''.join(f"{name}\n" for name in THIRD_PARTY['.py']).encode()
+        if path == 'package.json':
+            deps = ', '.join(f'"{name}": "*"' for name in THIRD_PARTY['.js'] + THIRD_PARTY['.ts'])
+            return f'{{"name": "{self.name}", "dependencies": {{{deps}}}}}\n'.encode()
+        if ext == '.py':
+            return self._python_source(rng, path).encode()
+        if ext in ('.js', '.ts'):
+            return self._js_source(rng, path, ext).encode()
+        if ext == '.json':
+            return f'{{"key": {rng.randint(0, 1000)}, "items": [{", ".join(str(rng.randint(0, 9)) for _ in range(20))}]}}\n'.encode()
+        if ext == '.css':
+            return ''.join(f".class-{i} {{ color: #{rng.randrange(0xffffff):06x}; }}\n" for i in range(rng.randint(3, 30))).encode()
+        return ''.join(f"Line {i} of {posixpath.basename(path)}\n" for i in range(rng.randint(3, 50))).encode()
+
+    def _python_source(self, rng, path):
+        lines = [f'"""合成模块 {path}"""', 'import os']
+        for target in rng.sample(self.python_modules, min(rng.randint(0, 4), len(self.python_modules))):
+            if target != path:
+                module = target[:-3].replace('/', '.')
+                package, _, name = module.rpartition('.')
+                lines.append(f"from {package} import {name}" if package else f"import {name}")
+        if rng.random() < 0.3:
+            lines.append(f"import {rng.choice(THIRD_PARTY['.py'])}")
+        for i in range(rng.randint(1, 20)):
+            lines += ['', '', f"def func_{i}(x):"]
+            nesting = rng.randint(0, 4)
+            for depth in range(nesting):
+                lines.append(f"{'    ' * (depth + 1)}{rng.choice(['if x > 0:', 'for i in range(x):', 'while x > 10:'])}")
+            lines.append(f"{'    ' * (nesting + 1)}x = x // {rng.randint(2, 9)} + os.getpid()")
+            lines.append('    return x')
+        return '\n'.join(lines) + '\n'
+
+    def _js_source(self, rng, path, ext):
+        lines = [f"// 合成模块 {path}"]
+        directory = posixpath.dirname(path)
+        for target in rng.sample(self.js_modules, min(rng.randint(0, 4), len(self.js_modules))):
+            if target != path:
+                relative = posixpath.relpath(target, directory or '.')
+                if not relative.startswith('.'):
+                    relative = f"./{relative}"
+                lines.append(f"import dep{len(lines)} from '{relative}';")
+        if rng.random() < 0.3:
+            lines.append(f"import lib from '{rng.choice(THIRD_PARTY[ext])}';")
+        for i in range(rng.randint(1, 20)):
+            lines.append(f"export function func{i}(x) {{")
+            for _ in range(rng.randint(0, 4)):
+                lines.append(f"  {rng.choice(['if (x > 0) { x++; }', 'for (let i = 0; i < x; i++) { x--; }', 'x = x && x % 3;'])}")
+            lines.append('  return x;')
+            lines.append('}')
+        return '\n'.join(lines) + '\n'
+
+    def tree_entries(self, directory=None):
+        """Git Trees API 格式的条目：directory 为 None 时返回全部条目（递归），否则返回该目录的直接子项"""
+        if directory is None:
+            entries = [dict(entry, path=posixpath.join(d, entry['path']))
+                       for d, children in self.children.items() for entry in children]
+            entries.sort(key=lambda entry: entry['path'])
+            return entries
+        return self.children.get(directory, [])
+
+    def largest_source(self):
+        """最大的 Python 源文件路径，用于代码解释的基准测试"""
+        return max(self.python_modules or self.paths, key=lambda path: self.blobs[path][1])
+
+    def archive(self, owner, fmt='tar'):
+        """生成 GitHub 风格的归档包（顶层目录为 {owner}-{repo}-{sha前7位}/）"""
+        prefix = f"{owner}-{self.name}-{self.commit[:7]}/"
+        buffer = io.BytesIO()
+        now = time.time()
+        if fmt == 'zip':
+            with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for d in self.dirs:
+                    archive.writestr(f"{prefix}{d}/", b'')
+                for path in self.paths:
+                    archive.writestr(prefix + path, self.content(path))
+        else:
+            with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+                for d in [''] + self.dirs:
+                    info = tarfile.TarInfo(prefix + d)
+                    info.type = tarfile.DIRTYPE
+                    info.mtime = now
+                    archive.addfile(info)
+                for path in self.paths:
+                    data = self.content(path)
+                    info = tarfile.TarInfo(prefix + path)
+                    info.size = len(data)
+                    info.mtime = now
+                    archive.addfile(info, io.BytesIO(data))
+        return buffer.getvalue()
+
+    def write_to(self, root):
+        """将仓库写入磁盘目录 root/{仓库名}，返回该目录"""
+        base = os.path.join(root, self.name)
+        for path in self.paths:
+            full = os.path.join(base, *path.split('/'))
+            os.makedirs(os.path.dirname(full), exist_ok=True)
+            with open(full, 'wb') as f:
+                f.write(self.content(path))
+        return base
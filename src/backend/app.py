@@ -1,18 +1,39 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, request, jsonify, render_template, send_from_directory, Response, stream_with_context, g
 import os
 import json
 import re
 import time
-import requests
+import threading
 from urllib.parse import urlparse
-from github import Github
-from github import Auth
 import logging
-import random
-import networkx as nx
-import openai
 from dotenv import load_dotenv
-import httpx
+from tree_ingest import fetch_repo_tree, build_file_tree, list_tree_level
+from tree_index import TreeIndex, TreePathNotFound
+from caching import MemoryCache, SqliteCache, create_cache
+from github_client import get_repo, resolve_commit_sha, repo_cache, fetch_raw_files, fetch_repo_archive, \
+    get_contents, get_git_blob, get_scheduler, github_breaker, github_raw_breaker, is_upstream_unavailable, is_not_found, \
+    list_owner_repos, get_async_client
+from github_scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, set_priority, reset_priority
+from local_ingest import LocalRepo, LocalRepoError
+from mermaid_chart import build_mermaid_chart, describe_tree
+from resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, call_timeout, remaining_time, set_deadline, reset_deadline
+from async_runtime import iterate_async, loop_resource, run_async, submit_async
+from jobs import JobManager
+from batch import BatchStore, run_batch
+from stages import Stage, mark_incomplete, run_stage_graph
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+from chunking import estimate_tokens, split_code
+from import_graph import PARSE_CACHE_VERSION, is_source_file, parse_cache, parse_sources, resolve_import_edges
+from code_metrics import METRICS_CACHE_VERSION, compute_file_metrics, is_metrics_file, metrics_cache
+from incremental import AnalysisBase
+from compact_format import COMPACT_MIMETYPE, MSGPACK_MIMETYPE, encode_payload, serialize, compress
+from telemetry import REGISTRY, SIZE_BUCKETS, observe_upstream, record_timing, server_timing_header, \
+    start_server_timing, reset_server_timing
+from functools import partial
+import base64
+import hashlib
+import importlib
 
 # 加载环境变量
 load_dotenv()
@@ -26,8 +47,61 @@ app = Flask(__name__, static_folder='../frontend', static_url_path='')
 # 配置
 GITHUB_TOKEN = os.environ.get('GITHUB_TOKEN', '')  # 从环境变量获取GitHub Token
 DASHSCOPE_API_KEY = os.environ.get('DASHSCOPE_API_KEY', '')  # 从环境变量获取通义千问API Key
-MAX_FILES = 100  # 最大文件数限制
-FILE_SIZE_LIMIT = 1024 * 1024  # 文件大小限制（1MB）
+DASHSCOPE_BASE_URL = os.environ.get('DASHSCOPE_BASE_URL', 'https://dashscope.aliyuncs.com/compatible-mode/v1')  # 通义千问 OpenAI 兼容接口地址
+MAX_FILES = int(os.environ.get('MAX_FILES', 10000))  # 最大文件数限制，可通过环境变量调整
+FILE_SIZE_LIMIT = int(os.environ.get('FILE_SIZE_LIMIT', 10 * 1024 * 1024))  # 可解释的文件大小上限（默认10MB）
+CHUNK_TOKEN_BUDGET = int(os.environ.get('CHUNK_TOKEN_BUDGET', 6000))  # 单次解释的令牌预算，超出时分块解释
+CHUNK_PARALLELISM = int(os.environ.get('CHUNK_PARALLELISM', 8))  # 分块解释的最大并发数
+MAX_PARSE_FILES = int(os.environ.get('MAX_PARSE_FILES', 5000))  # 解析导入语句的源文件数上限
+MAX_PARSE_FILE_SIZE = int(os.environ.get('MAX_PARSE_FILE_SIZE', 512 * 1024))  # 超过该大小的源文件不解析导入语句
+INGEST_MODE = os.environ.get('INGEST_MODE', 'api')  # 仓库获取方式：api（Git Trees API + 按需下载文件）或 archive（下载归档包）
+ARCHIVE_FORMAT = os.environ.get('ARCHIVE_FORMAT', 'tar')  # 归档包格式：tar 或 zip
+ARCHIVE_MAX_CONTENT_BYTES = int(os.environ.get('ARCHIVE_MAX_CONTENT_BYTES', 256 * 1024 * 1024))  # 归档模式下保留在内存中的源码总大小上限
+LOCAL_REPO_ROOTS = [p for p in os.environ.get('LOCAL_REPO_ROOTS', '').split(os.pathsep) if p]  # 允许分析的本地目录，为空时禁用本地仓库分析
+MAX_EXPLAIN_CHUNKS = int(os.environ.get('MAX_EXPLAIN_CHUNKS', 48))  # 单个文件最多解释的代码块数，超出时均匀抽样
+EXPLAIN_MODEL = "qwen-turbo-latest"  # 代码解释使用的模型
+EXPLAIN_PROMPT_VERSION = 1  # 代码解释提示词版本，修改提示词时递增以使旧缓存失效
+EXPLAIN_CACHE_BACKEND = os.environ.get('EXPLAIN_CACHE_BACKEND', 'sqlite')  # 代码解释缓存后端：sqlite 或 memory
+EXPLAIN_CACHE_TTL = int(os.environ.get('EXPLAIN_CACHE_TTL', 30 * 24 * 3600))  # 代码解释缓存有效期（秒）
+CACHE_DIR = os.environ.get('CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'))  # 缓存目录
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 256 * 1024 * 1024))  # 缓存总大小上限
+ANALYSIS_CACHE_TTL = int(os.environ.get('ANALYSIS_CACHE_TTL', 24 * 3600))  # 分析结果缓存有效期（秒）
+ANALYSIS_CACHE_VERSION = 5  # 分析结果格式版本，格式变化时递增以使旧缓存失效
+INCREMENTAL_TREE_MIN_FILES = int(os.environ.get('INCREMENTAL_TREE_MIN_FILES', 10000))  # 上一次分析的文件数达到该值时只获取变化的子树，较小的仓库一次递归请求更快
+INCREMENTAL_TREE_MAX_REQUESTS = int(os.environ.get('INCREMENTAL_TREE_MAX_REQUESTS', 64))  # 增量获取文件树的请求数上限，变化过多时改为完整获取
+MAX_CONCURRENT_ANALYSES = int(os.environ.get('MAX_CONCURRENT_ANALYSES', 128))  # 同时进行的分析数上限，决定内存占用的上界
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', MAX_CONCURRENT_ANALYSES))  # 后台分析任务的最大并发数
+STAGE_WORKERS = int(os.environ.get('STAGE_WORKERS', 4 * MAX_CONCURRENT_ANALYSES))  # 分析阶段并行执行的线程数，阶段线程大多只是等待事件循环上的 I/O
+STAGE_TIMEOUT = float(os.environ.get('STAGE_TIMEOUT', 120))  # 单个分析阶段的超时时间（秒）
+MERMAID_TIMEOUT = float(os.environ.get('MERMAID_TIMEOUT', 30))  # AI生成Mermaid图表的超时时间（秒）
+MERMAID_MAX_DEPTH = int(os.environ.get('MERMAID_MAX_DEPTH', 3))  # 项目结构图最多展开的目录层数
+MERMAID_MAX_CHILDREN = int(os.environ.get('MERMAID_MAX_CHILDREN', 10))  # 项目结构图中每个目录最多显示的子节点数
+MERMAID_MAX_NODES = int(os.environ.get('MERMAID_MAX_NODES', 150))  # 项目结构图的节点总数上限
+MERMAID_MODEL = "qwen-turbo-latest"  # AI生成项目结构图使用的模型
+MERMAID_PROMPT_VERSION = 2  # 项目结构图提示词版本，修改提示词时递增以使旧缓存失效
+REQUEST_DEADLINE = float(os.environ.get('REQUEST_DEADLINE', 120))  # 单个请求内所有外部调用的总时间预算（秒）
+DASHSCOPE_TIMEOUT = float(os.environ.get('DASHSCOPE_TIMEOUT', 60))  # 单次通义千问请求的超时时间（秒）
+DASHSCOPE_RETRIES = int(os.environ.get('DASHSCOPE_RETRIES', 1))  # 通义千问请求失败后的重试次数
+DASHSCOPE_BREAKER_THRESHOLD = int(os.environ.get('DASHSCOPE_BREAKER_THRESHOLD', 5))  # 通义千问连续失败多少次后熔断
+DASHSCOPE_BREAKER_RESET = float(os.environ.get('DASHSCOPE_BREAKER_RESET', 60))  # 通义千问熔断持续时间（秒）
+TREE_PAGE_SIZE = int(os.environ.get('TREE_PAGE_SIZE', 200))  # 目录分页接口每页默认返回的子项数
+TREE_PAGE_MAX = 1000  # 目录分页接口每页最多返回的子项数
+TREE_INDEX_ENTRIES = int(os.environ.get('TREE_INDEX_ENTRIES', 32))  # 缓存的目录索引数（每个仓库提交一个）
+TREE_INDEX_MAX_DIRS = int(os.environ.get('TREE_INDEX_MAX_DIRS', 4096))  # 每个目录索引最多缓存的目录数
+LOCAL_TREE_TTL = 5  # 非 git 本地目录的目录列表缓存时间（秒），文件系统变化后很快可见
+LAYOUT_MIN_NODES = int(os.environ.get('LAYOUT_MIN_NODES', 1500))  # 依赖图节点数达到该值时在服务端计算布局，前端改用分层聚合视图
+LAYOUT_VERSION = 1  # 布局算法版本，修改算法时递增以使缓存的坐标失效
+LAYOUT_CACHE_ENTRIES = int(os.environ.get('LAYOUT_CACHE_ENTRIES', 8))  # 进程内保留的依赖图布局数
+LOD_MAX_NODES = int(os.environ.get('LOD_MAX_NODES', 1000))  # 聚合视图默认最多返回的节点数
+LOD_MAX_NODES_LIMIT = 5000  # 聚合视图每次最多返回的节点数
+WARM_UP = os.environ.get('WARM_UP', '').lower() in ('1', 'true', 'yes')  # 导入后在后台预先加载延迟导入的依赖并创建客户端
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 16))  # 所有批量分析请求共享的分析线程数
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', 8))  # 单个批量分析请求同时分析的仓库数（默认值和上限）
+BATCH_MAX_REPOS = int(os.environ.get('BATCH_MAX_REPOS', 500))  # 单个批量分析请求最多包含的仓库数
+BATCH_ITEM_DEADLINE = float(os.environ.get('BATCH_ITEM_DEADLINE', 600))  # 批量分析中单个仓库的时间预算（秒）
+BATCH_TTL = int(os.environ.get('BATCH_TTL', 24 * 3600))  # 批量分析进度的保留时间（秒），期间可以断点续传
+BATCH_HEARTBEAT = 15  # 批量分析流超过该秒数没有结果时发送保活消息
+ANALYSIS_STAGES = ['repoInfo', 'fileStructure', 'dependencyData', 'codeQuality', 'mermaidChart', 'graphLayout']
 
 # 配置OpenAI客户端（通义千问API兼容OpenAI接口）
 # 从环境变量中获取代理设置
@@ -35,15 +109,137 @@ http_proxy = os.environ.get('HTTP_PROXY')
 https_proxy = os.environ.get('HTTPS_PROXY')
 proxies = {"http://": http_proxy, "https://": https_proxy} if http_proxy and https_proxy else None
 
-# 创建一个httpx客户端来配置代理
-http_client = httpx.Client(proxies=proxies)
+def create_dashscope_client():
+    # openai 导入较慢，只在第一次调用模型时加载；httpx客户端用于配置代理，连接超时较短，读取超时与单次请求超时一致
+    import httpx
+    import openai
+    return openai.AsyncOpenAI(
+        api_key=DASHSCOPE_API_KEY,
+        base_url=DASHSCOPE_BASE_URL,
+        http_client=httpx.AsyncClient(proxies=proxies, timeout=httpx.Timeout(DASHSCOPE_TIMEOUT, connect=5.0)),
+        timeout=DASHSCOPE_TIMEOUT,
+        max_retries=DASHSCOPE_RETRIES
+    )
 
-client = openai.OpenAI(
-    api_key=DASHSCOPE_API_KEY,
-    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-    http_client=http_client
+def get_dashscope_client():
+    """获取绑定到共享事件循环的通义千问异步客户端，只能在循环中调用；每个进程在首次使用时创建"""
+    return loop_resource('dashscope', create_dashscope_client)
+
+# 通义千问熔断器，服务异常时快速失败，由调用方回退到本地图表或缓存结果
+dashscope_breaker = CircuitBreaker('DashScope', failure_threshold=DASHSCOPE_BREAKER_THRESHOLD,
+                                   reset_timeout=DASHSCOPE_BREAKER_RESET)
+
+# 分析结果缓存，以仓库和提交SHA为键
+analysis_cache = SqliteCache(
+    os.path.join(CACHE_DIR, 'analysis.sqlite3'),
+    max_bytes=CACHE_MAX_BYTES,
+    default_ttl=ANALYSIS_CACHE_TTL
+)
+
+# 代码解释缓存，以文件内容的blob SHA、模型和提示词版本为键
+explain_cache = create_cache(
+    EXPLAIN_CACHE_BACKEND,
+    'explanations',
+    CACHE_DIR,
+    max_bytes=CACHE_MAX_BYTES,
+    max_entries=4096,
+    default_ttl=EXPLAIN_CACHE_TTL
+)
+
+# AI生成的项目结构图缓存，以文件树指纹、模型和提示词版本为键
+mermaid_cache = create_cache(
+    EXPLAIN_CACHE_BACKEND,
+    'mermaid',
+    CACHE_DIR,
+    max_bytes=CACHE_MAX_BYTES,
+    max_entries=1024,
+    default_ttl=EXPLAIN_CACHE_TTL
 )
 
+# 依赖图节点坐标的持久化缓存，以仓库和提交SHA为键
+layout_cache = SqliteCache(
+    os.path.join(CACHE_DIR, 'layouts.sqlite3'),
+    max_bytes=CACHE_MAX_BYTES,
+    default_ttl=ANALYSIS_CACHE_TTL
+)
+
+# 进程内的依赖图布局对象，供聚合视图接口复用
+graph_layouts = MemoryCache(max_entries=LAYOUT_CACHE_ENTRIES, default_ttl=ANALYSIS_CACHE_TTL)
+
+# 按需加载的目录索引，以仓库和提交SHA为键
+tree_indexes = MemoryCache(max_entries=TREE_INDEX_ENTRIES, default_ttl=ANALYSIS_CACHE_TTL)
+
+# 后台分析任务调度器
+job_manager = JobManager(max_workers=JOB_WORKERS)
+
+# 分析阶段执行线程池，所有请求共享
+stage_executor = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix='analysis-stage')
+
+# 批量分析线程池，所有批量请求共享，限制批量分析占用的总并发和 GitHub 配额消耗速度
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='batch-analysis')
+
+# 批量分析进度，与分析结果存放在同一个持久化缓存中
+batch_store = BatchStore(analysis_cache, ttl=BATCH_TTL)
+
+# 同时进行的分析数，超出时排队等待
+analysis_slots = threading.BoundedSemaphore(MAX_CONCURRENT_ANALYSES)
+
+# 运行指标，通过 /metrics 以 Prometheus 文本格式导出
+HTTP_REQUESTS = REGISTRY.counter(
+    'repo_analyzer_http_requests_total', 'HTTP 请求数', ('endpoint', 'method', 'status'))
+HTTP_SECONDS = REGISTRY.histogram(
+    'repo_analyzer_http_request_seconds', 'HTTP 请求处理耗时（秒）', ('endpoint', 'method'))
+STAGE_SECONDS = REGISTRY.histogram(
+    'repo_analyzer_stage_seconds', '分析阶段耗时（秒）', ('stage', 'status'))
+LLM_TOKENS = REGISTRY.counter(
+    'repo_analyzer_llm_tokens_total', '通义千问调用消耗的令牌数', ('model', 'kind'))
+TREE_FILES = REGISTRY.histogram(
+    'repo_analyzer_tree_files', '每次分析的文件数', buckets=SIZE_BUCKETS)
+GRAPH_NODES = REGISTRY.histogram(
+    'repo_analyzer_dependency_graph_nodes', '每次分析的依赖图节点数', buckets=SIZE_BUCKETS)
+INCREMENTAL_FILES = REGISTRY.counter(
+    'repo_analyzer_incremental_files_total', '增量分析中沿用基线结果或重新计算的文件数', ('kind', 'result'))
+BATCH_ITEMS = REGISTRY.counter(
+    'repo_analyzer_batch_items_total', '批量分析中各仓库的处理结果', ('status', 'cache'))
+
+@app.before_request
+def start_request_deadline():
+    """为请求设置截止时间，请求内的所有外部调用共享这一时间预算"""
+    g.deadline_token = set_deadline(REQUEST_DEADLINE)
+    g.request_started = time.perf_counter()
+    g.timing_token = start_server_timing()
+
+@app.after_request
+def record_request_metrics(response):
+    """记录请求耗时和状态码，并通过 Server-Timing 响应头返回各阶段和外部调用的耗时
+
+    流式响应在生成器执行前就返回了响应头，此时只包含已完成部分的耗时。
+    """
+    started = g.get('request_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    HTTP_SECONDS.observe(elapsed, endpoint=endpoint, method=request.method)
+    header = server_timing_header(total=elapsed)
+    if header:
+        response.headers['Server-Timing'] = header
+    return response
+
+@app.teardown_request
+def clear_request_deadline(exc):
+    """请求结束时清除截止时间和请求优先级，避免影响同一线程处理的下一个请求"""
+    token = g.pop('deadline_token', None)
+    if token is not None:
+        reset_deadline(token)
+    token = g.pop('priority_token', None)
+    if token is not None:
+        reset_priority(token)
+    token = g.pop('timing_token', None)
+    if token is not None:
+        reset_server_timing(token)
+
 @app.route('/')
 def index():
     """提供前端页面"""
@@ -51,94 +247,646 @@ def index():
 
 @app.route('/analyze', methods=['POST'])
 def analyze_repo():
-    """分析GitHub仓库"""
+    """分析GitHub仓库或本地仓库（同步返回完整结果）"""
     try:
-        data = request.json
-        repo_url = data.get('url')
+        use_ai = bool(request.json.get('useAi'))
+        try:
+            owner, repo_name, commit_sha, local_repo = resolve_analysis_target(request.json)
+        except (ValueError, LocalRepoError) as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            # GitHub 暂时不可用时返回该仓库最近一次的分析结果
+            stale_result = load_stale_analysis(request.json, use_ai, e)
+            if stale_result is None:
+                raise
+            return payload_response(stale_result, headers={'X-Cache': 'STALE'})
         
-        if not repo_url:
-            return jsonify({'error': '缺少仓库URL'}), 400
+        # 仓库未变化时直接返回缓存结果
+        cached_result = analysis_cache.get(analysis_cache_key(owner, repo_name, commit_sha, local_repo, use_ai))
+        if cached_result is not None:
+            return payload_response(cached_result, headers={'X-Cache': 'HIT'})
         
-        # 解析GitHub仓库URL
-        parsed_url = urlparse(repo_url)
-        path_parts = parsed_url.path.strip('/').split('/')
+        result = run_analysis(owner, repo_name, commit_sha, local_repo=local_repo, use_ai=use_ai)
         
-        if len(path_parts) < 2 or parsed_url.netloc != 'github.com':
-            return jsonify({'error': '无效的GitHub仓库URL'}), 400
+        return payload_response(result, headers={'X-Cache': 'MISS'})
         
-        owner, repo_name = path_parts[0], path_parts[1]
+    except Exception as e:
+        logger.error(f"分析仓库时出错: {str(e)}", exc_info=True)
+        return jsonify({'error': f'分析仓库时出错: {str(e)}'}), 500
+
+@app.route('/api/jobs', methods=['POST'])
+def create_analysis_job():
+    """提交异步分析任务，立即返回任务ID"""
+    try:
+        use_ai = bool(request.json.get('useAi'))
+        try:
+            owner, repo_name, commit_sha, local_repo = resolve_analysis_target(request.json)
+        except (ValueError, LocalRepoError) as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            # GitHub 暂时不可用时以该仓库最近一次的分析结果完成任务
+            stale_result = load_stale_analysis(request.json, use_ai, e)
+            if stale_result is None:
+                raise
+            job = job_manager.complete(f"stale:{request.json.get('url')}", ANALYSIS_STAGES, stale_result)
+            return payload_response(job.to_dict(), 202, {'X-Cache': 'STALE'})
         
-        # 获取仓库信息
-        repo_info = get_repo_info(owner, repo_name)
+        cache_key = analysis_cache_key(owner, repo_name, commit_sha, local_repo, use_ai)
         
-        # 获取文件结构
-        file_structure = get_repo_structure(owner, repo_name)
+        # 命中缓存时直接登记为已完成的任务
+        cached_result = analysis_cache.get(cache_key)
+        if cached_result is not None:
+            job = job_manager.complete(cache_key, ANALYSIS_STAGES, cached_result)
+            return payload_response(job.to_dict(), 202)
         
-        # 生成依赖数据
-        dependency_data = generate_dependency_data(file_structure)
+        # 相同仓库和提交的并发请求会加入同一个进行中的任务
+        def task(job):
+            def report(stage, status, value):
+                job_manager.update_stage(job, stage, status, value)
+            return run_analysis(owner, repo_name, commit_sha, report=report, local_repo=local_repo, use_ai=use_ai)
         
-        # 生成代码质量分析数据
-        code_quality = generate_code_quality_data(file_structure)
+        job, created = job_manager.submit(cache_key, ANALYSIS_STAGES, task)
+        if not created:
+            logger.info(f"仓库 {owner}/{repo_name}@{commit_sha} 已有进行中的分析任务，复用任务 {job.id}")
         
-        # 生成Mermaid图表
-        mermaid_chart = generate_mermaid_chart_with_ai(file_structure)
+        return payload_response(job.to_dict(), 202)
         
-        # 返回结果
-        result = {
-            'repoInfo': repo_info,
-            'fileStructure': file_structure,
-            'dependencyData': dependency_data,
-            'codeQuality': code_quality,
-            'mermaidChart': mermaid_chart
-        }
+    except Exception as e:
+        logger.error(f"提交分析任务时出错: {str(e)}", exc_info=True)
+        return jsonify({'error': f'提交分析任务时出错: {str(e)}'}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_analysis_job(job_id):
+    """查询分析任务状态，包含已完成阶段的部分结果
+
+    skip 参数为逗号分隔的阶段名，客户端已获取过的阶段结果不再重复返回。
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在或已过期'}), 404
+    skip = set(filter(None, request.args.get('skip', '').split(',')))
+    return payload_response(job.to_dict(skip=skip))
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def stream_analysis_job(job_id):
+    """以SSE形式推送分析任务的阶段进度和部分结果
+
+    EventSource 无法设置请求头，format=compact 参数表示使用列式格式。
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在或已过期'}), 404
+    compact = request.args.get('format') == 'compact'
+    
+    def generate():
+        version = -1
+        sent = set()
+        while True:
+            new_version = job_manager.wait_for_update(job, version, timeout=15)
+            if new_version == version and not job.finished:
+                # 保持连接的心跳
+                yield ": keep-alive\n\n"
+                continue
+            version = new_version
+            # 每个阶段的结果只推送一次
+            payload = job.to_dict(skip=sent)
+            sent.update(payload.get('partial', {}))
+            if compact:
+                payload = encode_payload(payload)
+            yield f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+            if job.finished:
+                break
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/batch', methods=['POST'])
+def analyze_batch():
+    """批量分析多个GitHub仓库或一个组织（用户）的全部仓库，以 NDJSON 流逐个返回结果
+
+    请求体提供 urls（仓库URL列表）或 org（组织名或用户名），可选 useAi、concurrency（同时分析的仓库数）、
+    skip（结果中省略的阶段）、batchId 和 skipCompleted。首行为 {batchId, total, completed}，
+    之后每个仓库完成时立即输出一行 {index, url, status, cache, commit, result | error}，
+    最后一行为 {done, completed, failed, total}。
+    相同的仓库列表和选项得到相同的 batchId，中断后重新提交即可续传：已完成的仓库直接从缓存取回结果，
+    skipCompleted 为真时只返回这些仓库的状态，不再重复发送结果。
+    """
+    try:
+        data = request.json or {}
+        use_ai = bool(data.get('useAi'))
+        skip = set(data.get('skip') or [])
+        try:
+            concurrency = max(1, min(int(data.get('concurrency') or BATCH_CONCURRENCY), BATCH_CONCURRENCY))
+        except (TypeError, ValueError):
+            return jsonify({'error': '并发数必须是整数'}), 400
+        try:
+            targets = resolve_batch_targets(data)
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            if is_not_found(e):
+                return jsonify({'error': '组织或用户不存在'}), 404
+            raise
+        batch_id = str(data.get('batchId') or hashlib.sha1(json.dumps([targets, use_ai]).encode('utf-8')).hexdigest())
+        if not re.fullmatch(r'[\w-]{1,64}', batch_id):
+            return jsonify({'error': '无效的批次ID'}), 400
+        completed = batch_store.open(batch_id, targets, {'useAi': use_ai})
+    except Exception as e:
+        logger.error(f"提交批量分析时出错: {str(e)}", exc_info=True)
+        return jsonify({'error': f'提交批量分析时出错: {str(e)}'}), 500
+    
+    def task(item):
+        index, url = item
+        entry, result = analyze_batch_target(url, use_ai)
+        # 每个仓库完成时立即记录，客户端断开后仍在执行的仓库也会记录下来；降级的旧结果不算完成
+        if entry['cache'] != 'STALE':
+            batch_store.record(batch_id, index, entry)
+        return entry, result
+    
+    def item_line(index, entry, result=None):
+        payload = {'index': index, 'url': targets[index], 'status': 'done', **entry}
+        if result is not None:
+            payload['result'] = {stage: value for stage, value in result.items() if stage not in skip}
+        return json.dumps(payload, ensure_ascii=False) + '\n'
+    
+    def generate():
+        yield json.dumps({'batchId': batch_id, 'total': len(targets), 'completed': len(completed)}) + '\n'
+        succeeded = failed = 0
+        remaining = []
+        for index in range(len(targets)):
+            entry = completed.get(index)
+            if entry is not None and data.get('skipCompleted'):
+                succeeded += 1
+                yield item_line(index, dict(entry, resumed=True))
+                continue
+            result = analysis_cache.get(entry['cacheKey']) if entry is not None else None
+            if result is None:
+                # 未完成，或记录的结果已被缓存淘汰，重新分析
+                if entry is not None:
+                    batch_store.discard(batch_id, index)
+                remaining.append(index)
+                continue
+            succeeded += 1
+            BATCH_ITEMS.inc(status='done', cache='RESUMED')
+            yield item_line(index, dict(entry, resumed=True), result)
         
-        return jsonify(result)
+        results = run_batch(((index, (index, targets[index])) for index in remaining), task, batch_executor,
+                            concurrency, heartbeat=BATCH_HEARTBEAT)
+        try:
+            for item in results:
+                if item is None:
+                    yield json.dumps({'heartbeat': True, 'completed': succeeded + failed, 'total': len(targets)}) + '\n'
+                    continue
+                index, value, error = item
+                if error is not None:
+                    failed += 1
+                    BATCH_ITEMS.inc(status='error', cache='')
+                    message = '仓库不存在或无权访问' if is_not_found(error) else str(error)
+                    if isinstance(error, ValueError) or is_not_found(error):
+                        logger.warning(f"批量分析仓库 {targets[index]} 时出错: {message}")
+                    else:
+                        logger.error(f"批量分析仓库 {targets[index]} 时出错: {message}", exc_info=error)
+                    yield json.dumps({'index': index, 'url': targets[index], 'status': 'error', 'error': message},
+                                     ensure_ascii=False) + '\n'
+                    continue
+                entry, result = value
+                succeeded += 1
+                BATCH_ITEMS.inc(status='done', cache=entry['cache'])
+                yield item_line(index, entry, result)
+        except GeneratorExit:
+            # 客户端断开时不再启动新的仓库分析，已完成的进度保留在缓存中，可以用同一批次ID续传
+            logger.info(f"批量分析 {batch_id} 的客户端已断开，已完成 {succeeded}/{len(targets)} 个仓库")
+            raise
+        finally:
+            results.close()
+        yield json.dumps({'done': True, 'completed': succeeded, 'failed': failed, 'total': len(targets)}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'X-Batch-Id': batch_id})
+
+@app.route('/api/tree', methods=['GET'])
+def list_tree():
+    """分页返回仓库中一个目录的直接子项，供前端展开目录时按需加载
+
+    参数：repo 为 GitHub 仓库URL或本地路径，path 为目录路径（默认根目录），cursor 为上一页返回的 nextCursor，
+    limit 为每页子项数，ref 为上一页返回的 commit，用于把翻页和展开固定在同一个提交上。
+    """
+    g.priority_token = set_priority(PRIORITY_INTERACTIVE)
+    try:
+        repo = request.args.get('repo')
+        if not repo:
+            return jsonify({'error': '缺少仓库URL或路径'}), 400
+        path = request.args.get('path', '').strip('/')
+        try:
+            offset = max(int(request.args.get('cursor') or 0), 0)
+            limit = min(max(int(request.args.get('limit') or TREE_PAGE_SIZE), 1), TREE_PAGE_MAX)
+        except ValueError:
+            return jsonify({'error': '无效的分页参数'}), 400
+        
+        try:
+            index, commit = get_tree_index(repo, request.args.get('ref'))
+            page = index.page(path, offset, limit)
+        except (ValueError, LocalRepoError) as e:
+            return jsonify({'error': str(e)}), 400
+        except TreePathNotFound as e:
+            return jsonify({'error': str(e)}), 404
+        except Exception as e:
+            if not is_not_found(e):
+                raise
+            return jsonify({'error': '仓库或目录不存在'}), 404
+        
+        page['commit'] = commit
+        return payload_response(page)
         
     except Exception as e:
-        logger.error(f"分析仓库时出错: {str(e)}", exc_info=True)
-        return jsonify({'error': f'分析仓库时出错: {str(e)}'}), 500
+        logger.error(f"获取目录列表时出错: {str(e)}", exc_info=True)
+        if is_upstream_unavailable(e):
+            return jsonify({'error': f'{str(e)}，请稍后重试'}), 503
+        return jsonify({'error': f'获取目录列表时出错: {str(e)}'}), 500
+
+@app.route('/api/graph', methods=['GET'])
+def graph_level():
+    """返回大型依赖图在某个目录深度下的聚合视图，节点带有服务端计算的坐标
+
+    参数：repo 为 GitHub 仓库URL或本地路径，ref 为分析结果 graphLayout 中的 ref，
+    depth 为展开的目录深度（默认自动选择），bbox 为 x0,y0,x1,y1 表示的可见区域，maxNodes 为节点数上限。
+    """
+    try:
+        repo = request.args.get('repo')
+        ref = request.args.get('ref')
+        if not repo or not ref:
+            return jsonify({'error': '缺少仓库或版本参数'}), 400
+        try:
+            depth = request.args.get('depth')
+            depth = int(depth) if depth else None
+            bbox = request.args.get('bbox')
+            bbox = [float(v) for v in bbox.split(',')] if bbox else None
+            if bbox is not None and len(bbox) != 4:
+                raise ValueError(bbox)
+            max_nodes = min(max(int(request.args.get('maxNodes') or LOD_MAX_NODES), 1), LOD_MAX_NODES_LIMIT)
+        except ValueError:
+            return jsonify({'error': '无效的视图参数'}), 400
+        
+        parsed = parse_repo_url(repo)
+        try:
+            local_repo = None if parsed else LocalRepo(repo, LOCAL_REPO_ROOTS)
+        except LocalRepoError as e:
+            return jsonify({'error': str(e)}), 400
+        owner, repo_name = parsed or ('local', local_repo.name)
+        
+        layout = load_graph_layout(owner, repo_name, ref, local_repo)
+        if layout is None:
+            return jsonify({'error': '该版本的依赖图尚未分析，请先分析仓库'}), 404
+        return payload_response(layout.level(depth, bbox, max_nodes))
+        
+    except Exception as e:
+        logger.error(f"生成依赖图聚合视图时出错: {str(e)}", exc_info=True)
+        return jsonify({'error': f'生成依赖图聚合视图时出错: {str(e)}'}), 500
+
+def collect_cache_metrics():
+    """导出各缓存的命中率和条目数"""
+    caches = {
+        'analysis': analysis_cache,
+        'explanations': explain_cache,
+        'mermaid': mermaid_cache,
+        'layouts': layout_cache,
+        'graphLayouts': graph_layouts,
+        'treeIndexes': tree_indexes,
+        'repoHandles': repo_cache,
+        'imports': parse_cache,
+        'codeMetrics': metrics_cache,
+        'githubEtags': get_scheduler().etags,
+    }
+    stats = {name: cache.stats() for name, cache in caches.items()}
+    return [
+        ('repo_analyzer_cache_hits_total', 'counter', '缓存命中次数',
+         [({'cache': name}, s['hits']) for name, s in stats.items()]),
+        ('repo_analyzer_cache_misses_total', 'counter', '缓存未命中次数',
+         [({'cache': name}, s['misses']) for name, s in stats.items()]),
+        ('repo_analyzer_cache_hit_ratio', 'gauge', '缓存命中率',
+         [({'cache': name}, s['hitRatio']) for name, s in stats.items()]),
+        ('repo_analyzer_cache_entries', 'gauge', '缓存条目数',
+         [({'cache': name}, s['entries']) for name, s in stats.items()]),
+    ]
+
+REGISTRY.add_collector(collect_cache_metrics)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """以 Prometheus 文本格式导出运行指标"""
+    return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """返回缓存命中统计"""
+    return jsonify({
+        'analysis': analysis_cache.stats(),
+        'explanations': explain_cache.stats(),
+        'mermaid': mermaid_cache.stats(),
+        'repoHandles': repo_cache.stats(),
+        'treeIndexes': tree_indexes.stats(),
+        'layouts': layout_cache.stats(),
+        'githubRateLimit': get_scheduler().stats(),
+        'breakers': {
+            'github': github_breaker.stats(),
+            'githubRaw': github_raw_breaker.stats(),
+            'dashscope': dashscope_breaker.stats()
+        }
+    })
 
 @app.route('/api/explain-code', methods=['POST'])
 def explain_code():
     """接收代码文件并返回AI生成的解释"""
+    # 用户正在等待结果，GitHub 请求优先于后台分析任务的批量请求
+    g.priority_token = set_priority(PRIORITY_INTERACTIVE)
     try:
         data = request.json
         repo_url = data.get('repo_url')
+        repo_path = data.get('repo_path')
         file_path = data.get('file_path')
 
-        if not repo_url or not file_path:
+        if not (repo_url or repo_path) or not file_path:
             return jsonify({'error': '缺少仓库URL或文件路径'}), 400
 
-        # 解析GitHub仓库URL
-        parsed_url = urlparse(repo_url)
-        path_parts = parsed_url.path.strip('/').split('/')
-        if len(path_parts) < 2 or parsed_url.netloc != 'github.com':
-            return jsonify({'error': '无效的GitHub仓库URL'}), 400
-        
-        owner, repo_name = path_parts[0], path_parts[1]
+        if not repo_path:
+            # 解析GitHub仓库URL
+            parsed = parse_repo_url(repo_url)
+            if not parsed:
+                return jsonify({'error': '无效的GitHub仓库URL'}), 400
+            
+            owner, repo_name = parsed
 
-        # 获取文件内容
-        if GITHUB_TOKEN:
-            auth = Auth.Token(GITHUB_TOKEN)
-            g = Github(auth=auth)
+        # 前端提供了blob SHA时先查缓存，命中则无需下载文件和调用模型
+        blob_sha = data.get('sha')
+        if blob_sha:
+            cached = explain_cache.get(explain_cache_key(blob_sha))
+            if cached is not None:
+                return explanation_response(cached, stream=data.get('stream'), cache_status='HIT')
+
+        if repo_path:
+            # 本地仓库直接从磁盘或 git 对象库读取
+            try:
+                content_sha, raw = LocalRepo(repo_path, LOCAL_REPO_ROOTS).read_file(file_path)
+            except LocalRepoError as e:
+                return jsonify({'error': str(e)}), 404
+            content_size = len(raw)
+            read_code = lambda: raw.decode('utf-8', errors='replace')
         else:
-            g = Github()
+            # 获取文件内容（经过 GitHub 请求调度器）
+            try:
+                content_file = get_contents(owner, repo_name, file_path)
+            except Exception as e:
+                if is_upstream_unavailable(e):
+                    raise
+                logger.error(f"无法从GitHub获取文件 '{file_path}': {e}")
+                return jsonify({'error': f"文件 '{file_path}' 未找到或无法访问"}), 404
+            if not isinstance(content_file, dict) or content_file.get('type') != 'file':
+                return jsonify({'error': f"'{file_path}' 不是文件"}), 404
+            content_sha, content_size = content_file['sha'], content_file['size']
+            read_code = lambda: load_file_text(owner, repo_name, content_file)
+
+        # 以实际获取到的内容SHA为准
+        cache_key = explain_cache_key(content_sha)
+        cached = explain_cache.get(cache_key)
+        if cached is not None:
+            return explanation_response(cached, stream=data.get('stream'), cache_status='HIT')
+
+        if content_size > FILE_SIZE_LIMIT:
+            return jsonify({'error': f"文件大小超过限制 ({FILE_SIZE_LIMIT / 1024 / 1024}MB)"}), 413
+
+        code = read_code()
+
+        # 大文件按顶层定义分块，并行解释各块后再汇总
+        if estimate_tokens(code) > CHUNK_TOKEN_BUDGET:
+            chunks = split_code(file_path, code, CHUNK_TOKEN_BUDGET)
+            logger.info(f"文件 '{file_path}' 较大，分为 {len(chunks)} 块进行解释")
+            if data.get('stream'):
+                return Response(
+                    stream_with_context(stream_chunked_explanation(file_path, chunks, cache_key)),
+                    mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'X-Cache': 'MISS'}
+                )
+            summaries, sampled = explain_chunks(file_path, chunks)
+            completion = create_completion(
+                model=EXPLAIN_MODEL,
+                messages=build_merge_messages(file_path, summaries, len(chunks), sampled)
+            )
+            explanation = completion.choices[0].message.content.strip()
+            explain_cache.set(cache_key, explanation)
+            return explanation_response(explanation, stream=False, cache_status='MISS')
+
+        messages = build_explain_messages(file_path, code)
         
-        repo = g.get_repo(f"{owner}/{repo_name}")
+        # 流式模式：按 NDJSON 逐行转发模型生成的内容
+        if data.get('stream'):
+            stream = create_completion(
+                model=EXPLAIN_MODEL,
+                messages=messages,
+                stream=True
+            )
+            return Response(
+                stream_with_context(stream_explanation(stream, cache_key)),
+                mimetype='application/x-ndjson',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'X-Cache': 'MISS'}
+            )
         
-        try:
-            content_file = repo.get_contents(file_path)
-        except Exception as e:
-            logger.error(f"无法从GitHub获取文件 '{file_path}': {e}")
-            return jsonify({'error': f"文件 '{file_path}' 未找到或无法访问"}), 404
+        # 调用通义千问API
+        completion = create_completion(
+            model=EXPLAIN_MODEL,
+            messages=messages,
+            stream=False # 使用非流式输出以获得完整解释
+        )
 
-        if content_file.size > FILE_SIZE_LIMIT:
-            return jsonify({'error': f"文件大小超过限制 ({FILE_SIZE_LIMIT / 1024 / 1024}MB)"}), 413
+        explanation = completion.choices[0].message.content.strip()
+        explain_cache.set(cache_key, explanation)
+
+        return explanation_response(explanation, stream=False, cache_status='MISS')
+
+    except CircuitOpenError as e:
+        return jsonify({'error': f'{str(e)}，请稍后重试'}), 503
+    except DeadlineExceeded as e:
+        return jsonify({'error': f'解释代码超时: {str(e)}'}), 504
+    except Exception as e:
+        logger.error(f"解释代码时出错: {str(e)}", exc_info=True)
+        return jsonify({'error': f'解释代码时出错: {str(e)}'}), 500
+
+def is_dashscope_failure(e):
+    """判断异常是否表示通义千问服务故障（请求参数错误等不计入熔断）"""
+    # 只在调用模型之后检查，此时 openai 与 httpx 都已加载
+    import httpx
+    import openai
+    if isinstance(e, openai.APIStatusError):
+        return e.status_code >= 500 or e.status_code == 429
+    return isinstance(e, (openai.APIConnectionError, httpx.HTTPError))
+
+async def create_completion_async(timeout=DASHSCOPE_TIMEOUT, max_retries=None, **kwargs):
+    """调用通义千问对话接口
+
+    超时不超过请求剩余时间；调用经过熔断器，熔断期间直接抛出 CircuitOpenError。
+    流式调用返回 openai.AsyncStream，同步代码通过 iterate_async 读取。
+    """
+    options = {'timeout': call_timeout(timeout)}
+    if max_retries is not None:
+        options['max_retries'] = max_retries
+    if kwargs.get('stream'):
+        # 流式响应在最后一个分片中返回令牌用量
+        kwargs['extra_body'] = {**kwargs.get('extra_body', {}), 'stream_options': {'include_usage': True}}
+    started = time.perf_counter()
+    try:
+        completion = await dashscope_breaker.call_async(
+            get_dashscope_client().with_options(**options).chat.completions.create,
+            is_failure=is_dashscope_failure, **kwargs)
+    except BaseException as e:
+        observe_upstream('dashscope', type(e).__name__, started)
+        raise
+    observe_upstream('dashscope', 'ok', started)
+    if not kwargs.get('stream'):
+        record_llm_usage(kwargs.get('model'), completion.usage)
+    return completion
+
+def create_completion(timeout=DASHSCOPE_TIMEOUT, max_retries=None, **kwargs):
+    """create_completion_async 的同步版本"""
+    return run_async(create_completion_async(timeout, max_retries, **kwargs))
+
+def record_llm_usage(model, usage):
+    """记录一次模型调用的令牌用量，usage 可能是对象或字典（流式分片中的附加字段）"""
+    if not usage:
+        return
+    if isinstance(usage, dict):
+        prompt_tokens, completion_tokens = usage.get('prompt_tokens'), usage.get('completion_tokens')
+    else:
+        prompt_tokens, completion_tokens = usage.prompt_tokens, usage.completion_tokens
+    LLM_TOKENS.inc(prompt_tokens or 0, model=model, kind='prompt')
+    LLM_TOKENS.inc(completion_tokens or 0, model=model, kind='completion')
+
+def load_file_text(owner, repo_name, content_file):
+    """读取文件文本；超过1MB的文件内容接口不返回正文，改用 Git Blob API 获取"""
+    if content_file.get('encoding') == 'base64' and content_file.get('content'):
+        raw = base64.b64decode(content_file['content'])
+    else:
+        raw = get_git_blob(owner, repo_name, content_file['sha'])
+    return raw.decode('utf-8', errors='replace')
+
+def select_chunks(chunks):
+    """代码块过多时均匀抽样，返回 [(序号, 代码块)]"""
+    if len(chunks) <= MAX_EXPLAIN_CHUNKS:
+        return list(enumerate(chunks))
+    step = len(chunks) / MAX_EXPLAIN_CHUNKS
+    return [(int(i * step), chunks[int(i * step)]) for i in range(MAX_EXPLAIN_CHUNKS)]
+
+async def explain_chunk(file_path, index, total, chunk):
+    """解释单个代码块，返回简要说明；所有文件的分块请求共享 CHUNK_PARALLELISM 个并发名额"""
+    start_line, end_line, text = chunk
+    prompt = f"""
+以下是文件 `{file_path}` 的第 {start_line}-{end_line} 行（共 {total} 段中的第 {index + 1} 段）。
+请用不超过200字简要说明这一段中定义的函数、类或逻辑块及其作用，只描述本段内容。
+
+```
+{text}
+```
+"""
+    async with loop_resource('explain-chunk-slots', lambda: asyncio.Semaphore(CHUNK_PARALLELISM)):
+        completion = await create_completion_async(
+            model=EXPLAIN_MODEL,
+            messages=[
+                {"role": "system", "content": "你是一名资深的软件工程师，擅长代码解释和审查。"},
+                {"role": "user", "content": prompt}
+            ]
+        )
+    return completion.choices[0].message.content.strip()
+
+def submit_chunks(file_path, chunks):
+    """将选中的代码块提交到共享事件循环，返回 ([(序号, 代码块, future)], 是否抽样)"""
+    selected = select_chunks(chunks)
+    submitted = [
+        (index, chunk, submit_async(explain_chunk(file_path, index, len(chunks), chunk)))
+        for index, chunk in selected
+    ]
+    return submitted, len(selected) < len(chunks)
+
+def collect_chunk_summary(file_path, index, chunk, future):
+    """获取单个代码块的解释结果，失败时返回占位说明"""
+    start_line, end_line, _ = chunk
+    try:
+        summary = future.result()
+    except Exception as e:
+        logger.error(f"解释文件 '{file_path}' 第 {index + 1} 段时出错: {str(e)}")
+        summary = "（该段解释失败）"
+    return f"### 第 {start_line}-{end_line} 行\n{summary}"
+
+def explain_chunks(file_path, chunks):
+    """并行解释各代码块，返回 (按顺序排列的各段说明, 是否抽样)"""
+    submitted, sampled = submit_chunks(file_path, chunks)
+    summaries = [collect_chunk_summary(file_path, index, chunk, future) for index, chunk, future in submitted]
+    return summaries, sampled
+
+def build_merge_messages(file_path, summaries, total, sampled):
+    """构建汇总各段说明的消息列表"""
+    note = f"（文件共 {total} 段，以下为均匀抽样的 {len(summaries)} 段）" if sampled else f"（文件共 {total} 段）"
+    joined = "\n\n".join(summaries)
+    prompt = f"""
+文件 `{file_path}` 较大，已按顶层定义分段解释{note}，各段说明如下：
+
+{joined}
 
-        code = content_file.decoded_content.decode('utf-8')
+请基于以上各段说明，对整个文件给出完整的解释，包含以下几点：
+1.  **总体功能**: 这个文件的主要作用和功能是什么？
+2.  **关键部分**: 识别并解释代码中的关键函数、类或逻辑块。
+3.  **代码结构**: 描述代码的组织方式和结构。
+4.  **潜在改进**: (可选) 如果你发现任何可以改进的地方（例如，性能、可读性、最佳实践），请提出来。
 
-        # 准备提示
-        prompt = f"""
+请使用Markdown格式进行回复，使其易于阅读。
+"""
+    return [
+        {"role": "system", "content": "你是一名资深的软件工程师，擅长代码解释和审查。"},
+        {"role": "user", "content": prompt}
+    ]
+
+def stream_chunked_explanation(file_path, chunks, cache_key):
+    """分块解释的流式版本：先推送各块的完成进度，再流式输出汇总结果"""
+    submitted, sampled = submit_chunks(file_path, chunks)
+    futures = [future for _, _, future in submitted]
+    try:
+        for done, _ in enumerate(as_completed(futures), start=1):
+            yield json.dumps({'progress': f"正在分段解释 ({done}/{len(futures)})"}, ensure_ascii=False) + '\n'
+    except GeneratorExit:
+        # 客户端断开时取消尚未完成的分块请求
+        for future in futures:
+            future.cancel()
+        raise
+
+    summaries = [collect_chunk_summary(file_path, index, chunk, future) for index, chunk, future in submitted]
+    yield json.dumps({'progress': "正在汇总解释..."}, ensure_ascii=False) + '\n'
+
+    try:
+        stream = create_completion(
+            model=EXPLAIN_MODEL,
+            messages=build_merge_messages(file_path, summaries, len(chunks), sampled),
+            stream=True
+        )
+    except Exception as e:
+        logger.error(f"汇总代码解释时出错: {str(e)}", exc_info=True)
+        yield json.dumps({'error': f'解释代码时出错: {str(e)}'}, ensure_ascii=False) + '\n'
+        return
+    yield from stream_explanation(stream, cache_key)
+
+def explain_cache_key(blob_sha):
+    """生成代码解释的缓存键，模型或提示词版本变化时自然失效"""
+    return f"explain:v{EXPLAIN_PROMPT_VERSION}:{EXPLAIN_MODEL}:{blob_sha}"
+
+def explanation_response(explanation, stream, cache_status):
+    """返回已有的完整解释，流式请求时以单个 NDJSON 片段返回"""
+    if stream:
+        body = json.dumps({'delta': explanation}, ensure_ascii=False) + '\n' + json.dumps({'done': True}) + '\n'
+        response = Response(body, mimetype='application/x-ndjson')
+    else:
+        response = jsonify({'explanation': explanation})
+    response.headers['X-Cache'] = cache_status
+    return response
+
+def build_explain_messages(file_path, code):
+    """构建代码解释请求的消息列表"""
+    prompt = f"""
 你是一名资深软件工程师和代码审查专家。你的任务是清晰、简洁地解释给定的代码文件。
 请分析以下代码文件，并提供详细的说明。
 
@@ -157,390 +905,756 @@ def explain_code():
 
 请使用Markdown格式进行回复，使其易于阅读。
 """
-        
-        # 调用通义千问API
-        completion = client.chat.completions.create(
-            model="qwen-turbo-latest", # 使用一个稳定且强大的模型
-            messages=[
-                {"role": "system", "content": "你是一名资深的软件工程师，擅长代码解释和审查。"},
-                {"role": "user", "content": prompt}
-            ],
-            stream=False # 使用非流式输出以获得完整解释
-        )
+    return [
+        {"role": "system", "content": "你是一名资深的软件工程师，擅长代码解释和审查。"},
+        {"role": "user", "content": prompt}
+    ]
 
-        explanation = completion.choices[0].message.content.strip()
+def stream_explanation(stream, cache_key):
+    """将模型的流式输出转换为 NDJSON 行
+
+    每行为 {"delta": "..."}，结束时输出 {"done": true}，出错时输出 {"error": "..."}。
+    完整生成后写入解释缓存；客户端断开连接时生成器被关闭，同时关闭上游连接以停止生成。
+    """
+    parts = []
+    try:
+        for chunk in iterate_async(stream):
+            # 按请求的模型名记录，与非流式调用一致（上游分片中的 model 可能是带日期的具体版本名）
+            record_llm_usage(EXPLAIN_MODEL, getattr(chunk, 'usage', None))
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield json.dumps({'delta': delta}, ensure_ascii=False) + '\n'
+        explain_cache.set(cache_key, ''.join(parts).strip())
+        yield json.dumps({'done': True}) + '\n'
+    except GeneratorExit:
+        logger.info("客户端已断开，取消上游流式请求")
+        raise
+    except Exception as e:
+        logger.error(f"流式生成代码解释时出错: {str(e)}", exc_info=True)
+        if is_dashscope_failure(e):
+            dashscope_breaker.record_failure()
+        yield json.dumps({'error': f'解释代码时出错: {str(e)}'}, ensure_ascii=False) + '\n'
+    finally:
+        run_async(stream.response.aclose())
+
+def negotiate_payload_format():
+    """根据 format 参数或 Accept 请求头选择分析结果的返回格式
+
+    默认返回原有的嵌套 JSON；请求列式格式或 msgpack 时文件树和依赖图以列式结构返回。
+    """
+    fmt = request.args.get('format')
+    if fmt == 'compact':
+        return COMPACT_MIMETYPE
+    if fmt == 'msgpack':
+        return MSGPACK_MIMETYPE
+    if fmt == 'json':
+        return 'application/json'
+    return request.accept_mimetypes.best_match(
+        ['application/json', COMPACT_MIMETYPE, MSGPACK_MIMETYPE], default='application/json'
+    )
+
+def payload_response(data, status=200, headers=None):
+    """返回分析结果或任务状态，按请求协商格式，并按 Accept-Encoding 使用 brotli 或 gzip 压缩"""
+    mimetype = negotiate_payload_format()
+    if mimetype != 'application/json':
+        data = encode_payload(data)
+    body, content_type = serialize(data, mimetype)
+    body, content_encoding = compress(body, lambda name: request.accept_encodings[name])
+    
+    response = Response(body, status=status, content_type=content_type)
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    if content_encoding:
+        response.headers['Content-Encoding'] = content_encoding
+    if headers:
+        response.headers.update(headers)
+    return response
+
+def parse_repo_url(repo_url):
+    """解析GitHub仓库URL，返回 (owner, repo_name)，无效时返回 None"""
+    parsed_url = urlparse(repo_url)
+    path_parts = parsed_url.path.strip('/').split('/')
+    if len(path_parts) < 2 or parsed_url.netloc != 'github.com':
+        return None
+    return path_parts[0], path_parts[1]
+
+def resolve_analysis_target(data):
+    """解析请求中的分析目标，返回 (owner, repo_name, commit_sha, local_repo)
+
+    请求提供 path 时分析本地仓库（owner 固定为 'local'，commit_sha 为本地版本号），
+    否则分析 url 指定的 GitHub 仓库的默认分支最新提交。参数无效时抛出 ValueError 或 LocalRepoError。
+    """
+    local_path = data.get('path')
+    if local_path:
+        local_repo = LocalRepo(local_path, LOCAL_REPO_ROOTS)
+        return 'local', local_repo.name, local_repo.revision(MAX_FILES), local_repo
+    
+    repo_url = data.get('url')
+    if not repo_url:
+        raise ValueError('缺少仓库URL')
+    
+    # 解析GitHub仓库URL
+    parsed = parse_repo_url(repo_url)
+    if not parsed:
+        raise ValueError('无效的GitHub仓库URL')
+    
+    owner, repo_name = parsed
+    return owner, repo_name, resolve_commit_sha(owner, repo_name), None
+
+def get_tree_index(repo, ref=None):
+    """返回 (目录索引, 提交SHA)，索引按仓库和提交缓存
+
+    repo 不是 GitHub 仓库URL时按本地路径处理。GitHub 仓库提供 40 位的 ref 时直接使用，
+    否则解析默认分支的最新提交；本地 git 仓库固定在 HEAD，普通目录不固定版本，目录列表只短暂缓存。
+    """
+    parsed = parse_repo_url(repo)
+    if parsed is None:
+        local_repo = LocalRepo(repo, LOCAL_REPO_ROOTS)
+        commit = local_repo.commit
+        key = f"tree:local:{local_repo.path}@{commit or 'live'}"
+        index = tree_indexes.get(key)
+        if index is None:
+            index = TreeIndex(local_repo.list_dir, max_dirs=TREE_INDEX_MAX_DIRS,
+                              ttl=ANALYSIS_CACHE_TTL if commit else LOCAL_TREE_TTL)
+            tree_indexes.set(key, index)
+        return index, commit
+    
+    owner, repo_name = parsed
+    commit = ref if ref and re.fullmatch(r'[0-9a-f]{40}', ref) else resolve_commit_sha(owner, repo_name)
+    key = f"tree:{owner.lower()}/{repo_name.lower()}@{commit}"
+    index = tree_indexes.get(key)
+    if index is None:
+        index = TreeIndex(lambda path, tree_sha: list_tree_level(owner, repo_name, tree_sha or commit),
+                          html_url=f"https://github.com/{owner}/{repo_name}", ref=commit,
+                          max_dirs=TREE_INDEX_MAX_DIRS, ttl=ANALYSIS_CACHE_TTL)
+        tree_indexes.set(key, index)
+    return index, commit
+
+def analysis_cache_key(owner, repo_name, commit_sha, local_repo=None, use_ai=False):
+    """生成分析结果的缓存键；本地路径区分大小写，按真实路径区分"""
+    suffix = ":ai" if use_ai else ""
+    if local_repo is not None:
+        return f"analysis:v{ANALYSIS_CACHE_VERSION}:local:{local_repo.path}@{commit_sha}{suffix}"
+    return f"analysis:v{ANALYSIS_CACHE_VERSION}:{owner.lower()}/{repo_name.lower()}@{commit_sha}{suffix}"
+
+def latest_analysis_key(owner, repo_name, use_ai=False):
+    """记录仓库最近一次分析结果缓存键的键"""
+    return f"analysis-latest:v{ANALYSIS_CACHE_VERSION}:{owner.lower()}/{repo_name.lower()}{':ai' if use_ai else ''}"
 
-        return jsonify({'explanation': explanation})
+def analysis_base_key(owner, repo_name, local_repo=None):
+    """记录仓库增量分析基线（最近一次分析的提交、结果缓存键和逐文件结果）的键"""
+    repo_key = f"local:{local_repo.path}" if local_repo is not None else f"{owner.lower()}/{repo_name.lower()}"
+    return f"analysis-base:v{ANALYSIS_CACHE_VERSION}.{PARSE_CACHE_VERSION}.{METRICS_CACHE_VERSION}:{repo_key}"
 
+def load_analysis_base(owner, repo_name, local_repo=None):
+    """读取仓库的增量分析基线，没有基线或基线结果已失效时返回 None"""
+    record = analysis_cache.get(analysis_base_key(owner, repo_name, local_repo))
+    if record is None:
+        return None
+    result = analysis_cache.get(record['resultKey'])
+    if result is None or not result.get('fileStructure') or result['fileStructure'].get('truncated'):
+        return None
+    return AnalysisBase(record['commit'], result, record.get('fileData'), record.get('files', 0))
+
+def load_stale_analysis(data, use_ai, error):
+    """GitHub 暂时不可用（熔断、超时、5xx）时返回仓库最近一次的分析结果，没有时返回 None"""
+    if not is_upstream_unavailable(error) or data.get('path'):
+        return None
+    parsed = parse_repo_url(data.get('url') or '')
+    if not parsed:
+        return None
+    cache_key = analysis_cache.get(latest_analysis_key(*parsed, use_ai))
+    result = analysis_cache.get(cache_key) if cache_key else None
+    if result is not None:
+        logger.warning(f"GitHub 暂时不可用（{str(error)}），返回仓库 {parsed[0]}/{parsed[1]} 最近一次的分析结果")
+    return result
+
+def resolve_batch_targets(data):
+    """解析批量分析的仓库URL列表（去重并保持顺序）；提供 org 时列出该组织或用户的仓库。参数无效时抛出 ValueError"""
+    org = data.get('org')
+    if org:
+        if not isinstance(org, str) or not re.fullmatch(r'[A-Za-z0-9][A-Za-z0-9-]{0,38}', org):
+            raise ValueError('无效的组织名')
+        urls = [f"https://github.com/{repo['full_name']}" for repo in list_owner_repos(org, BATCH_MAX_REPOS)]
+    else:
+        urls = data.get('urls')
+        if not isinstance(urls, list) or not urls or not all(isinstance(url, str) for url in urls):
+            raise ValueError('缺少仓库URL列表')
+        urls = list(dict.fromkeys(url.strip() for url in urls))
+    if len(urls) > BATCH_MAX_REPOS:
+        raise ValueError(f'单次最多批量分析 {BATCH_MAX_REPOS} 个仓库')
+    return urls
+
+def analyze_batch_target(url, use_ai):
+    """分析批量请求中的一个仓库，返回 (完成记录 {commit, cacheKey, cache}, 分析结果)
+
+    在批量线程池的独立上下文中执行：使用单独的时间预算和后台优先级，GitHub 配额紧张时让位于交互式请求。
+    仓库当前提交已有分析结果时直接复用缓存；GitHub 暂时不可用时返回最近一次的分析结果（cache 为 STALE）。
+    """
+    set_deadline(BATCH_ITEM_DEADLINE)
+    set_priority(PRIORITY_BACKGROUND)
+    data = {'url': url}
+    try:
+        owner, repo_name, commit_sha, _ = resolve_analysis_target(data)
+    except ValueError:
+        raise
     except Exception as e:
-        logger.error(f"解释代码时出错: {str(e)}", exc_info=True)
-        return jsonify({'error': f'解释代码时出错: {str(e)}'}), 500
+        stale_result = load_stale_analysis(data, use_ai, e)
+        if stale_result is None:
+            raise
+        return {'cache': 'STALE'}, stale_result
+    
+    cache_key = analysis_cache_key(owner, repo_name, commit_sha, use_ai=use_ai)
+    entry = {'commit': commit_sha, 'cacheKey': cache_key, 'cache': 'HIT'}
+    result = analysis_cache.get(cache_key)
+    if result is None:
+        entry['cache'] = 'MISS'
+        result = run_analysis(owner, repo_name, commit_sha, use_ai=use_ai)
+    return entry, result
+
+def run_analysis(owner, repo_name, commit_sha, report=None, local_repo=None, use_ai=False):
+    """执行完整的分析流程并写入缓存
+
+    各阶段按依赖关系并行执行：仓库信息与文件结构互不依赖，依赖数据、代码质量和Mermaid图表
+    只依赖文件结构，依赖图布局依赖依赖数据。report(stage, status, value) 为可选回调，用于汇报各阶段进度和阶段结果。
+    提供 local_repo 时分析本地仓库，不访问 GitHub API。
+    项目结构图默认在本地生成，use_ai 为真时才调用模型生成。
+    仓库之前分析过时以最近一次的结果为基线增量分析，只重新计算 blob SHA 变化的文件。
+    """
+    base = load_analysis_base(owner, repo_name, local_repo)
+    if base is not None:
+        logger.info(f"仓库 {owner}/{repo_name}@{commit_sha} 以提交 {base.commit} 的分析结果为基线增量分析")
+    # 本次分析的逐文件结果，作为下一次增量分析的基线
+    file_data = {}
+    file_structure_fn, load_sources = ingest_functions(owner, repo_name, commit_sha, local_repo, base)
+    
+    stages = [
+        Stage('repoInfo', lambda deps: local_repo.info() if local_repo else get_repo_info(owner, repo_name),
+              timeout=STAGE_TIMEOUT),
+        # 文件结构固定在已解析的提交上，保证与缓存键一致
+        Stage('fileStructure', lambda deps: file_structure_fn(),
+              timeout=STAGE_TIMEOUT),
+        Stage('dependencyData', lambda deps: generate_dependency_data(deps['fileStructure'], load_sources=load_sources,
+                                                                      base=base, file_data=file_data),
+              deps=['fileStructure'], timeout=STAGE_TIMEOUT,
+              fallback=lambda deps: {'nodes': [], 'links': []}),
+        Stage('codeQuality', lambda deps: generate_code_quality_data(deps['fileStructure'], load_sources=load_sources,
+                                                                     base=base, file_data=file_data),
+              deps=['fileStructure'], timeout=STAGE_TIMEOUT,
+              fallback=lambda deps: {'languageDistribution': [], 'complexity': []}),
+        # 大型依赖图在服务端计算布局，失败时由浏览器实时布局
+        Stage('graphLayout', lambda deps: compute_graph_layout(owner, repo_name, commit_sha, local_repo, deps['dependencyData'],
+                                                               base=base),
+              deps=['dependencyData'], timeout=STAGE_TIMEOUT,
+              fallback=lambda deps: None),
+    ]
+    
+    if use_ai:
+        # LLM 较慢，超时或失败后回退到本地生成的图表
+        stages.append(Stage('mermaidChart', lambda deps: generate_mermaid_chart_with_ai(deps['fileStructure']),
+                            deps=['fileStructure'], timeout=MERMAID_TIMEOUT,
+                            fallback=lambda deps: generate_mermaid_chart(deps['fileStructure'])))
+    else:
+        stages.append(Stage('mermaidChart', lambda deps: generate_mermaid_chart(deps['fileStructure']),
+                            deps=['fileStructure'], timeout=STAGE_TIMEOUT))
+    
+    degraded = []
+    
+    started = {}
+    
+    def on_stage(stage, status, value):
+        if status == 'running':
+            started[stage] = time.perf_counter()
+        elif stage in started:
+            elapsed = time.perf_counter() - started[stage]
+            STAGE_SECONDS.observe(elapsed, stage=stage, status=status)
+            record_timing(f"stage-{stage}", elapsed)
+        if status in ('timeout', 'fallback'):
+            degraded.append(stage)
+        if report:
+            report(stage, status, value)
+    
+    # 同时进行的分析数有上限，超出时排队，请求截止时间到达前仍未轮到则放弃
+    if not analysis_slots.acquire(timeout=remaining_time()):
+        raise DeadlineExceeded("等待分析名额超时")
+    try:
+        result = run_stage_graph(stages, stage_executor, report=on_stage)
+    finally:
+        analysis_slots.release()
+    file_count = sum(1 for _ in iter_files(result['fileStructure'])) if result.get('fileStructure') else 0
+    if result.get('fileStructure'):
+        TREE_FILES.observe(file_count)
+    if result.get('dependencyData'):
+        GRAPH_NODES.observe(len(result['dependencyData'].get('nodes', [])))
+    
+    # 有阶段使用了降级结果时不写入缓存，以便下次请求重新计算
+    if degraded:
+        logger.warning(f"仓库 {owner}/{repo_name}@{commit_sha} 的阶段 {degraded} 使用了降级结果，跳过缓存")
+    else:
+        cache_key = analysis_cache_key(owner, repo_name, commit_sha, local_repo, use_ai)
+        analysis_cache.set(cache_key, result)
+        if local_repo is None:
+            analysis_cache.set(latest_analysis_key(owner, repo_name, use_ai), cache_key)
+        analysis_cache.set(analysis_base_key(owner, repo_name, local_repo), {
+            'commit': commit_sha,
+            'resultKey': cache_key,
+            'files': file_count,
+            'fileData': file_data
+        })
+    return result
+
+class SharedSourceLoader:
+    """在同一次分析的多个阶段之间共享已下载的源码
+
+    并发调用时持有锁，保证同一文件只下载一次。下载失败的文件不重试，每个请求了这些文件的阶段
+    都会被标记为结果不完整，分析结果不写入缓存。
+    """
+    
+    def __init__(self, fetch):
+        self._fetch = fetch
+        self._sources = {}
+        self._lock = threading.Lock()
+    
+    def __call__(self, paths):
+        with self._lock:
+            missing = [path for path in paths if path not in self._sources]
+            if missing:
+                self._sources.update(self._fetch(missing))
+            sources = {path: self._sources.get(path) for path in paths}
+        failed = sum(1 for source in sources.values() if source is None)
+        if failed:
+            mark_incomplete(f"{failed} 个文件下载失败")
+        return sources
+
+def needs_content(path, size):
+    """判断后续阶段是否需要该文件的内容"""
+    return (is_source_file(path) or is_metrics_file(path)) and size <= MAX_PARSE_FILE_SIZE
+
+def ingest_functions(owner, repo_name, commit_sha, local_repo=None, base=None):
+    """按获取方式返回 (获取文件结构的函数, 加载源码的函数)
+
+    本地仓库通过 git ls-tree / cat-file 或遍历文件系统获取；
+    archive 模式下一次性下载归档包，文件结构和源码内容在同一次遍历中得到；
+    api 模式下通过 Git Trees API 获取文件结构，源码按需从 raw.githubusercontent.com 下载，
+    基线 base 的文件数较多时只获取 tree SHA 变化的子树。
+    """
+    if local_repo is not None:
+        return (
+            lambda: get_local_structure(local_repo, commit_sha),
+            local_repo.load_sources
+        )
+    
+    if INGEST_MODE != 'archive':
+        previous = None
+        if base is not None and base.files >= INCREMENTAL_TREE_MIN_FILES:
+            previous = base.file_structure
+        # 依赖分析和代码度量需要的文件大部分重叠，共享同一个加载器避免重复下载
+        return (
+            lambda: get_repo_structure(owner, repo_name, ref=commit_sha, previous=previous),
+            SharedSourceLoader(partial(fetch_raw_files, owner, repo_name, commit_sha))
+        )
+    
+    contents = {}
+    
+    def file_structure_fn():
+        try:
+            snapshot = fetch_repo_archive(
+                owner, repo_name, commit_sha,
+                max_files=MAX_FILES,
+                keep_content=needs_content,
+                max_content_bytes=ARCHIVE_MAX_CONTENT_BYTES,
+                fmt=ARCHIVE_FORMAT
+            )
+        except Exception as e:
+            logger.error(f"获取仓库归档包时出错: {str(e)}", exc_info=True)
+            raise Exception(f"获取仓库结构失败: {str(e)}")
+        contents.update(snapshot.contents)
+        root, _ = build_file_tree(snapshot.entries, repo_name, f"https://github.com/{owner}/{repo_name}",
+                                  commit_sha, MAX_FILES)
+        if snapshot.truncated:
+            root['truncated'] = True
+        return root
+    
+    def load_sources(paths):
+        return {path: contents.get(path) for path in paths}
+    
+    return file_structure_fn, load_sources
 
 def get_repo_info(owner, repo_name):
     """获取GitHub仓库基本信息"""
     try:
-        # 使用GitHub API获取仓库信息
-        if GITHUB_TOKEN:
-            auth = Auth.Token(GITHUB_TOKEN)
-            g = Github(auth=auth)
-        else:
-            g = Github()
-        
-        repo = g.get_repo(f"{owner}/{repo_name}")
+        # 使用GitHub API获取仓库信息（仓库元数据在短时间内缓存复用）
+        repo = get_repo(owner, repo_name)
         
         return {
-            'name': repo.name,
-            'full_name': repo.full_name,
-            'description': repo.description,
-            'language': repo.language,
-            'stars': repo.stargazers_count,
-            'forks': repo.forks_count,
-            'created_at': repo.created_at.isoformat(),
-            'updated_at': repo.updated_at.isoformat(),
-            'url': repo.html_url
+            'name': repo['name'],
+            'full_name': repo['full_name'],
+            'description': repo['description'],
+            'language': repo['language'],
+            'stars': repo['stargazers_count'],
+            'forks': repo['forks_count'],
+            'created_at': repo['created_at'],
+            'updated_at': repo['updated_at'],
+            'url': repo['html_url']
         }
     except Exception as e:
         logger.error(f"获取仓库信息时出错: {str(e)}", exc_info=True)
         raise Exception(f"获取仓库信息失败: {str(e)}")
 
-def get_repo_structure(owner, repo_name):
-    """获取GitHub仓库文件结构"""
+def get_repo_structure(owner, repo_name, ref=None, previous=None):
+    """获取GitHub仓库文件结构，提供上一次分析的文件树 previous 时只获取变化的子树"""
     try:
         # 使用GitHub API获取仓库文件结构
-        if GITHUB_TOKEN:
-            auth = Auth.Token(GITHUB_TOKEN)
-            g = Github(auth=auth)
-        else:
-            g = Github()
-        
-        repo = g.get_repo(f"{owner}/{repo_name}")
-        
-        # 获取默认分支
-        default_branch = repo.default_branch
-        
-        # 构建文件树
-        root = {
-            'name': repo_name,
-            'type': 'dir',
-            'path': '',
-            'url': repo.html_url,
-            'children': []
-        }
-        
-        # 递归获取文件结构
-        file_count = [0]  # 使用列表以便在递归函数中修改
+        repo = get_repo(owner, repo_name)
         
-        def get_contents(path, parent):
-            try:
-                contents = repo.get_contents(path, ref=default_branch)
-                
-                # 如果是单个文件
-                if not isinstance(contents, list):
-                    contents = [contents]
-                
-                for content in contents:
-                    if file_count[0] >= MAX_FILES:
-                        break
-                    
-                    file_info = {
-                        'name': content.name,
-                        'path': content.path,
-                        'type': 'dir' if content.type == 'dir' else 'file',
-                        'url': content.html_url,
-                        'children': []
-                    }
-                    
-                    parent['children'].append(file_info)
-                    
-                    if content.type == 'dir':
-                        get_contents(content.path, file_info)
-                    else:
-                        file_count[0] += 1
-            except Exception as e:
-                logger.warning(f"获取路径 {path} 内容时出错: {str(e)}")
-        
-        get_contents('', root)
-        return root
+        # 通过递归Git Trees API一次性获取文件树，未指定引用时使用默认分支
+        return fetch_repo_tree(repo, ref or repo['default_branch'], MAX_FILES,
+                               previous=previous, max_requests=INCREMENTAL_TREE_MAX_REQUESTS)
         
     except Exception as e:
         logger.error(f"获取仓库结构时出错: {str(e)}", exc_info=True)
         raise Exception(f"获取仓库结构失败: {str(e)}")
 
-def generate_mermaid_chart_with_ai(file_structure):
-    """使用通义千问API生成Mermaid图表"""
+def get_local_structure(local_repo, revision):
+    """获取本地仓库文件结构"""
     try:
-        # 准备文件结构描述
-        structure_description = "仓库文件结构如下:\n"
-        
-        def process_node(node, level=0):
-            nonlocal structure_description
-            indent = "  " * level
-            node_type = "目录" if node['type'] == 'dir' else "文件"
-            structure_description += f"{indent}- {node['name']} ({node_type})\n"
-            
-            if 'children' in node and node['children']:
-                for child in node['children'][:20]:  # 限制每级最多20个子节点
-                    process_node(child, level + 1)
-        
-        process_node(file_structure)
-        
-        # 准备提示
-        prompt = f"""
-我需要你将以下GitHub仓库结构转换为Mermaid流程图格式。
-请严格遵守以下规则，以避免语法错误：
-1.  使用 `flowchart TD` (自上而下) 格式。
-2.  节点ID必须是唯一的、不含特殊字符的字母数字字符串 (例如: `node1`, `node2`)。
-3.  所有节点显示的文本标签都必须用双引号 `"` 包围 (例如: `node1["src/component.js"]`)。
-4.  使用 `-->` 来表示父子关系 (例如: `node1 --> node2`)。
-5.  为每个节点添加点击功能，URL必须用双引号 `"` 包围 (例如: `click node1 "https://github.com/..." _blank`)。
-6.  为目录节点应用样式: `style nodeId fill:#f9f,stroke:#333,stroke-width:2px`。
-7.  为文件节点应用样式: `style nodeId fill:#bbf,stroke:#333,stroke-width:2px`。
-8.  为了图表清晰，请适当省略层级过深或文件过多的节点。
-
-仓库结构:
-{structure_description}
-
-请只返回完整的、可直接渲染的Mermaid图表代码，不要包含任何解释或 "mermaid" 标记。
-"""
-
-        # 调用通义千问API
-        try:
-            completion = client.chat.completions.create(
-                model="qwen-turbo-latest",
-                messages=[
-                    {"role": "system", "content": "你是一位专业的GitHub仓库可视化专家，精通Mermaid图表。"},
-                    {"role": "user", "content": prompt}
-                ],
-                extra_body={"enable_thinking": False}
-            )
-            
-            # 提取生成的Mermaid图表
-            mermaid_chart = completion.choices[0].message.content.strip()
-            
-            # 如果图表被Markdown代码块包围，则去掉它们
-            if mermaid_chart.startswith("```mermaid"):
-                mermaid_chart = mermaid_chart.replace("```mermaid", "").replace("```", "").strip()
-            elif mermaid_chart.startswith("```"):
-                mermaid_chart = mermaid_chart.replace("```", "").strip()
-                
-            return mermaid_chart
-            
-        except Exception as api_error:
-            logger.error(f"调用通义千问API时出错: {str(api_error)}", exc_info=True)
-            # 如果API调用失败，回退到本地生成方法
-            return generate_mermaid_chart(file_structure)
-            
+        root, truncated = build_file_tree(local_repo.entries(MAX_FILES), local_repo.name, None, revision, MAX_FILES)
+        if truncated:
+            logger.warning(f"本地仓库 {local_repo.path} 文件数超过限制 {MAX_FILES}，文件树已截断")
+            root['truncated'] = True
+        return root
     except Exception as e:
-        logger.error(f"使用AI生成Mermaid图表时出错: {str(e)}", exc_info=True)
-        # 出错时回退到本地生成方法
-        return generate_mermaid_chart(file_structure)
+        logger.error(f"获取本地仓库结构时出错: {str(e)}", exc_info=True)
+        raise Exception(f"获取仓库结构失败: {str(e)}")
 
-def generate_dependency_data(file_structure):
-    """生成依赖关系数据，用于D3.js可视化"""
-    try:
-        # 创建节点和链接
-        nodes = []
-        links = []
-        node_ids = set()
-        
-        # 递归处理文件结构
-        def process_structure(node, parent_id=None):
-            node_id = node['path'] if node['path'] else node['name']
-            
-            # 避免重复节点
-            if node_id not in node_ids:
-                node_type = node['type']
-                
-                # 确定节点大小和类型
-                if node_type == 'dir':
-                    size = 10 + min(len(node['children']), 10)
-                    node_type = 'directory'
-                else:
-                    size = 5
-                    node_type = 'file'
-                
-                # 添加节点
-                nodes.append({
-                    'id': node_id,
-                    'name': node['name'],
-                    'type': node_type,
-                    'url': node['url'],
-                    'size': size
-                })
-                
-                node_ids.add(node_id)
-                
-                # 添加与父节点的链接
-                if parent_id:
-                    links.append({
-                        'source': parent_id,
-                        'target': node_id,
-                        'value': 1
-                    })
-                
-                # 处理子节点
-                if 'children' in node and node['children']:
-                    for child in node['children']:
-                        process_structure(child, node_id)
-        
-        # 开始处理
-        process_structure(file_structure)
-        
-        # 添加一些额外的依赖关系（基于文件类型和命名模式）
-        add_inferred_dependencies(nodes, links)
-        
-        return {
-            'nodes': nodes,
-            'links': links
-        }
-    except Exception as e:
-        logger.error(f"生成依赖数据时出错: {str(e)}", exc_info=True)
-        return {'nodes': [], 'links': []}
+def generate_mermaid_chart_with_ai(file_structure):
+    """使用通义千问API生成Mermaid图表
 
-def add_inferred_dependencies(nodes, links):
-    """添加推断的依赖关系"""
-    try:
-        # 创建节点ID到节点的映射
-        node_map = {node['id']: node for node in nodes}
-        
-        # 创建文件扩展名到节点ID的映射
-        extension_map = {}
-        for node in nodes:
-            if node['type'] == 'file':
-                parts = node['name'].split('.')
-                if len(parts) > 1:
-                    ext = parts[-1].lower()
-                    if ext not in extension_map:
-                        extension_map[ext] = []
-                    extension_map[ext].append(node['id'])
+    只在请求明确要求时调用，受 MERMAID_TIMEOUT 限制；结果按提示中的结构描述缓存，
+    描述不含文件大小，新提交只修改了文件内容、目录结构未变化时不再重复调用模型。
+    调用失败时抛出异常，由分析阶段回退到本地生成的图表。
+    """
+    # 准备文件结构描述，与本地图表使用相同的裁剪规则
+    structure_description = describe_tree(file_structure, MERMAID_MAX_DEPTH, MERMAID_MAX_CHILDREN)
+    
+    description_digest = hashlib.sha1(structure_description.encode('utf-8')).hexdigest()
+    cache_key = f"mermaid:v{MERMAID_PROMPT_VERSION}:{MERMAID_MODEL}:{description_digest}"
+    cached = mermaid_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    # 准备提示
+    prompt = "\n".join([
+        "我需要你将以下GitHub仓库结构转换为Mermaid流程图格式。",
+        "请严格遵守以下规则，以避免语法错误：",
+        "1.  使用 `flowchart TD` (自上而下) 格式。",
+        "2.  节点ID必须是唯一的、不含特殊字符的字母数字字符串 (例如: `node1`, `node2`)。",
+        "3.  所有节点显示的文本标签都必须用双引号 `\"` 包围 (例如: `node1[\"src/component.js\"]`)。",
+        "4.  使用 `-->` 来表示父子关系 (例如: `node1 --> node2`)。",
+        "5.  为目录节点应用样式: `style nodeId fill:#f9f,stroke:#333,stroke-width:2px`。",
+        "6.  为文件节点应用样式: `style nodeId fill:#bbf,stroke:#333,stroke-width:2px`。",
+        "7.  按模块职责对目录进行分组和概括，突出项目的整体架构。",
+        "",
+        "仓库结构:",
+        structure_description,
+        "",
+        "请只返回完整的、可直接渲染的Mermaid图表代码，不要包含任何解释或 \"mermaid\" 标记。",
+    ])
+    
+    # 调用通义千问API，请求超时与阶段超时一致，超时后不再重试
+    completion = create_completion(
+        timeout=MERMAID_TIMEOUT,
+        max_retries=0,
+        model=MERMAID_MODEL,
+        messages=[
+            {"role": "system", "content": "你是一位专业的GitHub仓库可视化专家，精通Mermaid图表。"},
+            {"role": "user", "content": prompt}
+        ],
+        extra_body={"enable_thinking": False}
+    )
+    
+    # 提取生成的Mermaid图表
+    mermaid_chart = completion.choices[0].message.content.strip()
+    
+    # 如果图表被Markdown代码块包围，则去掉它们
+    if mermaid_chart.startswith("```mermaid"):
+        mermaid_chart = mermaid_chart.replace("```mermaid", "").replace("```", "").strip()
+    elif mermaid_chart.startswith("```"):
+        mermaid_chart = mermaid_chart.replace("```", "").strip()
+    
+    if not mermaid_chart.startswith(("flowchart", "graph")):
+        raise ValueError("模型返回的内容不是有效的Mermaid流程图")
+    
+    mermaid_cache.set(cache_key, mermaid_chart)
+    return mermaid_chart
+
+def generate_dependency_data(file_structure, load_sources=None, base=None, file_data=None):
+    """生成依赖关系数据，用于D3.js可视化
+
+    load_sources(paths) 返回 {path: 源码}，提供时会解析源文件的导入语句并添加真实的依赖边。
+    base 为增量分析基线时只解析 blob SHA 变化的源文件；file_data 为字典时写入各源文件的导入语句。
+    出错（如下载超时）时抛出异常，由分析阶段使用降级结果。
+    """
+    # 创建节点和链接
+    nodes = []
+    links = []
+    node_ids = set()
+    
+    # 递归处理文件结构
+    def process_structure(node, parent_id=None):
+        node_id = node['path'] if node['path'] else node['name']
         
-        # 为JavaScript文件添加依赖关系
-        if 'js' in extension_map:
-            js_files = extension_map['js']
+        # 避免重复节点
+        if node_id not in node_ids:
+            node_type = node['type']
             
-            # 查找package.json文件
-            package_files = [node['id'] for node in nodes if node['name'] == 'package.json']
+            # 确定节点大小和类型
+            if node_type == 'dir':
+                size = 10 + min(len(node['children']), 10)
+                node_type = 'directory'
+            else:
+                size = 5
+                node_type = 'file'
             
-            # 将JS文件与package.json连接
-            for js_file in js_files:
-                for package_file in package_files:
-                    links.append({
-                        'source': js_file,
-                        'target': package_file,
-                        'value': 1
-                    })
+            # 添加节点
+            nodes.append({
+                'id': node_id,
+                'name': node['name'],
+                'type': node_type,
+                'url': node['url'],
+                'size': size
+            })
             
-            # 连接一些JS文件之间的依赖
-            if len(js_files) > 1:
-                # 使用NetworkX创建一个有向图
-                G = nx.DiGraph()
-                for node_id in js_files:
-                    G.add_node(node_id)
-                
-                # 基于命名模式添加边
-                for i, source_id in enumerate(js_files):
-                    source_name = node_map[source_id]['name'].lower()
-                    
-                    for target_id in js_files[i+1:]:
-                        target_name = node_map[target_id]['name'].lower()
-                        
-                        # 如果文件名相似，添加连接
-                        if source_name.split('.')[0] in target_name or target_name.split('.')[0] in source_name:
-                            links.append({
-                                'source': source_id,
-                                'target': target_id,
-                                'value': 2
-                            })
-        
-        # 为Python文件添加依赖关系
-        if 'py' in extension_map:
-            py_files = extension_map['py']
+            node_ids.add(node_id)
             
-            # 查找requirements.txt文件
-            req_files = [node['id'] for node in nodes if node['name'] == 'requirements.txt']
-            
-            # 将Python文件与requirements.txt连接
-            for py_file in py_files:
-                for req_file in req_files:
-                    links.append({
-                        'source': py_file,
-                        'target': req_file,
-                        'value': 1
-                    })
-    
-    except Exception as e:
-        logger.error(f"添加推断依赖关系时出错: {str(e)}", exc_info=True)
-
-def generate_code_quality_data(file_structure):
-    """生成代码质量分析数据"""
-    try:
-        # 语言分布数据
-        language_counts = {}
-        
-        # 代码复杂度数据（模拟）
-        complexity_data = []
-        
-        # 递归处理文件结构
-        def process_structure(node):
-            if node['type'] == 'file':
-                # 获取文件扩展名
-                parts = node['name'].split('.')
-                if len(parts) > 1:
-                    ext = parts[-1].lower()
-                    
-                    # 映射扩展名到语言
-                    lang = map_extension_to_language(ext)
-                    if lang:
-                        language_counts[lang] = language_counts.get(lang, 0) + 1
-                    
-                    # 为特定类型的文件生成复杂度数据
-                    if ext in ['js', 'py', 'java', 'c', 'cpp', 'cs', 'go', 'rb', 'php']:
-                        # 模拟复杂度数据
-                        complexity = random.randint(5, 30)
-                        lines = random.randint(50, 500)
-                        
-                        complexity_data.append({
-                            'file': node['name'],
-                            'complexity': complexity,
-                            'lines': lines
-                        })
+            # 添加与父节点的链接
+            if parent_id:
+                links.append({
+                    'source': parent_id,
+                    'target': node_id,
+                    'value': 1,
+                    'type': 'contains'
+                })
             
             # 处理子节点
             if 'children' in node and node['children']:
                 for child in node['children']:
-                    process_structure(child)
-        
-        # 开始处理
-        process_structure(file_structure)
-        
-        # 将语言计数转换为百分比
-        total_files = sum(language_counts.values())
-        language_distribution = []
-        
-        if total_files > 0:
-            for lang, count in language_counts.items():
-                percentage = (count / total_files) * 100
-                language_distribution.append({
-                    'language': lang,
-                    'percentage': percentage
-                })
-        
-        # 按百分比排序
-        language_distribution.sort(key=lambda x: x['percentage'], reverse=True)
-        
-        # 限制复杂度数据的数量
-        complexity_data = sorted(complexity_data, key=lambda x: x['complexity'], reverse=True)[:10]
+                    process_structure(child, node_id)
+    
+    # 开始处理
+    process_structure(file_structure)
+    
+    # 根据源文件中的导入语句添加依赖关系
+    if load_sources:
+        add_import_dependencies(file_structure, links, load_sources, base, file_data)
+    
+    return {
+        'nodes': nodes,
+        'links': links
+    }
+
+def graph_layout_key(owner, repo_name, commit_sha, local_repo=None):
+    """依赖图布局的缓存键，依赖数据格式或布局算法变化时失效"""
+    repo_key = f"local:{local_repo.path}" if local_repo is not None else f"{owner.lower()}/{repo_name.lower()}"
+    return f"layout:v{ANALYSIS_CACHE_VERSION}.{LAYOUT_VERSION}:{repo_key}@{commit_sha}"
+
+def load_graph_layout(owner, repo_name, commit_sha, local_repo=None, dependency_data=None, previous=None):
+    """获取依赖图布局：依次查找进程内缓存、持久化的坐标，都没有时重新计算
+
+    未提供 dependency_data 时从分析结果缓存中读取，该版本尚未分析时返回 None。
+    重新计算时以 previous（上一版本的坐标 {节点ID: (x, y)}）为初始位置。
+    """
+    key = graph_layout_key(owner, repo_name, commit_sha, local_repo)
+    layout = graph_layouts.get(key)
+    if layout is not None:
+        return layout
+    
+    if dependency_data is None:
+        for use_ai in (False, True):
+            result = analysis_cache.get(analysis_cache_key(owner, repo_name, commit_sha, local_repo, use_ai))
+            if result is not None:
+                dependency_data = result.get('dependencyData')
+                break
+        if not dependency_data:
+            return None
+    
+    # 布局依赖 numpy，只有达到 LAYOUT_MIN_NODES 的依赖图才需要，首次使用时才加载
+    from graph_layout import GraphLayout
+    positions = layout_cache.get(key)
+    layout = GraphLayout(dependency_data, positions=positions, previous=previous)
+    if positions is None or len(positions) != len(layout.positions):
+        layout_cache.set(key, layout.to_positions())
+    graph_layouts.set(key, layout)
+    return layout
+
+def base_layout_positions(owner, repo_name, local_repo, base):
+    """增量分析基线的依赖图坐标 {节点ID: [x, y]}，基线的布局不在缓存中时返回 None（不为旧版本重新计算）"""
+    key = graph_layout_key(owner, repo_name, base.commit, local_repo)
+    layout = graph_layouts.get(key)
+    if layout is not None:
+        return {node['id']: position for node, position in zip(layout.nodes, layout.to_positions())}
+    nodes = (base.result.get('dependencyData') or {}).get('nodes', [])
+    positions = layout_cache.get(key)
+    if positions is None or len(positions) != len(nodes):
+        return None
+    return {node['id']: position for node, position in zip(nodes, positions)}
+
+def compute_graph_layout(owner, repo_name, commit_sha, local_repo, dependency_data, base=None):
+    """依赖图节点数达到 LAYOUT_MIN_NODES 时在服务端计算布局，返回布局摘要
+
+    摘要中的 ref 用于向 /api/graph 查询聚合视图；较小的依赖图返回 None，由浏览器实时布局。
+    有增量分析基线时以基线的坐标为初始位置，只需少量迭代，已有节点的位置也保持不变。
+    """
+    if len(dependency_data['nodes']) < LAYOUT_MIN_NODES:
+        return None
+    previous = base_layout_positions(owner, repo_name, local_repo, base) if base is not None else None
+    layout = load_graph_layout(owner, repo_name, commit_sha, local_repo, dependency_data, previous)
+    return {**layout.summary(), 'ref': commit_sha}
+
+def iter_files(file_structure):
+    """遍历文件树中的所有文件节点"""
+    stack = [file_structure]
+    while stack:
+        node = stack.pop()
+        if node['type'] == 'file':
+            yield node
+        else:
+            stack.extend(reversed(node.get('children', [])))
+
+def split_file_results(kind, files, base, file_structure):
+    """按增量分析基线将文件分为 (可沿用的结果 {path: 结果}, 需要重新计算的文件列表)，没有基线时全部重新计算"""
+    if base is None:
+        return {}, files
+    reused, missing = base.split(kind, files, base.diff(file_structure))
+    INCREMENTAL_FILES.inc(len(reused), kind=kind, result='reused')
+    INCREMENTAL_FILES.inc(len(missing), kind=kind, result='computed')
+    return reused, missing
+
+def add_import_dependencies(file_structure, links, load_sources, base=None, file_data=None):
+    """解析源文件的导入语句，添加文件之间的依赖关系
+
+    有增量分析基线时，blob SHA 未变化的文件沿用基线中的导入语句；文件路径集合也未变化时，
+    这些文件的依赖边与基线相同，只需解析修改过的文件。
+    """
+    all_paths = []
+    source_files = []
+    for node in iter_files(file_structure):
+        all_paths.append(node['path'])
+        if is_source_file(node['path']) and (node.get('size') or 0) <= MAX_PARSE_FILE_SIZE:
+            source_files.append({'path': node['path'], 'sha': node.get('sha')})
+    
+    capped = len(source_files) > MAX_PARSE_FILES
+    if capped:
+        logger.warning(f"源文件数 {len(source_files)} 超过解析上限 {MAX_PARSE_FILES}，仅解析前 {MAX_PARSE_FILES} 个")
+        source_files = source_files[:MAX_PARSE_FILES]
+    
+    imports, missing = split_file_results('imports', source_files, base, file_structure)
+    if missing:
+        imports.update(parse_sources(missing, load_sources))
+    if file_data is not None:
+        file_data['imports'] = imports
+    
+    diff = base.diff(file_structure) if base is not None else None
+    if diff is not None and not diff.paths_changed and not capped:
+        # 修补基线的依赖边：去掉修改过的文件的旧依赖边，只解析重新计算的文件
+        recomputed = {f['path'] for f in missing}
+        edges = [(link['source'], link['target']) for link in base.result['dependencyData']['links']
+                 if link['type'] == 'import' and link['source'] not in diff.modified
+                 and link['source'] not in recomputed]
+        edges += resolve_import_edges({path: imports[path] for path in recomputed if path in imports}, all_paths)
+        edges.sort()
+    else:
+        edges = resolve_import_edges(imports, all_paths)
+    
+    for source, target in edges:
+        links.append({
+            'source': source,
+            'target': target,
+            'value': 2,
+            'type': 'import'
+        })
+
+def generate_code_quality_data(file_structure, load_sources=None, base=None, file_data=None):
+    """生成代码质量分析数据
+
+    语言分布按文件扩展名统计；提供 load_sources 时读取源码计算每个文件的真实度量
+    （总行数、有效代码行数、圈复杂度、函数数量）。base 为增量分析基线时只计算 blob SHA 变化的文件，
+    file_data 为字典时写入各文件的度量。出错时抛出异常，由分析阶段使用降级结果。
+    """
+    # 语言分布数据
+    language_counts = {}
+    metrics_files = []
+    
+    for node in iter_files(file_structure):
+        # 获取文件扩展名
+        parts = node['name'].split('.')
+        if len(parts) > 1:
+            ext = parts[-1].lower()
+            
+            # 映射扩展名到语言
+            lang = map_extension_to_language(ext)
+            if lang:
+                language_counts[lang] = language_counts.get(lang, 0) + 1
         
-        return {
-            'languageDistribution': language_distribution,
-            'complexity': complexity_data
-        }
-    except Exception as e:
-        logger.error(f"生成代码质量数据时出错: {str(e)}", exc_info=True)
-        return {
-            'languageDistribution': [],
-            'complexity': []
-        }
+        if load_sources and is_metrics_file(node['path']) and (node.get('size') or 0) <= MAX_PARSE_FILE_SIZE:
+            metrics_files.append({'path': node['path'], 'sha': node.get('sha')})
+    
+    # 将语言计数转换为百分比
+    total_files = sum(language_counts.values())
+    language_distribution = []
+    
+    if total_files > 0:
+        for lang, count in language_counts.items():
+            percentage = (count / total_files) * 100
+            language_distribution.append({
+                'language': lang,
+                'percentage': percentage
+            })
+    
+    # 按百分比排序
+    language_distribution.sort(key=lambda x: x['percentage'], reverse=True)
+    
+    if len(metrics_files) > MAX_PARSE_FILES:
+        logger.warning(f"可度量文件数 {len(metrics_files)} 超过上限 {MAX_PARSE_FILES}，仅计算前 {MAX_PARSE_FILES} 个")
+        metrics_files = metrics_files[:MAX_PARSE_FILES]
+    
+    metrics, missing = split_file_results('metrics', metrics_files, base, file_structure)
+    if missing:
+        metrics.update(compute_file_metrics(missing, load_sources))
+    if file_data is not None and load_sources:
+        file_data['metrics'] = metrics
+    
+    # 代码复杂度数据，只统计包含逻辑代码的文件
+    complexity_data = []
+    for path, m in metrics.items():
+        if m['complexity'] > 0:
+            complexity_data.append({
+                'file': path.rsplit('/', 1)[-1],
+                'path': path,
+                'complexity': m['complexity'],
+                'lines': m['loc'],
+                'sloc': m['sloc'],
+                'functions': m['functions']
+            })
+    
+    # 限制复杂度数据的数量
+    complexity_data = sorted(complexity_data, key=lambda x: (-x['complexity'], x['path']))[:10]
+    
+    summary = {
+        'files': len(metrics),
+        'loc': sum(m['loc'] for m in metrics.values()),
+        'sloc': sum(m['sloc'] for m in metrics.values()),
+        'functions': sum(m['functions'] for m in metrics.values()),
+        'complexity': sum(m['complexity'] for m in metrics.values())
+    }
+    
+    return {
+        'languageDistribution': language_distribution,
+        'complexity': complexity_data,
+        'summary': summary
+    }
 
 def map_extension_to_language(ext):
     """将文件扩展名映射到编程语言"""
@@ -577,59 +1691,47 @@ def map_extension_to_language(ext):
     return mapping.get(ext)
 
 def generate_mermaid_chart(file_structure):
-    """生成简单的Mermaid图表"""
-    mermaid_lines = ["flowchart TD"]
-    node_ids = {}
-    node_counter = 1
-    
-    def safe_id(name):
-        """生成安全的Mermaid ID"""
-        return f"node{node_counter}"
-    
-    def process_node(node, parent_id=None, level=0):
-        nonlocal node_counter
-        
-        # 限制层级深度
-        if level > 3:
-            return
-        
-        # 为当前节点生成ID
-        node_id = safe_id(node['name'])
-        node_counter += 1
-        
-        # 存储节点ID
-        node_ids[node['path'] if node['path'] else node['name']] = node_id
-        
-        # 添加节点定义
-        if node['type'] == 'dir':
-            label = f"{node['name']} (目录)"
-            style = "fill:#f9f,stroke:#333,stroke-width:1px"
-        else:
-            label = node['name']
-            style = "fill:#bbf,stroke:#333,stroke-width:1px"
-        
-        # 添加URL链接
-        url = node['url'] if 'url' in node else '#'
-        mermaid_lines.append(f'{node_id}["{label}"]')
-        mermaid_lines.append(f'click {node_id} href "{url}" _blank')
-        mermaid_lines.append(f'style {node_id} {style}')
-        
-        # 添加与父节点的连接
-        if parent_id:
-            mermaid_lines.append(f"{parent_id} --> {node_id}")
-        
-        # 处理子节点
-        if 'children' in node and node['children']:
-            # 限制子节点数量
-            for i, child in enumerate(node['children']):
-                if i >= 10:  # 最多显示10个子节点
-                    break
-                process_node(child, node_id, level + 1)
-    
-    # 开始处理
-    process_node(file_structure)
-    
-    return "\n".join(mermaid_lines)
+    """在本地生成Mermaid图表，展开层数、子节点数和节点总数由配置决定"""
+    return build_mermaid_chart(file_structure, MERMAID_MAX_DEPTH, MERMAID_MAX_CHILDREN, MERMAID_MAX_NODES)
+
+async def warm_up_clients():
+    get_async_client()
+    if DASHSCOPE_API_KEY:
+        get_dashscope_client()
+
+def warm_up():
+    """预先加载延迟导入的依赖（openai、httpx、requests、numpy），启动事件循环并创建本进程的客户端，
+    避免由第一个请求承担这些开销"""
+    started = time.perf_counter()
+    try:
+        importlib.import_module('graph_layout')
+        get_scheduler()
+        run_async(warm_up_clients())
+    except Exception as e:
+        logger.warning(f"预热失败: {str(e)}")
+        return
+    logger.info(f"预热完成，耗时 {(time.perf_counter() - started) * 1000:.0f} ms")
+
+_warm_up_thread = None
+
+def start_warm_up():
+    """在后台线程中预热，不阻塞导入和请求处理"""
+    global _warm_up_thread
+    _warm_up_thread = threading.Thread(target=warm_up, name='warm-up', daemon=True)
+    _warm_up_thread.start()
+
+def wait_for_warm_up():
+    # fork 前等待预热结束，避免子进程继承导入到一半的模块锁；gunicorn --preload 时工作进程共享主进程已加载的模块，
+    # 预热创建的客户端在子进程中由各模块重置，首次使用时重新创建
+    thread = _warm_up_thread
+    if thread is not None and thread is not threading.current_thread():
+        thread.join()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(before=wait_for_warm_up)
+
+if WARM_UP:
+    start_warm_up()
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=8088) 
\ No newline at end of file
@@ -0,0 +1,124 @@
+"""
+归档包获取模块
+一次性下载仓库在指定提交下的 tarball/zipball，并以流式方式解包，
+在单次遍历中同时得到文件列表（含按 git 规则计算的 blob SHA）和后续阶段需要的源码内容。
+"""
+import hashlib
+import logging
+import tarfile
+import tempfile
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+SPOOL_MAX_MEMORY = 64 * 1024 * 1024  # zip 格式需要可随机访问的文件，超过该大小时才落盘
+
+
+def git_blob_sha(data):
+    """按 git 的规则计算 blob SHA，与 Git Trees API 返回的 sha 一致"""
+    header = f"blob {len(data)}\0".encode()
+    return hashlib.sha1(header + data).hexdigest()
+
+
+class ArchiveSnapshot:
+    """归档包解析结果
+
+    entries 为与 Git Trees API 相同格式的条目列表，contents 为 {path: 文本} 形式的源码内容。
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.contents = {}
+        self.content_bytes = 0
+        self.truncated = False
+
+
+def _strip_prefix(name):
+    """去掉 GitHub 归档包中 "{owner}-{repo}-{sha}/" 形式的顶层目录"""
+    _, _, path = name.partition('/')
+    return path.rstrip('/')
+
+
+def _iter_tar(fileobj):
+    # 'r|*' 为流式模式，只顺序读取，不需要随机访问
+    with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+        for member in archive:
+            path = _strip_prefix(member.name)
+            if not path:
+                continue
+            if member.isdir():
+                yield path, 'tree', None
+            elif member.isfile():
+                yield path, 'blob', archive.extractfile(member)
+
+
+def _iter_zip(fileobj):
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY) as spool:
+        while True:
+            block = fileobj.read(1024 * 1024)
+            if not block:
+                break
+            spool.write(block)
+        spool.seek(0)
+        with zipfile.ZipFile(spool) as archive:
+            for info in archive.infolist():
+                path = _strip_prefix(info.filename)
+                if not path:
+                    continue
+                if info.is_dir():
+                    yield path, 'tree', None
+                else:
+                    with archive.open(info) as member:
+                        yield path, 'blob', member
+
+
+def read_archive(fileobj, fmt, max_files, keep_content, max_content_bytes):
+    """解析归档流，返回 ArchiveSnapshot
+
+    keep_content(path, size) 决定是否保留该文件的文本内容；保留内容的总大小不超过 max_content_bytes。
+    文件数达到 max_files 后停止读取。
+    """
+    snapshot = ArchiveSnapshot()
+    file_count = 0
+    members = _iter_zip(fileobj) if fmt == 'zip' else _iter_tar(fileobj)
+
+    for path, entry_type, member in members:
+        if entry_type == 'tree':
+            snapshot.entries.append({'path': path, 'type': 'tree', 'sha': None, 'size': None})
+            continue
+
+        if file_count >= max_files:
+            snapshot.truncated = True
+            break
+
+        data = member.read()
+        snapshot.entries.append({'path': path, 'type': 'blob', 'sha': git_blob_sha(data), 'size': len(data)})
+        file_count += 1
+
+        if keep_content(path, len(data)) and snapshot.content_bytes + len(data) <= max_content_bytes:
+            # 跳过二进制文件
+            if b'\0' not in data[:8192]:
+                snapshot.contents[path] = data.decode('utf-8', errors='replace')
+                snapshot.content_bytes += len(data)
+
+    return snapshot
+
+
+def fetch_archive_snapshot(session, api_url, owner, repo_name, ref, max_files, keep_content,
+                           max_content_bytes, fmt='tar', timeout=60):
+    """下载并解析仓库在指定提交下的归档包
+
+    session 为具有 requests 风格 get 方法的对象（如 requests.Session 或 GitHub 请求调度器）。
+    """
+    kind = 'zipball' if fmt == 'zip' else 'tarball'
+    with session.get(f"{api_url}/repos/{owner}/{repo_name}/{kind}/{ref}", stream=True, timeout=timeout) as resp:
+        resp.raise_for_status()
+        # 由 urllib3 负责解码传输层的 gzip，归档本身的压缩由 tarfile 处理
+        resp.raw.decode_content = True
+        snapshot = read_archive(resp.raw, fmt, max_files, keep_content, max_content_bytes)
+
+    if snapshot.truncated:
+        logger.warning(f"仓库 {owner}/{repo_name} 文件数超过限制 {max_files}，归档读取已截断")
+    logger.info(f"已从归档包读取 {owner}/{repo_name}@{ref}: {len(snapshot.entries)} 个条目，"
+                f"保留源码 {len(snapshot.contents)} 个（{snapshot.content_bytes} 字节）")
+    return snapshot
@@ -0,0 +1,103 @@
+"""
+异步 I/O 运行时模块
+进程内只有一个事件循环，运行在后台线程中。所有出站 HTTP 请求（GitHub REST、raw 下载、通义千问）都以协程形式
+在这个循环上执行，共享 httpx.AsyncClient / openai.AsyncOpenAI 的连接池；请求线程和分析阶段线程只等待结果，
+数百个并发下载只占用一个线程和有限的连接数，而不是每次调用各开一个线程池。
+"""
+import asyncio
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_loop = None
+_thread = None
+_resources = {}
+
+
+def _start_loop():
+    global _loop, _thread
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.call_soon(ready.set)
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, name='async-io', daemon=True)
+    thread.start()
+    ready.wait()
+    _loop, _thread = loop, thread
+
+
+def get_loop():
+    """获取共享事件循环，首次调用时启动循环线程"""
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                _start_loop()
+    return _loop
+
+
+def _reset_after_fork():
+    # fork 出的子进程中没有循环线程，绑定到旧循环的客户端也不能再使用，下次调用时重新创建
+    global _lock, _loop, _thread
+    _lock = threading.Lock()
+    _loop = None
+    _thread = None
+    _resources.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def loop_resource(name, factory):
+    """返回绑定到共享事件循环的单例（如 httpx.AsyncClient、asyncio.Semaphore），只能在循环中调用"""
+    resource = _resources.get(name)
+    if resource is None:
+        resource = _resources[name] = factory()
+    return resource
+
+
+def submit_async(coro):
+    """将协程提交到共享事件循环，返回 concurrent.futures.Future
+
+    协程在调用方上下文的副本中执行，截止时间、请求优先级和 Server-Timing 记录都随之传递；
+    取消返回的 future 会取消协程。
+    """
+    loop = get_loop()
+    if threading.current_thread() is _thread:
+        coro.close()
+        raise RuntimeError("不能在事件循环线程中同步等待协程")
+    return asyncio.run_coroutine_threadsafe(coro, loop)
+
+
+def run_async(coro):
+    """在共享事件循环上执行协程并等待结果；等待被中断时取消协程"""
+    future = submit_async(coro)
+    try:
+        return future.result()
+    except BaseException:
+        future.cancel()
+        raise
+
+
+async def _next_item(iterator):
+    try:
+        return False, await iterator.__anext__()
+    except StopAsyncIteration:
+        return True, None
+
+
+def iterate_async(aiterable):
+    """在同步代码中逐个获取异步迭代器（如 openai.AsyncStream）的元素"""
+    iterator = aiterable.__aiter__()
+    while True:
+        finished, item = run_async(_next_item(iterator))
+        if finished:
+            return
+        yield item
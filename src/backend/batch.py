@@ -0,0 +1,88 @@
+"""
+批量分析模块
+以有界窗口并发执行一组分析目标，哪个先完成就先返回哪个；每个目标完成时立即把结果记录到持久化缓存，
+客户端断开或服务重启后以相同的批次ID重新提交，已完成的目标直接取回记录，只执行剩余的目标。
+"""
+import contextvars
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait
+
+logger = logging.getLogger(__name__)
+
+
+class BatchStore:
+    """批次进度的持久化存储
+
+    批次的目标列表和每个目标的完成记录分别存为独立的缓存项，记录一个目标的完成只写入一个小条目，
+    写入量与目标数成正比。
+    """
+
+    def __init__(self, cache, ttl, prefix='batch:v1'):
+        self.cache = cache
+        self.ttl = ttl
+        self.prefix = prefix
+        self._lock = threading.Lock()
+
+    def open(self, batch_id, targets, options=None):
+        """登记批次的目标列表和选项，返回 {序号: 完成记录}；批次已存在且目标和选项一致时包含之前的完成记录"""
+        key = f"{self.prefix}:{batch_id}"
+        spec = {'targets': targets, 'options': options}
+        with self._lock:
+            previous = self.cache.get(key)
+            if previous != spec:
+                # 新批次，或同一批次ID的目标已变化，旧的完成记录按序号对应不上，全部作废
+                for index in range(len(previous['targets']) if previous else 0):
+                    self.cache.delete(f"{key}:{index}")
+                self.cache.set(key, spec, ttl=self.ttl)
+                return {}
+        completed = {}
+        for index in range(len(targets)):
+            entry = self.cache.get(f"{key}:{index}")
+            if entry is not None:
+                completed[index] = entry
+        return completed
+
+    def record(self, batch_id, index, entry):
+        """记录批次中一个目标的完成情况"""
+        self.cache.set(f"{self.prefix}:{batch_id}:{index}", entry, ttl=self.ttl)
+
+    def discard(self, batch_id, index):
+        """删除一个目标的完成记录（例如记录指向的结果已被淘汰），下次恢复时重新执行"""
+        self.cache.delete(f"{self.prefix}:{batch_id}:{index}")
+
+
+def run_batch(items, fn, executor, concurrency, heartbeat=None):
+    """并发执行 fn(arg)，按完成顺序逐个产出 (序号, 返回值, 异常)
+
+    items 为 (序号, arg) 的可迭代对象，同时最多提交 concurrency 个任务，完成一个再补充一个。
+    每个任务在新的空上下文中执行，不继承调用方的截止时间和请求优先级，由 fn 自行设置。
+    提供 heartbeat 时，超过该秒数没有任务完成则产出 None，供调用方发送保活消息。
+    生成器被关闭时取消尚未开始的任务，已在执行的任务继续运行至结束。
+    """
+    iterator = iter(items)
+    pending = {}
+
+    def fill():
+        while len(pending) < concurrency:
+            item = next(iterator, None)
+            if item is None:
+                return
+            index, arg = item
+            pending[executor.submit(contextvars.Context().run, fn, arg)] = index
+
+    try:
+        fill()
+        while pending:
+            done, _ = wait(pending, timeout=heartbeat, return_when=FIRST_COMPLETED)
+            if not done:
+                yield None
+                continue
+            for future in done:
+                index = pending.pop(future)
+                error = future.exception()
+                yield index, None if error else future.result(), error
+            fill()
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,261 @@
+"""
+结果缓存模块
+提供进程内的 LRU/TTL 内存缓存和基于 SQLite 的持久化缓存，两者接口一致，均支持命中率统计。
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import weakref
+import zlib
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# 所有 SQLite 缓存实例，fork 后在子进程中重置连接
+_sqlite_caches = weakref.WeakSet()
+# 从父进程继承的连接：SQLite 连接不能跨 fork 使用，在子进程中关闭也可能影响父进程，只保留引用不再使用
+_inherited_connections = []
+
+
+class MemoryCache:
+    """进程内 LRU 缓存，条目带有过期时间
+
+    适合缓存仓库句柄、元数据等生命周期短且无需跨进程共享的对象。
+    提供 max_bytes 时同时按总大小淘汰，sizeof(值) 返回条目的字节数；单个条目超过 max_bytes 时不缓存。
+    """
+
+    def __init__(self, max_entries=1024, default_ttl=300, max_bytes=None, sizeof=None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """读取缓存，未命中或已过期时返回 None"""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] < now:
+                if item is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value, ttl=None):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.default_ttl)
+        size = self.sizeof(value) if self.sizeof else 0
+        with self._lock:
+            self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or (self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._bytes -= self._data.popitem(last=False)[1][2]
+
+    def delete(self, key):
+        """删除缓存条目"""
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        # 调用方需持有锁
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._bytes -= item[2]
+
+    def stats(self):
+        """返回缓存统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRatio': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._data),
+            'maxEntries': self.max_entries,
+            **({'bytes': self._bytes, 'maxBytes': self.max_bytes} if self.max_bytes is not None else {})
+        }
+
+
+class SqliteCache:
+    """基于 SQLite 的持久化缓存
+
+    值以压缩后的 JSON 存储；读取时更新访问时间（距上次记录不足 ACCESS_UPDATE_INTERVAL 秒时跳过），
+    写入后按访问时间淘汰最久未使用的条目，直到总大小不超过 max_bytes。总大小在进程内累计，
+    每隔 RESYNC_INTERVAL 秒或估计值超限时才清理过期条目并从数据库重新统计，校正其他进程写入造成的偏差。
+    数据库在第一次读写时才打开，每个进程（包括 fork 出的子进程）使用自己的连接。
+    """
+
+    ACCESS_UPDATE_INTERVAL = 60
+    RESYNC_INTERVAL = 300
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, default_ttl=7 * 24 * 3600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = None
+        self._total_size = 0
+        self._synced_at = 0.0
+        _sqlite_caches.add(self)
+
+    @property
+    def _conn(self):
+        """当前进程的数据库连接，首次访问时打开（调用方需持有锁）"""
+        if self._db is None:
+            self._db = self._connect()
+            self._total_size = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0]
+            self._synced_at = time.time()
+        return self._db
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache(accessed_at)')
+        conn.commit()
+        return conn
+
+    def _reset_after_fork(self):
+        if self._db is not None:
+            _inherited_connections.append(self._db)
+        self._db = None
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """读取缓存，未命中或已过期时返回 None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, size, expires_at, accessed_at FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+
+            if row is None or row[2] < now:
+                if row is not None:
+                    self._conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+                    self._conn.commit()
+                    self._total_size -= row[1]
+                self.misses += 1
+                return None
+
+            # LRU 只需要粗粒度的访问时间，最近已更新过的条目不再写库
+            if now - row[3] >= self.ACCESS_UPDATE_INTERVAL:
+                self._conn.execute('UPDATE cache SET accessed_at = ? WHERE key = ?', (now, key))
+                self._conn.commit()
+            self.hits += 1
+
+        try:
+            return json.loads(zlib.decompress(row[0]))
+        except Exception as e:
+            logger.warning(f"缓存条目 {key} 解析失败: {str(e)}")
+            self.delete(key)
+            return None
+
+    def set(self, key, value, ttl=None):
+        """写入缓存"""
+        blob = zlib.compress(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+        now = time.time()
+        expires_at = now + (ttl if ttl is not None else self.default_ttl)
+
+        with self._lock:
+            old = self._conn.execute('SELECT size FROM cache WHERE key = ?', (key,)).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO cache (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)',
+                (key, blob, len(blob), expires_at, now)
+            )
+            self._total_size += len(blob) - (old[0] if old else 0)
+            self._evict(now)
+            self._conn.commit()
+
+    def delete(self, key):
+        """删除缓存条目"""
+        with self._lock:
+            row = self._conn.execute('SELECT size FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return
+            self._conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+            self._conn.commit()
+            self._total_size -= row[0]
+
+    def _evict(self, now):
+        """按LRU顺序淘汰直到总大小符合限制；定期或估计总大小超限时先清理过期条目并重新统计（调用方需持有锁）"""
+        if self._total_size > self.max_bytes or now - self._synced_at >= self.RESYNC_INTERVAL:
+            self._conn.execute('DELETE FROM cache WHERE expires_at < ?', (now,))
+            self._total_size = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0]
+            self._synced_at = now
+
+        total = self._total_size
+        if total <= self.max_bytes:
+            return
+
+        rows = self._conn.execute('SELECT key, size FROM cache ORDER BY accessed_at ASC').fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._conn.executemany('DELETE FROM cache WHERE key = ?', evicted)
+        self._total_size = total
+        logger.info(f"缓存超出大小限制，已淘汰 {len(evicted)} 个条目")
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            entries, size = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache'
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRatio': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'bytes': size,
+            'maxBytes': self.max_bytes
+        }
+
+
+def _reset_sqlite_caches():
+    for cache in list(_sqlite_caches):
+        cache._reset_after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_sqlite_caches)
+
+
+def create_cache(backend, name, cache_dir, max_bytes, max_entries, default_ttl):
+    """按配置创建缓存后端：'sqlite' 为持久化缓存，'memory' 为进程内缓存"""
+    if backend == 'memory':
+        return MemoryCache(max_entries=max_entries, default_ttl=default_ttl)
+    if backend == 'sqlite':
+        return SqliteCache(os.path.join(cache_dir, f"{name}.sqlite3"), max_bytes=max_bytes, default_ttl=default_ttl)
+    raise ValueError(f"未知的缓存后端: {backend}")
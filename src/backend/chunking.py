@@ -0,0 +1,94 @@
+"""
+代码分块模块
+按顶层定义（函数、类等）将大文件切分为不超过令牌预算的代码块，用于分段解释后再汇总。
+"""
+import ast
+import re
+
+# 常见语言中顶层定义的起始行（不缩进）
+TOP_LEVEL_PATTERN = re.compile(
+    r'^(?:export\s+|public\s+|private\s+|protected\s+|internal\s+|static\s+|abstract\s+|final\s+|async\s+|pub(?:\([^)]*\))?\s+|default\s+)*'
+    r'(?:def|class|function|func|fn|interface|struct|enum|trait|impl|module|namespace|type|const|let|var|object|package|@)\b'
+)
+
+
+def estimate_tokens(text):
+    """粗略估算文本的令牌数（按约4个字符一个令牌计算）"""
+    return max(1, len(text) // 4)
+
+
+def _python_boundaries(code):
+    """返回 Python 顶层语句的起始行号（从0开始），语法错误时返回 None"""
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+
+    boundaries = []
+    for node in tree.body:
+        lineno = node.lineno
+        # 装饰器属于定义的一部分
+        decorators = getattr(node, 'decorator_list', None)
+        if decorators:
+            lineno = min(d.lineno for d in decorators)
+        boundaries.append(lineno - 1)
+    return boundaries
+
+
+def _generic_boundaries(lines):
+    """通过正则识别顶层定义的起始行号"""
+    return [i for i, line in enumerate(lines) if TOP_LEVEL_PATTERN.match(line)]
+
+
+def split_code(path, code, max_tokens):
+    """将代码切分为若干块，返回 [(起始行, 结束行, 代码文本)]，行号从1开始
+
+    优先在顶层定义处切分；单个定义超出预算时按行继续切分。
+    """
+    lines = code.splitlines(keepends=True)
+    if not lines:
+        return []
+
+    boundaries = None
+    if path.endswith('.py'):
+        boundaries = _python_boundaries(code)
+    if boundaries is None:
+        boundaries = _generic_boundaries(lines)
+
+    # 得到按顶层定义划分的片段
+    starts = sorted(set([0] + [b for b in boundaries if 0 < b < len(lines)]))
+    segments = [(start, end) for start, end in zip(starts, starts[1:] + [len(lines)])]
+
+    max_chars = max_tokens * 4
+    chunks = []
+    chunk_start, chunk_chars = None, 0
+
+    def flush(end):
+        nonlocal chunk_start, chunk_chars
+        if chunk_start is not None and end > chunk_start:
+            chunks.append((chunk_start + 1, end, ''.join(lines[chunk_start:end])))
+        chunk_start, chunk_chars = None, 0
+
+    for start, end in segments:
+        size = sum(len(line) for line in lines[start:end])
+
+        if size > max_chars:
+            # 过大的片段单独按行切分
+            flush(start)
+            piece_start, piece_chars = start, 0
+            for i in range(start, end):
+                if piece_chars and piece_chars + len(lines[i]) > max_chars:
+                    chunks.append((piece_start + 1, i, ''.join(lines[piece_start:i])))
+                    piece_start, piece_chars = i, 0
+                piece_chars += len(lines[i])
+            chunks.append((piece_start + 1, end, ''.join(lines[piece_start:end])))
+            continue
+
+        if chunk_start is not None and chunk_chars + size > max_chars:
+            flush(start)
+        if chunk_start is None:
+            chunk_start = start
+        chunk_chars += size
+
+    flush(len(lines))
+    return chunks
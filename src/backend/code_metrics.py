@@ -0,0 +1,223 @@
+"""
+代码度量模块
+计算每个文件的总行数（LOC）、有效代码行数（SLOC）、圈复杂度和函数数量。
+Python 基于 ast 精确计算，其他语言基于注释/字符串剥离后的关键字匹配进行近似估算。
+计算在进程池中进行，结果按文件内容的 blob SHA 缓存。
+"""
+import ast
+import re
+
+from caching import MemoryCache
+from process_pool import map_blobs
+
+METRICS_CACHE_VERSION = 1  # 度量结果格式版本
+
+_STRING_DOUBLE = r'"(?:\\.|[^"\\\n])*"'
+_STRING_SINGLE = r"'(?:\\.|[^'\\\n])*'"
+_STRING_BACKTICK = r'`(?:\\.|[^`\\])*`'
+_TRIPLE_STRINGS = r'"""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\''
+_C_COMMENTS = r'/\*[\s\S]*?\*/|//[^\n]*'
+_HASH_COMMENT = r'#[^\n]*'
+
+_C_BRANCHES = r'\b(?:if|for|while|case|catch)\b|&&|\|\||\?(?![.?:])'
+_C_METHOD = (
+    r'^[ \t]*(?!(?:if|for|while|switch|catch|return|else|do|new|sizeof|throw)\b)'
+    r'(?:[\w<>\[\],*&:~?]+[ \t]+)+[\w~]+[ \t]*\([^;{}()]*\)[ \t]*(?:const[ \t]*)?(?:throws[ \t]+[\w., ]+)?\s*\{'
+)
+_JS_FUNCTIONS = (
+    r'\bfunction\b|=>|^[ \t]*(?:async[ \t]+|static[ \t]+|get[ \t]+|set[ \t]+)*'
+    r'(?!(?:if|for|while|switch|catch|return|function)\b)[A-Za-z_$][\w$]*[ \t]*\([^;{}()]*\)[ \t]*\{'
+)
+
+# 各语言的语法规则：注释与字符串模式、分支关键字模式、函数定义模式；分支为 None 表示不计算复杂度
+_C_LIKE = {
+    'strip': [_C_COMMENTS, _STRING_DOUBLE, _STRING_SINGLE],
+    'branches': _C_BRANCHES,
+    'functions': _C_METHOD,
+}
+_JS_LIKE = {
+    'strip': [_C_COMMENTS, _STRING_BACKTICK, _STRING_DOUBLE, _STRING_SINGLE],
+    'branches': _C_BRANCHES,
+    'functions': _JS_FUNCTIONS,
+}
+_MARKUP = {'strip': [], 'branches': None, 'functions': None}
+
+LANGUAGE_RULES = {
+    'js': _JS_LIKE,
+    'ts': _JS_LIKE,
+    'jsx': _JS_LIKE,
+    'tsx': _JS_LIKE,
+    'vue': _JS_LIKE,
+    'svelte': _JS_LIKE,
+    'py': {
+        'strip': [_TRIPLE_STRINGS, _HASH_COMMENT, _STRING_DOUBLE, _STRING_SINGLE],
+        'branches': r'\b(?:if|elif|for|while|except|and|or|case)\b',
+        'functions': r'^[ \t]*(?:async[ \t]+)?def\b|\blambda\b',
+    },
+    'java': _C_LIKE,
+    'c': _C_LIKE,
+    'cpp': _C_LIKE,
+    'cs': {**_C_LIKE, 'branches': _C_BRANCHES + r'|\bforeach\b|\?\?'},
+    'go': {
+        'strip': [_C_COMMENTS, _STRING_BACKTICK, _STRING_DOUBLE, _STRING_SINGLE],
+        'branches': r'\b(?:if|for|case)\b|&&|\|\|',
+        'functions': r'^func\b|\bfunc[ \t]*\(',
+    },
+    'rb': {
+        'strip': [r'^=begin[\s\S]*?^=end', _HASH_COMMENT, _STRING_DOUBLE, _STRING_SINGLE],
+        'branches': r'\b(?:if|elsif|unless|while|until|for|when|rescue|and|or)\b|&&|\|\||\?(?=\s)',
+        'functions': r'^[ \t]*def\b',
+    },
+    'php': {
+        'strip': [_C_COMMENTS, _HASH_COMMENT, _STRING_DOUBLE, _STRING_SINGLE],
+        'branches': r'\b(?:if|elseif|for|foreach|while|case|catch)\b|&&|\|\||\?(?![?:>])',
+        'functions': r'\bfunction\b|\bfn[ \t]*\(',
+    },
+    'swift': {**_C_LIKE, 'branches': r'\b(?:if|guard|for|while|repeat|case|catch)\b|&&|\|\||\?\?', 'functions': r'\bfunc\b'},
+    'kt': {**_C_LIKE, 'branches': r'\b(?:if|for|while|catch)\b|->|&&|\|\||\?:', 'functions': r'\bfun\b'},
+    'rs': {
+        'strip': [_C_COMMENTS, _STRING_DOUBLE],
+        'branches': r'\b(?:if|for|while|loop)\b|=>|&&|\|\||\?',
+        'functions': r'\bfn\b',
+    },
+    'dart': {**_C_LIKE, 'branches': _C_BRANCHES + r'|\?\?'},
+    'sh': {
+        'strip': [_HASH_COMMENT, _STRING_DOUBLE, _STRING_SINGLE],
+        'branches': r'\b(?:if|elif|for|while|until)\b|;;|&&|\|\|',
+        'functions': r'^[ \t]*(?:function[ \t]+[\w-]+|[\w-]+[ \t]*\([ \t]*\))',
+    },
+    'ps1': {
+        'strip': [r'<#[\s\S]*?#>', _HASH_COMMENT, _STRING_DOUBLE, _STRING_SINGLE],
+        'branches': r'(?i)\b(?:if|elseif|for|foreach|while|until|switch|catch)\b|-and\b|-or\b',
+        'functions': r'(?i)\bfunction\b',
+    },
+    'bat': {
+        'strip': [r'(?i:^[ \t]*(?:rem\b|::)[^\n]*)', _STRING_DOUBLE],
+        'branches': r'(?i)\b(?:if|for)\b|&&|\|\|',
+        'functions': r'(?m)^:[A-Za-z_]\w*',
+    },
+    'sql': {
+        'strip': [r'/\*[\s\S]*?\*/|--[^\n]*', _STRING_SINGLE],
+        'branches': r'(?i)\b(?:when|if|while|loop)\b|\band\b|\bor\b',
+        'functions': r'(?i)\bcreate[ \t]+(?:or[ \t]+replace[ \t]+)?(?:function|procedure|trigger)\b',
+    },
+    'scss': {
+        'strip': [_C_COMMENTS],
+        'branches': r'@(?:if|else if|for|each|while)\b',
+        'functions': r'@(?:mixin|function)\b',
+    },
+    'less': {
+        'strip': [_C_COMMENTS],
+        'branches': r'\bwhen\b',
+        'functions': r'^[ \t]*\.[\w-]+[ \t]*\([^)]*\)[ \t]*(?:when[^{]*)?\{',
+    },
+    'css': {'strip': [r'/\*[\s\S]*?\*/'], 'branches': None, 'functions': None},
+    'html': {'strip': [r'<!--[\s\S]*?-->'], 'branches': None, 'functions': None},
+    'json': _MARKUP,
+    'md': {'strip': [r'<!--[\s\S]*?-->'], 'branches': None, 'functions': None},
+}
+
+_COMPILED = {}
+
+# 按 blob SHA 缓存的度量结果
+metrics_cache = MemoryCache(max_entries=200000, default_ttl=7 * 24 * 3600)
+
+
+def _compiled(ext):
+    """编译并缓存某语言的正则"""
+    if ext not in _COMPILED:
+        rules = LANGUAGE_RULES[ext]
+        strip = re.compile('|'.join(f'(?:{p})' for p in rules['strip']), re.M) if rules['strip'] else None
+        branches = re.compile(rules['branches'], re.M) if rules['branches'] else None
+        functions = re.compile(rules['functions'], re.M) if rules['functions'] else None
+        _COMPILED[ext] = (strip, branches, functions)
+    return _COMPILED[ext]
+
+
+def file_extension(path):
+    """返回小写的文件扩展名"""
+    name = path.rsplit('/', 1)[-1]
+    return name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+
+
+def is_metrics_file(path):
+    """判断是否支持计算该文件的度量"""
+    return file_extension(path) in LANGUAGE_RULES
+
+
+def _strip_comments_and_strings(strip, source):
+    """剥离注释并清空字符串内容，保留换行以维持行号"""
+    if strip is None:
+        return source
+
+    def replace(match):
+        text = match.group(0)
+        newlines = '\n' * text.count('\n')
+        if text[0] in '"\'`':
+            # 字符串保留为空字符串，使其所在行仍计为有效代码
+            return text[0] * 2 + newlines
+        return newlines
+
+    return strip.sub(replace, source)
+
+
+def _python_metrics(source):
+    """基于 ast 计算 Python 的圈复杂度与函数数，语法错误时返回 None"""
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+
+    complexity = 1
+    functions = 0
+    match_case = getattr(ast, 'match_case', None)
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.If, ast.For, ast.AsyncFor, ast.While, ast.IfExp, ast.ExceptHandler)):
+            complexity += 1
+        elif isinstance(node, ast.BoolOp):
+            complexity += len(node.values) - 1
+        elif isinstance(node, ast.comprehension):
+            complexity += 1 + len(node.ifs)
+        elif match_case is not None and isinstance(node, match_case):
+            complexity += 1
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+            functions += 1
+    return complexity, functions
+
+
+def compute_metrics(path, source):
+    """计算单个文件的度量，返回 {'loc', 'sloc', 'complexity', 'functions'}
+
+    标记语言和数据文件的复杂度与函数数为 0。
+    """
+    ext = file_extension(path)
+    strip, branches, functions = _compiled(ext)
+
+    loc = source.count('\n') + (1 if source and not source.endswith('\n') else 0)
+    code = _strip_comments_and_strings(strip, source)
+    sloc = sum(1 for line in code.splitlines() if line.strip())
+
+    result = {'loc': loc, 'sloc': sloc, 'complexity': 0, 'functions': 0}
+    if branches is None:
+        return result
+
+    python_metrics = _python_metrics(source) if ext == 'py' else None
+    if python_metrics is not None:
+        result['complexity'], result['functions'] = python_metrics
+    else:
+        result['complexity'] = 1 + len(branches.findall(code))
+        result['functions'] = len(functions.findall(code)) if functions else 0
+    return result
+
+
+def _metrics_batch(items):
+    """进程池任务：计算一批 (path, source) 的度量"""
+    return [compute_metrics(path, source) for path, source in items]
+
+
+def compute_file_metrics(files, load_sources):
+    """批量计算文件度量
+
+    files 为 [{'path', 'sha'}]，load_sources(paths) 返回 {path: 源码}。返回 {path: 度量}。
+    """
+    return map_blobs(files, load_sources, _metrics_batch, metrics_cache, f"metrics:v{METRICS_CACHE_VERSION}")
@@ -0,0 +1,227 @@
+"""
+紧凑响应格式模块
+将文件树和依赖图编码为列式结构：名称与路径段存入去重的字符串表，节点以父节点下标引用上级，
+依赖边的端点为节点下标，链接由每种节点类型的 URL 前缀加路径推导，
+不再逐个节点重复 name、path、url 和空的 children。
+另外负责序列化（JSON 或 msgpack）与压缩（brotli 或 gzip）。
+"""
+import gzip
+import json
+from urllib.parse import quote
+
+try:
+    import brotli
+except ImportError:  # 未安装时只提供 gzip
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # 未安装时只提供 JSON
+    msgpack = None
+
+COMPACT_VERSION = 1  # 列式格式版本，前端解码器据此判断是否支持
+COMPACT_MIMETYPE = 'application/vnd.repo-analyzer.compact+json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+COMPRESS_MIN_BYTES = 1024  # 小于该大小的响应不压缩
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # 兼顾压缩率与速度，分析结果每次请求都要重新压缩
+
+
+class StringTable:
+    """字符串去重表，相同字符串只存一次，以下标引用"""
+
+    def __init__(self):
+        self.strings = []
+        self._index = {}
+
+    def add(self, value):
+        index = self._index.get(value)
+        if index is None:
+            index = self._index[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+
+def _url_template(urls, paths, kinds):
+    """推导每种节点类型的 URL 前缀
+
+    节点 URL 等于 前缀 + quote(路径) 时无需单独传输，其余节点（如根目录）以 [下标, URL] 列出。
+    返回 (前缀表, 例外列表)。
+    """
+    prefixes = {}
+    for url, path, kind in zip(urls, paths, kinds):
+        if kind not in prefixes and url and path:
+            encoded = quote(path)
+            if url.endswith(encoded):
+                prefixes[kind] = url[:-len(encoded)]
+
+    overrides = []
+    for i, (url, path, kind) in enumerate(zip(urls, paths, kinds)):
+        prefix = prefixes.get(kind)
+        expected = prefix + quote(path) if prefix is not None else None
+        if url != expected:
+            overrides.append([i, url])
+    return prefixes, overrides
+
+
+def encode_file_tree(root):
+    """将嵌套文件树编码为列式结构
+
+    节点按先序排列，parent 为父节点下标（根节点为 -1），路径由父节点路径与名称拼接得到，
+    解码时按下标顺序追加子节点即可还原原有顺序。
+    """
+    strings = StringTable()
+    types = StringTable()
+    name_col, parent_col, type_col, size_col, sha_col = [], [], [], [], []
+    urls, paths, kinds = [], [], []
+
+    stack = [(root, -1)]
+    while stack:
+        node, parent = stack.pop()
+        index = len(name_col)
+        name_col.append(strings.add(node['name']))
+        parent_col.append(parent)
+        type_col.append(types.add(node['type']))
+        size_col.append(node.get('size'))
+        sha_col.append(node.get('sha'))
+        urls.append(node.get('url'))
+        paths.append(node['path'])
+        kinds.append(node['type'])
+        stack.extend((child, index) for child in reversed(node.get('children', [])))
+
+    prefixes, overrides = _url_template(urls, paths, kinds)
+    encoded = {
+        'encoding': 'columnar',
+        'version': COMPACT_VERSION,
+        'strings': strings.strings,
+        'types': types.strings,
+        'name': name_col,
+        'parent': parent_col,
+        'type': type_col,
+        'size': size_col,
+        'sha': sha_col,
+        'urlPrefix': prefixes,
+        'urlOverrides': overrides
+    }
+    if root.get('truncated'):
+        encoded['truncated'] = True
+    return encoded
+
+
+def encode_dependency_graph(data):
+    """将依赖图 {'nodes', 'links'} 编码为列式结构
+
+    节点 ID（即路径）拆成上级 ID 的下标和最后一段：idParent 为 ID 去掉最后一段后对应的节点下标，
+    不存在时为 -1 且该段即完整 ID。链接端点为节点下标，引用不存在节点的链接被丢弃。
+    """
+    strings = StringTable()
+    types = StringTable()
+    link_types = StringTable()
+    id_index = {}
+    ids = []
+    id_parent_col, segment_col, name_col, type_col, size_col = [], [], [], [], []
+    urls, kinds = [], []
+
+    for node in data['nodes']:
+        node_id = node['id']
+        parent_id, _, segment = node_id.rpartition('/')
+        parent = id_index.get(parent_id, -1) if parent_id else -1
+        if parent < 0:
+            segment = node_id
+        id_index[node_id] = len(ids)
+        ids.append(node_id)
+        id_parent_col.append(parent)
+        segment_col.append(strings.add(segment))
+        name_col.append(strings.add(node['name']))
+        type_col.append(types.add(node['type']))
+        size_col.append(node.get('size'))
+        urls.append(node.get('url'))
+        kinds.append(node['type'])
+
+    source_col, target_col, link_type_col, value_col = [], [], [], []
+    for link in data['links']:
+        source = id_index.get(link['source'])
+        target = id_index.get(link['target'])
+        if source is None or target is None:
+            continue
+        source_col.append(source)
+        target_col.append(target)
+        link_type_col.append(link_types.add(link['type']))
+        value_col.append(link.get('value', 1))
+
+    prefixes, overrides = _url_template(urls, ids, kinds)
+    return {
+        'encoding': 'columnar',
+        'version': COMPACT_VERSION,
+        'strings': strings.strings,
+        'types': types.strings,
+        'idParent': id_parent_col,
+        'segment': segment_col,
+        'name': name_col,
+        'type': type_col,
+        'size': size_col,
+        'urlPrefix': prefixes,
+        'urlOverrides': overrides,
+        'linkTypes': link_types.strings,
+        'source': source_col,
+        'target': target_col,
+        'linkType': link_type_col,
+        'value': value_col
+    }
+
+
+# 可以编码为列式结构的分析阶段结果
+STAGE_ENCODERS = {
+    'fileStructure': encode_file_tree,
+    'dependencyData': encode_dependency_graph,
+}
+
+
+def encode_stages(stages):
+    """编码分析结果（或部分结果）中支持列式格式的阶段，其他阶段原样保留"""
+    if not stages:
+        return stages
+    encoded = dict(stages)
+    for stage, encoder in STAGE_ENCODERS.items():
+        value = encoded.get(stage)
+        if value and value.get('encoding') != 'columnar':
+            encoded[stage] = encoder(value)
+    return encoded
+
+
+def encode_payload(data):
+    """编码接口返回的数据：分析结果本身，或任务状态中的 result / partial"""
+    if 'jobId' in data:
+        data = dict(data)
+        for key in ('result', 'partial'):
+            if data.get(key):
+                data[key] = encode_stages(data[key])
+        return data
+    return encode_stages(data)
+
+
+def serialize(data, mimetype):
+    """按协商得到的格式序列化为字节串，返回 (内容, 实际的 Content-Type)
+
+    请求 msgpack 但未安装 msgpack 时退回列式 JSON。
+    """
+    if mimetype == MSGPACK_MIMETYPE:
+        if msgpack is not None:
+            return msgpack.packb(data, use_bin_type=True), MSGPACK_MIMETYPE
+        mimetype = COMPACT_MIMETYPE
+    body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return body, mimetype
+
+
+def compress(body, accept_encoding):
+    """按客户端接受的编码压缩，优先 brotli，其次 gzip；返回 (内容, Content-Encoding 或 None)
+
+    accept_encoding(name) 返回客户端对该编码的权重，0 表示不接受。
+    """
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    if brotli is not None and accept_encoding('br') > 0:
+        return brotli.compress(body, quality=BROTLI_QUALITY), 'br'
+    if accept_encoding('gzip') > 0:
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), 'gzip'
+    return body, None
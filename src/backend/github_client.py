@@ -0,0 +1,350 @@
+"""
+GitHub 客户端模块
+REST 请求和 raw 文件下载以协程形式在共享事件循环上执行，使用进程内共享的 httpx.AsyncClient 连接池；
+同名的同步函数在共享循环上运行对应的协程并等待结果，供请求线程和分析阶段调用。
+所有 REST 请求经过 GitHub 请求调度器（令牌轮换、优先级、ETag 条件请求），
+并以较短的 TTL 缓存仓库元数据，避免每个请求重复调用 GET /repos/{owner}/{repo}。
+所有读取请求经过熔断器，遇到网络错误、5xx 或 429 时带抖动重试，超时受请求截止时间约束。
+归档包需要边下载边解析，仍通过 requests 会话同步下载。
+httpx 与 requests 在第一次创建对应的客户端时才导入；会话、调度器和异步客户端都在每个进程首次使用时创建，fork 出的子进程会重新创建。
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from urllib.parse import quote
+
+from dotenv import load_dotenv
+
+from caching import MemoryCache
+from archive_ingest import fetch_archive_snapshot
+from async_runtime import loop_resource, run_async
+from github_scheduler import GitHubScheduler, RateLimitExceeded
+from resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, call_timeout, retry_call, retry_call_async
+from telemetry import observe_upstream
+
+logger = logging.getLogger(__name__)
+
+# 确保在读取配置前加载 .env
+load_dotenv()
+
+GITHUB_TOKEN = os.environ.get('GITHUB_TOKEN', '')
+GITHUB_TOKENS = [t.strip() for t in os.environ.get('GITHUB_TOKENS', GITHUB_TOKEN).split(',') if t.strip()]  # 令牌池，逗号分隔
+GITHUB_API_URL = os.environ.get('GITHUB_API_URL', 'https://api.github.com').rstrip('/')
+GITHUB_RAW_URL = os.environ.get('GITHUB_RAW_URL', 'https://raw.githubusercontent.com').rstrip('/')
+GITHUB_POOL_SIZE = int(os.environ.get('GITHUB_POOL_SIZE', 20))  # 连接池大小
+REPO_CACHE_TTL = int(os.environ.get('REPO_CACHE_TTL', 300))  # 仓库句柄与元数据缓存有效期（秒）
+GITHUB_TIMEOUT = float(os.environ.get('GITHUB_TIMEOUT', 15))  # 单次 GitHub 请求的超时时间（秒）
+GITHUB_RETRIES = int(os.environ.get('GITHUB_RETRIES', 3))  # 幂等读取请求的最大尝试次数
+GITHUB_BREAKER_THRESHOLD = int(os.environ.get('GITHUB_BREAKER_THRESHOLD', 5))  # 连续失败多少次后熔断
+GITHUB_BREAKER_RESET = float(os.environ.get('GITHUB_BREAKER_RESET', 30))  # 熔断持续时间（秒）
+GITHUB_MAX_CONCURRENCY = int(os.environ.get('GITHUB_MAX_CONCURRENCY', GITHUB_POOL_SIZE))  # 同时进行的 GitHub API 请求数上限
+GITHUB_RATE_RESERVE = int(os.environ.get('GITHUB_RATE_RESERVE', 100))  # 批量请求为交互式请求保留的配额
+GITHUB_BATCH_RESERVE = int(os.environ.get('GITHUB_BATCH_RESERVE', 1000))  # 批量分析接口为单个仓库的分析保留的配额
+GITHUB_RATE_MAX_WAIT = float(os.environ.get('GITHUB_RATE_MAX_WAIT', 60))  # 配额耗尽时最多等待重置的时间（秒）
+GITHUB_ETAG_ENTRIES = int(os.environ.get('GITHUB_ETAG_ENTRIES', 2048))  # ETag 条件请求缓存的响应数
+GITHUB_ETAG_MAX_BYTES = int(os.environ.get('GITHUB_ETAG_MAX_BYTES', 64 * 1024 * 1024))  # ETag 缓存中响应体的总字节数上限
+GITHUB_ETAG_MAX_BODY = int(os.environ.get('GITHUB_ETAG_MAX_BODY', 1024 * 1024))  # 超过该字节数的响应体不缓存
+GITHUB_RAW_CONCURRENCY = int(os.environ.get('GITHUB_RAW_CONCURRENCY', 64))  # 整个进程同时进行的 raw 文件下载数上限
+RAW_CONNECTIONS_PER_CLIENT = 4  # 每个 raw 下载客户端的连接数；httpcore 连接池在连接数较多时分配请求的开销明显上升，因此分散到多个客户端
+
+_lock = threading.Lock()
+_session = None
+_scheduler = None
+
+
+def _reset_after_fork():
+    # 子进程不能沿用父进程的连接和调度器中的锁、等待队列（异步等待队列绑定在父进程的事件循环上），下次调用时重新创建
+    global _lock, _session, _scheduler
+    _lock = threading.Lock()
+    _session = None
+    _scheduler = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+# 仓库元数据缓存
+repo_cache = MemoryCache(max_entries=512, default_ttl=REPO_CACHE_TTL)
+
+github_breaker = CircuitBreaker('GitHub', failure_threshold=GITHUB_BREAKER_THRESHOLD, reset_timeout=GITHUB_BREAKER_RESET)
+# raw 文件下载走单独的主机，使用独立的熔断器，raw 主机故障时不影响 REST API 的调用
+github_raw_breaker = CircuitBreaker('GitHub raw', failure_threshold=GITHUB_BREAKER_THRESHOLD,
+                                    reset_timeout=GITHUB_BREAKER_RESET)
+
+
+def is_transient_error(e):
+    """判断异常是否为可重试的上游临时故障（网络错误、超时、5xx、429）"""
+    # 异常只可能来自已加载的客户端库，不为检查而导入未加载的库
+    requests = sys.modules.get('requests')
+    if requests is not None and isinstance(e, (requests.ConnectionError, requests.Timeout)):
+        return True
+    httpx = sys.modules.get('httpx')
+    if httpx is not None and isinstance(e, httpx.TransportError):
+        return True
+    status = getattr(getattr(e, 'response', None), 'status_code', None)
+    return status is not None and (status >= 500 or status == 429)
+
+
+def is_upstream_unavailable(e):
+    """判断异常是否表示 GitHub 暂时不可用（可以改用缓存数据）"""
+    return isinstance(e, (CircuitOpenError, DeadlineExceeded, RateLimitExceeded)) or is_transient_error(e)
+
+
+def is_not_found(e):
+    """判断异常是否为 GitHub 返回的 404"""
+    return getattr(getattr(e, 'response', None), 'status_code', None) == 404
+
+
+def github_call(fn, *args, **kwargs):
+    """通过熔断器调用 GitHub 读取接口，临时故障时带抖动重试；只用于幂等请求"""
+    return retry_call(
+        github_breaker.call, fn, *args,
+        is_failure=is_transient_error,
+        attempts=GITHUB_RETRIES,
+        retryable=is_transient_error,
+        name=getattr(fn, '__name__', 'GitHub'),
+        **kwargs
+    )
+
+
+async def github_call_async(fn, *args, **kwargs):
+    """github_call 的协程版本，fn 为返回协程的函数"""
+    return await retry_call_async(
+        github_breaker.call_async, fn, *args,
+        is_failure=is_transient_error,
+        attempts=GITHUB_RETRIES,
+        retryable=is_transient_error,
+        name=getattr(fn, '__name__', 'GitHub'),
+        **kwargs
+    )
+
+
+def get_http_session():
+    """获取进程内共享的 requests 会话；API 请求的认证头由调度器按令牌添加"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=GITHUB_POOL_SIZE, pool_maxsize=GITHUB_POOL_SIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers['Accept'] = 'application/vnd.github+json'
+                _session = session
+    return _session
+
+
+def get_scheduler():
+    """获取进程内共享的 GitHub 请求调度器"""
+    global _scheduler
+    if _scheduler is None:
+        session = get_http_session()
+        with _lock:
+            if _scheduler is None:
+                _scheduler = GitHubScheduler(
+                    session,
+                    GITHUB_TOKENS,
+                    max_concurrency=GITHUB_MAX_CONCURRENCY,
+                    reserve=GITHUB_RATE_RESERVE,
+                    max_wait=GITHUB_RATE_MAX_WAIT,
+                    etag_entries=GITHUB_ETAG_ENTRIES,
+                    background_reserve=GITHUB_BATCH_RESERVE,
+                    etag_max_bytes=GITHUB_ETAG_MAX_BYTES,
+                    etag_max_body=GITHUB_ETAG_MAX_BODY
+                )
+    return _scheduler
+
+
+def get_async_client():
+    """获取绑定到共享事件循环的 httpx.AsyncClient，只能在循环中调用；API 请求的认证头由调度器按令牌添加"""
+    return loop_resource('github-http', _create_api_client)
+
+
+def _create_api_client():
+    import httpx
+    return httpx.AsyncClient(
+        headers={'Accept': 'application/vnd.github+json'},
+        limits=httpx.Limits(max_connections=GITHUB_MAX_CONCURRENCY, max_keepalive_connections=GITHUB_MAX_CONCURRENCY),
+        follow_redirects=True
+    )
+
+
+def _create_raw_slots():
+    # 每个名额对应一个客户端，同一客户端出现 RAW_CONNECTIONS_PER_CLIENT 次，取出名额即得到有空闲连接的客户端
+    import httpx
+    slots = asyncio.Queue()
+    for start in range(0, GITHUB_RAW_CONCURRENCY, RAW_CONNECTIONS_PER_CLIENT):
+        connections = min(RAW_CONNECTIONS_PER_CLIENT, GITHUB_RAW_CONCURRENCY - start)
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+            follow_redirects=True
+        )
+        for _ in range(connections):
+            slots.put_nowait(client)
+    return slots
+
+
+async def api_get(path, params=None, accept=None, timeout=GITHUB_TIMEOUT):
+    """通过调度器发送 GitHub API GET 请求，返回响应；非 2xx 状态抛出 httpx.HTTPStatusError"""
+    headers = {'Accept': accept} if accept else None
+    resp = await get_scheduler().get_async(get_async_client(), f"{GITHUB_API_URL}{path}", params=params,
+                                           headers=headers, timeout=call_timeout(timeout))
+    resp.raise_for_status()
+    return resp
+
+
+async def get_repo_async(owner, repo_name):
+    """获取仓库元数据（GET /repos/{owner}/{repo} 的 JSON），短时间内重复调用直接复用缓存"""
+    key = f"{owner.lower()}/{repo_name.lower()}"
+    repo = repo_cache.get(key)
+    if repo is None:
+        repo = (await github_call_async(api_get, f"/repos/{owner}/{repo_name}")).json()
+        repo_cache.set(key, repo)
+    return repo
+
+
+async def get_git_tree_async(owner, repo_name, tree_sha, recursive=False):
+    """获取 Git 树（tree_sha 可以是分支名或提交SHA），返回 JSON"""
+    params = {'recursive': '1'} if recursive else None
+    resp = await github_call_async(api_get, f"/repos/{owner}/{repo_name}/git/trees/{quote(tree_sha, safe='')}",
+                                   params=params)
+    return resp.json()
+
+
+async def get_contents_async(owner, repo_name, path, ref=None):
+    """获取文件内容接口的 JSON（超过1MB的文件不含正文）"""
+    params = {'ref': ref} if ref else None
+    return (await github_call_async(api_get, f"/repos/{owner}/{repo_name}/contents/{quote(path)}", params=params)).json()
+
+
+async def get_git_blob_async(owner, repo_name, sha):
+    """获取 blob 的原始字节内容"""
+    resp = await github_call_async(api_get, f"/repos/{owner}/{repo_name}/git/blobs/{sha}",
+                                   accept='application/vnd.github.raw')
+    return resp.content
+
+
+async def resolve_commit_sha_async(owner, repo_name):
+    """解析仓库默认分支当前指向的提交SHA（单次轻量请求）
+
+    使用条件请求，默认分支未变化时 GitHub 返回 304，不消耗速率限制配额。
+    """
+    # HEAD 指向默认分支，sha 媒体类型只返回纯文本的提交SHA
+    resp = await github_call_async(api_get, f"/repos/{owner}/{repo_name}/commits/HEAD",
+                                   accept='application/vnd.github.sha', timeout=10)
+    return resp.text.strip()
+
+
+async def list_owner_repos_async(owner, limit):
+    """列出组织或用户的仓库（按名称排序，最多 limit 个），返回 GET /orgs/{org}/repos 的 JSON 元素列表
+
+    owner 不是组织时改用 GET /users/{user}/repos。
+    """
+    path = f"/orgs/{quote(owner)}/repos"
+    repos = []
+    page = 1
+    while len(repos) < limit:
+        params = {'per_page': '100', 'page': str(page), 'sort': 'full_name'}
+        try:
+            resp = await github_call_async(api_get, path, params=params)
+        except Exception as e:
+            if page == 1 and path.startswith('/orgs/') and is_not_found(e):
+                path = f"/users/{quote(owner)}/repos"
+                continue
+            raise
+        items = resp.json()
+        repos.extend(items)
+        if len(items) < 100:
+            break
+        page += 1
+    return repos[:limit]
+
+
+async def fetch_raw_files_async(owner, repo_name, ref, paths):
+    """并发下载指定提交下的多个文件，返回 {path: 文本内容}
+
+    使用 raw.githubusercontent.com 获取文件内容，不占用 REST API 的速率限制；下载失败的文件被忽略。
+    所有请求共享同一个并发上限，多个分析同时下载时总连接数和内存占用不会随之增长。
+    """
+    slots = loop_resource('github-raw-slots', _create_raw_slots)
+    # 私有仓库的 raw 文件同样需要令牌，raw 下载不计入 REST API 配额，固定使用第一个令牌
+    headers = {'Authorization': f"Bearer {GITHUB_TOKENS[0]}"} if GITHUB_TOKENS else None
+
+    async def download(path):
+        client = await slots.get()
+        started = time.perf_counter()
+        try:
+            resp = await client.get(f"{GITHUB_RAW_URL}/{owner}/{repo_name}/{ref}/{quote(path)}",
+                                    headers=headers, timeout=call_timeout(30))
+        except Exception as e:
+            observe_upstream('github-raw', type(e).__name__, started)
+            raise
+        finally:
+            slots.put_nowait(client)
+        observe_upstream('github-raw', resp.status_code, started)
+        resp.raise_for_status()
+        return resp.content.decode('utf-8', errors='replace')
+
+    async def fetch(path):
+        try:
+            return path, await retry_call_async(
+                github_raw_breaker.call_async, download, path,
+                is_failure=is_transient_error,
+                attempts=GITHUB_RETRIES,
+                retryable=is_transient_error,
+                name='download'
+            )
+        except Exception as e:
+            logger.warning(f"下载文件 {path} 时出错: {str(e)}")
+            return path, None
+
+    return dict(await asyncio.gather(*(fetch(path) for path in paths)))
+
+
+def get_repo(owner, repo_name):
+    """get_repo_async 的同步版本"""
+    return run_async(get_repo_async(owner, repo_name))
+
+
+def get_git_tree(owner, repo_name, tree_sha, recursive=False):
+    """get_git_tree_async 的同步版本"""
+    return run_async(get_git_tree_async(owner, repo_name, tree_sha, recursive))
+
+
+def get_contents(owner, repo_name, path, ref=None):
+    """get_contents_async 的同步版本"""
+    return run_async(get_contents_async(owner, repo_name, path, ref))
+
+
+def get_git_blob(owner, repo_name, sha):
+    """get_git_blob_async 的同步版本"""
+    return run_async(get_git_blob_async(owner, repo_name, sha))
+
+
+def resolve_commit_sha(owner, repo_name):
+    """resolve_commit_sha_async 的同步版本"""
+    return run_async(resolve_commit_sha_async(owner, repo_name))
+
+
+def list_owner_repos(owner, limit):
+    """list_owner_repos_async 的同步版本"""
+    return run_async(list_owner_repos_async(owner, limit))
+
+
+def fetch_raw_files(owner, repo_name, ref, paths):
+    """fetch_raw_files_async 的同步版本"""
+    if not paths:
+        return {}
+    return run_async(fetch_raw_files_async(owner, repo_name, ref, paths))
+
+
+def fetch_repo_archive(owner, repo_name, ref, **kwargs):
+    """下载并流式解析仓库在指定提交下的归档包，参数见 archive_ingest.fetch_archive_snapshot"""
+    # 归档包较大，使用更长的超时；下载失败时整体重试
+    return github_call(fetch_archive_snapshot, get_scheduler(), GITHUB_API_URL, owner, repo_name, ref,
+                       timeout=call_timeout(60), **kwargs)
@@ -0,0 +1,385 @@
+"""
+GitHub 请求调度模块
+所有 GitHub REST 请求经过同一个调度器：按优先级分配并发名额（交互式请求优先于批量的树遍历），
+在多个令牌之间轮换并跟踪各令牌的 X-RateLimit-Remaining/Reset，
+对读取请求使用 ETag 条件请求，资源未变化时 GitHub 返回 304，不计入速率限制配额。
+调度器同时提供基于 requests 的同步 get 和基于 httpx.AsyncClient 的 get_async，两者共享令牌配额和 ETag 缓存。
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import threading
+import time
+from urllib.parse import urlencode
+
+from caching import MemoryCache
+from resilience import DeadlineExceeded, remaining_time
+from telemetry import observe_upstream
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0  # 用户正在等待的单个请求，如代码解释时获取文件
+PRIORITY_BULK = 1  # 分析流程中的批量请求，如获取文件树
+PRIORITY_BACKGROUND = 2  # 批量分析接口的请求，排在所有其他请求之后，并为其他请求保留更多配额
+
+_priority = contextvars.ContextVar('github_priority', default=PRIORITY_BULK)
+
+
+class RateLimitExceeded(Exception):
+    """所有令牌的配额均已耗尽，且无法在允许的等待时间内恢复"""
+
+
+def set_priority(priority):
+    """设置当前上下文中 GitHub 请求的优先级，返回用于恢复的令牌"""
+    return _priority.set(priority)
+
+
+def reset_priority(token):
+    """恢复 set_priority 之前的优先级"""
+    _priority.reset(token)
+
+
+class TokenState:
+    """单个令牌的配额状态"""
+
+    def __init__(self, token):
+        self.token = token
+        self.limit = None
+        self.remaining = None  # 尚未收到响应时未知，视为可用
+        self.reset_at = 0.0  # 配额重置的时间戳（秒）
+        self.in_flight = 0
+        self.requests = 0
+
+    def budget(self, now):
+        """当前可用的配额，未知或已过重置时间时视为无限"""
+        if self.remaining is None or now >= self.reset_at:
+            return float('inf')
+        return self.remaining - self.in_flight
+
+    def to_dict(self, index):
+        return {
+            'token': f"#{index}" if self.token else 'anonymous',
+            'limit': self.limit,
+            'remaining': self.remaining,
+            'resetAt': int(self.reset_at) if self.reset_at else None,
+            'requests': self.requests
+        }
+
+
+class TokenPool:
+    """令牌池
+
+    每次选择剩余配额最多的令牌；批量请求不使用最后 reserve 个配额，为交互式请求留出余量，
+    后台请求不使用最后 background_reserve 个配额（不少于 reserve），为单个仓库的分析留出余量。
+    所有令牌都不可用时等待最早的重置时间，等待时间超过 max_wait 或请求截止时间时抛出 RateLimitExceeded。
+    """
+
+    def __init__(self, tokens, reserve, max_wait, background_reserve=0):
+        self.states = [TokenState(token) for token in tokens] or [TokenState(None)]
+        self.reserve = reserve
+        self.background_reserve = max(reserve, background_reserve)
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+
+    def _try_acquire(self, priority):
+        """有可用令牌时返回 (令牌状态, 0)，否则返回 (None, 需要等待的秒数)；调用方持有锁"""
+        if priority == PRIORITY_INTERACTIVE:
+            reserve = 0
+        elif priority == PRIORITY_BACKGROUND:
+            reserve = self.background_reserve
+        else:
+            reserve = self.reserve
+        now = time.time()
+        state = max(self.states, key=lambda s: s.budget(now))
+        if state.budget(now) > reserve:
+            state.in_flight += 1
+            state.requests += 1
+            return state, 0
+
+        wait = min(s.reset_at for s in self.states) - now + 1
+        remaining = remaining_time()
+        if wait > self.max_wait or (remaining is not None and wait > remaining):
+            raise RateLimitExceeded(f"GitHub 速率限制配额已耗尽，约 {int(wait)} 秒后恢复")
+        logger.warning(f"GitHub 配额不足，等待 {wait:.0f} 秒后重置")
+        return None, wait
+
+    def acquire(self, priority):
+        with self._cond:
+            while True:
+                state, wait = self._try_acquire(priority)
+                if state is not None:
+                    return state
+                self._cond.wait(timeout=wait)
+
+    async def acquire_async(self, priority):
+        """acquire 的协程版本，配额不足时让出事件循环等待重置"""
+        while True:
+            with self._cond:
+                state, wait = self._try_acquire(priority)
+            if state is not None:
+                return state
+            await asyncio.sleep(wait)
+
+    def release(self, state, response=None):
+        """请求结束后根据响应头更新令牌配额"""
+        with self._cond:
+            state.in_flight -= 1
+            if response is not None:
+                headers = response.headers
+                if 'X-RateLimit-Remaining' in headers:
+                    state.remaining = int(headers['X-RateLimit-Remaining'])
+                    state.limit = int(headers.get('X-RateLimit-Limit', state.limit or 0)) or state.limit
+                    state.reset_at = float(headers.get('X-RateLimit-Reset', state.reset_at))
+                if is_rate_limited(response):
+                    # 次级速率限制通过 Retry-After 告知需要等待的时间
+                    retry_after = headers.get('Retry-After')
+                    state.remaining = 0
+                    if retry_after:
+                        state.reset_at = max(state.reset_at, time.time() + float(retry_after))
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return [state.to_dict(i) for i, state in enumerate(self.states)]
+
+
+class PriorityGate:
+    """限制并发请求数的闸门，有空位时优先放行优先级高（数值小）、先到达的请求"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def acquire(self, priority):
+        with self._cond:
+            entry = (priority, next(self._seq))
+            heapq.heappush(self._waiters, entry)
+            try:
+                while self.active >= self.limit or self._waiters[0] != entry:
+                    timeout = remaining_time()
+                    if timeout is not None and timeout <= 0:
+                        raise DeadlineExceeded("等待 GitHub 请求名额超时")
+                    self._cond.wait(timeout)
+            except BaseException:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._waiters)
+            self.active += 1
+            self._cond.notify_all()
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+
+class AsyncPriorityGate:
+    """PriorityGate 的协程版本，只在共享事件循环中使用，因此不需要加锁"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self._waiters = []
+        self._seq = itertools.count()
+
+    async def acquire(self, priority):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        timeout = remaining_time()
+        if timeout is not None and timeout <= 0:
+            raise DeadlineExceeded("等待 GitHub 请求名额超时")
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), waiter))
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("等待 GitHub 请求名额超时")
+        except BaseException:
+            # 名额已经转交给本请求时需要归还；未转交的等待项在 release 时跳过
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        # 名额直接转交给优先级最高的等待者，active 不变
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+def is_rate_limited(response):
+    """判断响应是否因速率限制被拒绝"""
+    if response.status_code == 429:
+        return True
+    return response.status_code == 403 and (
+        response.headers.get('X-RateLimit-Remaining') == '0' or 'Retry-After' in response.headers
+    )
+
+
+def _cached_response(url, entry):
+    """用缓存的响应体构造一个 200 响应"""
+    # 只在同步的 get 中调用，requests 已由调用方的会话加载
+    import requests
+    from requests.structures import CaseInsensitiveDict
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response._content = entry['content']
+    response.headers = CaseInsensitiveDict(entry['headers'])
+    response.encoding = entry['encoding']
+    return response
+
+
+def _cached_async_response(url, entry):
+    """用缓存的响应体构造一个 httpx 的 200 响应；响应体已解压，去掉描述原始传输的头"""
+    # 只在 get_async 中调用，httpx 已由调用方的客户端加载
+    import httpx
+    headers = {name: value for name, value in entry['headers'].items()
+               if name.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')}
+    response = httpx.Response(200, content=entry['content'], headers=headers, request=httpx.Request('GET', url))
+    if entry['encoding']:
+        response.encoding = entry['encoding']
+    return response
+
+
+class GitHubScheduler:
+    """GitHub 请求调度器，提供与 requests.Session.get 相同风格的 get 方法，以及使用 httpx.AsyncClient 的 get_async"""
+
+    def __init__(self, session, tokens, max_concurrency, reserve, max_wait, etag_entries, background_reserve=0,
+                 etag_max_bytes=64 * 1024 * 1024, etag_max_body=1024 * 1024):
+        self.session = session
+        self.pool = TokenPool(tokens, reserve, max_wait, background_reserve)
+        self.gate = PriorityGate(max_concurrency)
+        self.async_gate = AsyncPriorityGate(max_concurrency)
+        # 缓存的响应体按总字节数限制；单个响应体超过 etag_max_body（如大型递归树、文件内容）时不缓存，
+        # 避免少数大响应占满缓存或使进程内存随条目数无界增长
+        self.etags = MemoryCache(max_entries=etag_entries, default_ttl=24 * 3600, max_bytes=etag_max_bytes,
+                                 sizeof=lambda entry: len(entry['content']))
+        self.etag_max_body = etag_max_body
+        self._lock = threading.Lock()
+        self._not_modified = 0
+
+    def get(self, url, params=None, headers=None, timeout=None, stream=False, conditional=True):
+        """发送 GET 请求
+
+        conditional 为真且非流式时携带上次的 ETag，收到 304 时返回缓存的响应体。
+        被速率限制拒绝时换用其他令牌重试，全部令牌不可用时抛出 RateLimitExceeded。
+        """
+        priority = _priority.get()
+        headers = dict(headers or {})
+        conditional = conditional and not stream
+        cache_key = f"{url}?{urlencode(sorted((params or {}).items()))}#{headers.get('Accept', '')}"
+        cached = self.etags.get(cache_key) if conditional else None
+
+        for _ in range(len(self.pool.states) + 1):
+            self.gate.acquire(priority)
+            try:
+                state = self.pool.acquire(priority)
+                request_headers = dict(headers)
+                if state.token:
+                    request_headers['Authorization'] = f"Bearer {state.token}"
+                if cached:
+                    request_headers['If-None-Match'] = cached['etag']
+                started = time.perf_counter()
+                try:
+                    response = self.session.get(url, params=params, headers=request_headers,
+                                                timeout=timeout, stream=stream)
+                except Exception as e:
+                    self.pool.release(state)
+                    observe_upstream('github', type(e).__name__, started)
+                    raise
+                self.pool.release(state, response)
+                observe_upstream('github', response.status_code, started)
+            finally:
+                self.gate.release()
+
+            if is_rate_limited(response):
+                response.close()
+                logger.warning(f"GitHub 令牌触发速率限制（{response.status_code}），换用其他令牌")
+                continue
+
+            if response.status_code == 304 and cached:
+                with self._lock:
+                    self._not_modified += 1
+                return _cached_response(url, cached)
+
+            if (conditional and response.status_code == 200 and response.headers.get('ETag')
+                    and len(response.content) <= self.etag_max_body):
+                self.etags.set(cache_key, {
+                    'etag': response.headers['ETag'],
+                    'content': response.content,
+                    'headers': dict(response.headers),
+                    'encoding': response.encoding
+                })
+            return response
+
+        raise RateLimitExceeded("GitHub 速率限制配额已耗尽")
+
+    async def get_async(self, client, url, params=None, headers=None, timeout=None, conditional=True):
+        """get 的协程版本，client 为 httpx.AsyncClient；不支持流式响应"""
+        priority = _priority.get()
+        headers = dict(headers or {})
+        cache_key = f"{url}?{urlencode(sorted((params or {}).items()))}#{headers.get('Accept', '')}"
+        cached = self.etags.get(cache_key) if conditional else None
+
+        for _ in range(len(self.pool.states) + 1):
+            await self.async_gate.acquire(priority)
+            try:
+                state = await self.pool.acquire_async(priority)
+                request_headers = dict(headers)
+                if state.token:
+                    request_headers['Authorization'] = f"Bearer {state.token}"
+                if cached:
+                    request_headers['If-None-Match'] = cached['etag']
+                started = time.perf_counter()
+                try:
+                    response = await client.get(url, params=params, headers=request_headers, timeout=timeout)
+                except BaseException as e:
+                    self.pool.release(state)
+                    observe_upstream('github', type(e).__name__, started)
+                    raise
+                self.pool.release(state, response)
+                observe_upstream('github', response.status_code, started)
+            finally:
+                self.async_gate.release()
+
+            if is_rate_limited(response):
+                logger.warning(f"GitHub 令牌触发速率限制（{response.status_code}），换用其他令牌")
+                continue
+
+            if response.status_code == 304 and cached:
+                with self._lock:
+                    self._not_modified += 1
+                return _cached_async_response(url, cached)
+
+            if (conditional and response.status_code == 200 and response.headers.get('ETag')
+                    and len(response.content) <= self.etag_max_body):
+                self.etags.set(cache_key, {
+                    'etag': response.headers['ETag'],
+                    'content': response.content,
+                    'headers': dict(response.headers),
+                    'encoding': response.encoding
+                })
+            return response
+
+        raise RateLimitExceeded("GitHub 速率限制配额已耗尽")
+
+    def stats(self):
+        with self._lock:
+            not_modified = self._not_modified
+        return {
+            'tokens': self.pool.stats(),
+            'notModified': not_modified,
+            'etags': self.etags.stats()
+        }
@@ -0,0 +1,345 @@
+"""
+依赖图布局模块
+在服务端为大型依赖图计算节点坐标：先按目录层级生成径向布局作为初始位置，
+再用 NumPy 向量化的力导向迭代（Fruchterman-Reingold）调整；节点较多时斥力按网格单元的质心近似计算。
+有上一版本依赖图的坐标时以其为初始位置，只需少量低温迭代，已有节点的位置也保持稳定。
+布局完成后可按目录深度聚合（LOD）：超过指定深度的节点并入其所在目录的超级节点，边按端点所属的超级节点合并并累加权重。
+"""
+import math
+
+import numpy as np
+
+LEVEL_DISTANCE = 80.0  # 径向布局中相邻层级的最小间距
+MIN_SPACING = 6.0  # 最外层节点之间的最小弧长
+IDEAL_LENGTH = 30.0  # 力导向布局的理想边长
+REPULSION_PAIR_BUDGET = 8000000  # 每次迭代计算斥力的节点对数上限，节点数的平方不超过该值时精确计算
+CHUNK_SIZE = 1024  # 分块计算斥力时每块的节点数，限制临时数组的内存
+GRAVITY = 0.02  # 向中心的引力系数，防止不连通的部分飘散
+LINK_WEIGHTS = {'contains': 1.0}  # 各类边的引力系数，未列出的类型使用 DEFAULT_LINK_WEIGHT
+DEFAULT_LINK_WEIGHT = 0.2  # 导入依赖等非层级边的引力系数，使布局以目录结构为主
+WARM_START_ITERATIONS = 8  # 以上一版本坐标为初始位置时的迭代次数
+WARM_START_MIN_REUSE = 0.5  # 上一版本坐标覆盖的节点比例达到该值时才沿用
+GOLDEN_ANGLE = math.pi * (3 - math.sqrt(5))  # 新节点围绕父节点按黄金角分散，避免重叠
+
+
+def default_iterations(n):
+    """按节点数选择迭代次数，节点越多每次迭代越慢，次数相应减少"""
+    if n * n <= REPULSION_PAIR_BUDGET:
+        return 80
+    if n <= 10000:
+        return 40
+    return 25
+
+
+def _hierarchy(n, parent):
+    """返回 (子节点列表, 广度优先顺序, 深度数组)；没有父节点的节点都作为根"""
+    children = [[] for _ in range(n)]
+    roots = []
+    for i, p in enumerate(parent):
+        if p >= 0:
+            children[p].append(i)
+        else:
+            roots.append(i)
+
+    order = list(roots)
+    depth = np.zeros(n, dtype=np.int32)
+    head = 0
+    while head < len(order):
+        node = order[head]
+        head += 1
+        for child in children[node]:
+            depth[child] = depth[node] + 1
+            order.append(child)
+    return children, roots, order, depth
+
+
+def radial_seed(n, children, roots, order, depth):
+    """按目录层级生成径向布局：每个子树分到与其叶子数成正比的角度区间，半径随深度增加"""
+    leaves = np.ones(n)
+    for node in reversed(order):
+        if children[node]:
+            leaves[node] = sum(leaves[c] for c in children[node])
+
+    max_depth = max(int(depth.max()) if n else 0, 1)
+    total_leaves = sum(leaves[r] for r in roots) or 1
+    # 最外层的周长至少容纳所有叶子节点
+    radius = max(max_depth * LEVEL_DISTANCE, total_leaves * MIN_SPACING / (2 * math.pi))
+    step = radius / max_depth
+
+    start = np.zeros(n)
+    span = np.zeros(n)
+    offset = 0.0
+    for root in roots:
+        start[root] = offset
+        span[root] = 2 * math.pi * leaves[root] / total_leaves
+        offset += span[root]
+
+    for node in order:
+        offset = start[node]
+        for child in children[node]:
+            start[child] = offset
+            span[child] = span[node] * leaves[child] / leaves[node]
+            offset += span[child]
+
+    angle = start + span / 2
+    r = depth * step
+    return np.column_stack([r * np.cos(angle), r * np.sin(angle)])
+
+
+def _repulsion(pos, k):
+    """计算斥力位移；节点较多时以网格单元的质心代替单元内的节点，网格大小使计算量不超过预算"""
+    n = len(pos)
+    if n * n <= REPULSION_PAIR_BUDGET:
+        centers, mass = pos, np.ones(n)
+    else:
+        grid = int(min(max(math.sqrt(REPULSION_PAIR_BUDGET / n), 8), 64))
+        lo = pos.min(axis=0)
+        extent = float((pos.max(axis=0) - lo).max()) or 1.0
+        cells = np.clip(((pos - lo) / extent * grid).astype(np.int64), 0, grid - 1)
+        cell_id = cells[:, 0] * grid + cells[:, 1]
+        counts = np.bincount(cell_id, minlength=grid * grid)
+        occupied = counts > 0
+        mass = counts[occupied].astype(float)
+        centers = np.column_stack([
+            np.bincount(cell_id, weights=pos[:, 0], minlength=grid * grid)[occupied] / mass,
+            np.bincount(cell_id, weights=pos[:, 1], minlength=grid * grid)[occupied] / mass
+        ])
+
+    # 使用 float32 并分别计算 x、y 分量，减少临时数组的大小
+    cx = centers[:, 0].astype(np.float32)
+    cy = centers[:, 1].astype(np.float32)
+    strength = (k * k * mass).astype(np.float32)
+    disp = np.empty_like(pos)
+    for begin in range(0, n, CHUNK_SIZE):
+        end = begin + CHUNK_SIZE
+        dx = pos[begin:end, 0, None].astype(np.float32) - cx
+        dy = pos[begin:end, 1, None].astype(np.float32) - cy
+        # 斥力大小 k²/d，方向为 (dx, dy)/d
+        w = strength / (dx * dx + dy * dy + np.float32(1e-2))
+        disp[begin:end, 0] = (dx * w).sum(axis=1)
+        disp[begin:end, 1] = (dy * w).sum(axis=1)
+    return disp
+
+
+def _attraction(pos, source, target, weight, k):
+    """计算边的引力位移，引力大小 d²/k"""
+    delta = pos[target] - pos[source]
+    dist = np.sqrt((delta ** 2).sum(axis=1)) + 1e-9
+    factor = dist * weight / k
+    n = len(pos)
+    disp = np.zeros_like(pos)
+    for axis in (0, 1):
+        f = delta[:, axis] * factor
+        disp[:, axis] = np.bincount(source, weights=f, minlength=n) - np.bincount(target, weights=f, minlength=n)
+    return disp
+
+
+def warm_seed(seed, nodes, parent, order, previous):
+    """以上一版本的坐标 previous（{节点ID: (x, y)}）为初始位置，返回 (初始位置, 沿用坐标的节点比例)
+
+    新节点放在父节点附近（order 为广度优先顺序，父节点先于子节点确定位置），没有父节点时使用径向布局的位置。
+    """
+    pos = seed.astype(float)
+    known = np.zeros(len(nodes), dtype=bool)
+    for i, node in enumerate(nodes):
+        position = previous.get(node['id'])
+        if position is not None:
+            pos[i] = position
+            known[i] = True
+    for i in order:
+        if not known[i] and parent[i] >= 0:
+            angle = i * GOLDEN_ANGLE
+            pos[i] = pos[parent[i]] + IDEAL_LENGTH * np.array([math.cos(angle), math.sin(angle)])
+    return pos, float(known.mean()) if len(nodes) else 0.0
+
+
+def force_layout(pos, source, target, weight, iterations, k=IDEAL_LENGTH, temperature=None):
+    """从初始位置开始进行力导向迭代，每步位移不超过逐渐降低的温度
+
+    temperature 为初始温度，默认为布局范围的 5%；初始位置已接近平衡时应使用较低的温度。
+    """
+    pos = pos.astype(float)
+    if len(pos) < 2:
+        return pos
+    if temperature is None:
+        temperature = float((pos.max(axis=0) - pos.min(axis=0)).max()) * 0.05 or k
+    for i in range(iterations):
+        disp = _repulsion(pos, k) + _attraction(pos, source, target, weight, k) - GRAVITY * pos
+        length = np.sqrt((disp ** 2).sum(axis=1)) + 1e-9
+        t = temperature * (1 - i / iterations)
+        pos += disp * (np.minimum(length, t) / length)[:, None]
+    return pos
+
+
+class GraphLayout:
+    """依赖图及其节点坐标，支持按目录深度聚合
+
+    graph 为 {'nodes', 'links'}，目录层级取自 contains 类型的边。positions 为已计算好的坐标（如从缓存读取），
+    为 None 时重新计算；previous 为上一版本依赖图的坐标 {节点ID: (x, y)}，覆盖大部分节点时以其为初始位置。
+    """
+
+    def __init__(self, graph, positions=None, iterations=None, previous=None):
+        self.nodes = graph['nodes']
+        n = len(self.nodes)
+        index = {node['id']: i for i, node in enumerate(self.nodes)}
+
+        parent = np.full(n, -1, dtype=np.int64)
+        source, target, weight, link_type = [], [], [], []
+        self.link_types = []
+        type_index = {}
+        for link in graph['links']:
+            s = index.get(link['source'])
+            t = index.get(link['target'])
+            if s is None or t is None or s == t:
+                continue
+            if link['type'] == 'contains' and parent[t] < 0:
+                parent[t] = s
+            if link['type'] not in type_index:
+                type_index[link['type']] = len(self.link_types)
+                self.link_types.append(link['type'])
+            source.append(s)
+            target.append(t)
+            weight.append(link.get('value', 1))
+            link_type.append(type_index[link['type']])
+
+        self.parent = parent
+        self.source = np.array(source, dtype=np.int64)
+        self.target = np.array(target, dtype=np.int64)
+        self.weight = np.array(weight, dtype=float)
+        self.link_type = np.array(link_type, dtype=np.int64)
+        self.is_file = np.array([node['type'] == 'file' for node in self.nodes], dtype=float)
+
+        children, roots, order, self.depth = _hierarchy(n, parent)
+        self.max_depth = int(self.depth.max()) if n else 0
+
+        if positions is not None and len(positions) != n:
+            # 缓存的坐标与当前依赖图不一致，重新计算
+            positions = None
+        if positions is None:
+            seed = radial_seed(n, children, roots, order, self.depth)
+            temperature = None
+            if previous:
+                warm, reused = warm_seed(seed, self.nodes, parent, order, previous)
+                if reused >= WARM_START_MIN_REUSE:
+                    seed, temperature = warm, IDEAL_LENGTH
+                    if iterations is None:
+                        iterations = WARM_START_ITERATIONS
+            strength = np.array([LINK_WEIGHTS.get(self.link_types[t], DEFAULT_LINK_WEIGHT) for t in link_type])
+            positions = force_layout(seed, self.source, self.target, strength,
+                                     iterations if iterations is not None else default_iterations(n),
+                                     temperature=temperature)
+            positions -= positions.mean(axis=0) if n else 0
+        self.positions = np.round(np.asarray(positions, dtype=float), 1)
+
+    def to_positions(self):
+        """导出坐标，用于持久化缓存"""
+        return self.positions.tolist()
+
+    def bounds(self):
+        if not len(self.positions):
+            return [0, 0, 0, 0]
+        lo = self.positions.min(axis=0)
+        hi = self.positions.max(axis=0)
+        return [float(lo[0]), float(lo[1]), float(hi[0]), float(hi[1])]
+
+    def summary(self):
+        """布局摘要，随分析结果返回"""
+        return {
+            'nodes': len(self.nodes),
+            'links': len(self.source),
+            'maxDepth': self.max_depth,
+            'bounds': self.bounds()
+        }
+
+    def _representatives(self, depth):
+        """每个节点在指定深度下所属的可见节点：不超过该深度的节点是它自己，更深的节点是其所在目录"""
+        rep = np.arange(len(self.nodes))
+        while True:
+            deep = self.depth[rep] > depth
+            if not deep.any():
+                return rep
+            rep[deep] = self.parent[rep[deep]]
+
+    def _level(self, depth, bbox):
+        rep = self._representatives(depth)
+        visible, inverse = np.unique(rep, return_inverse=True)
+        members = np.bincount(inverse)
+        files = np.bincount(inverse, weights=self.is_file)
+        # 超级节点显示在其成员的质心，放大展开后子节点分布在其周围
+        centroid = np.column_stack([
+            np.bincount(inverse, weights=self.positions[:, 0]) / members,
+            np.bincount(inverse, weights=self.positions[:, 1]) / members
+        ])
+        collapsed = members > 1
+        position = np.where(collapsed[:, None], centroid, self.positions[visible])
+
+        keep = np.ones(len(visible), dtype=bool)
+        if bbox is not None:
+            x0, y0, x1, y1 = bbox
+            pad_x, pad_y = (x1 - x0) * 0.1, (y1 - y0) * 0.1
+            keep = ((position[:, 0] >= x0 - pad_x) & (position[:, 0] <= x1 + pad_x) &
+                    (position[:, 1] >= y0 - pad_y) & (position[:, 1] <= y1 + pad_y))
+        return visible, inverse, members, files, collapsed, position, keep
+
+    def level(self, depth=None, bbox=None, max_nodes=2000):
+        """返回指定深度的聚合视图
+
+        depth 为 None 时从最大深度开始；可见节点（bbox 范围内）超过 max_nodes 时逐级降低深度。
+        超级节点的 count 为其包含的文件数，边的 value 为合并前的权重之和，count 为合并的边数。
+        """
+        depth = self.max_depth if depth is None else min(max(int(depth), 0), self.max_depth)
+        while True:
+            visible, inverse, members, files, collapsed, position, keep = self._level(depth, bbox)
+            if keep.sum() <= max_nodes or depth == 0:
+                break
+            depth -= 1
+
+        shown = np.flatnonzero(keep)
+        remap = np.full(len(visible), -1, dtype=np.int64)
+        remap[shown] = np.arange(len(shown))
+
+        nodes = []
+        for i in shown:
+            node = self.nodes[visible[i]]
+            count = int(files[i]) if collapsed[i] else 1
+            nodes.append({
+                'id': node['id'],
+                'name': node['name'],
+                'type': node['type'],
+                'url': node.get('url'),
+                'x': round(float(position[i, 0]), 1),
+                'y': round(float(position[i, 1]), 1),
+                'size': min(8 + 2 * math.sqrt(count), 30) if collapsed[i] else node.get('size', 5),
+                'count': count,
+                'collapsed': bool(collapsed[i])
+            })
+
+        links = []
+        if len(self.source) and len(shown):
+            rs = remap[inverse[self.source]]
+            rt = remap[inverse[self.target]]
+            mask = (rs >= 0) & (rt >= 0) & (rs != rt)
+            n_shown = len(shown)
+            n_types = max(len(self.link_types), 1)
+            key = (rs[mask] * n_shown + rt[mask]) * n_types + self.link_type[mask]
+            unique_keys, group = np.unique(key, return_inverse=True)
+            values = np.bincount(group, weights=self.weight[mask])
+            counts = np.bincount(group)
+            for key_value, value, count in zip(unique_keys.tolist(), values.tolist(), counts.tolist()):
+                pair, t = divmod(key_value, n_types)
+                s, d = divmod(pair, n_shown)
+                links.append({
+                    'source': nodes[s]['id'],
+                    'target': nodes[d]['id'],
+                    'type': self.link_types[t],
+                    'value': value,
+                    'count': count
+                })
+
+        return {
+            'depth': depth,
+            'maxDepth': self.max_depth,
+            'bounds': self.bounds(),
+            'nodes': nodes,
+            'links': links
+        }
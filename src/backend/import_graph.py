@@ -0,0 +1,189 @@
+"""
+导入依赖提取模块
+解析 Python 的 import 语句和 JS/TS 的 import/require 语句，并将其解析为仓库内的文件路径，
+生成真实的文件依赖边。解析在进程池中进行，结果按文件内容的 blob SHA 缓存。
+"""
+import ast
+import logging
+import posixpath
+import re
+import sys
+
+from caching import MemoryCache
+from process_pool import map_blobs
+
+logger = logging.getLogger(__name__)
+
+PARSE_CACHE_VERSION = 1  # 解析结果格式版本
+
+PYTHON_EXTENSIONS = ('.py',)
+JS_EXTENSIONS = ('.js', '.jsx', '.ts', '.tsx', '.mjs', '.cjs', '.vue', '.svelte')
+SOURCE_EXTENSIONS = PYTHON_EXTENSIONS + JS_EXTENSIONS
+
+# Python 第三方依赖声明文件，无法在仓库内解析的导入连接到最近的声明文件
+PYTHON_MANIFESTS = ('requirements.txt', 'pyproject.toml', 'setup.py', 'Pipfile')
+JS_MANIFESTS = ('package.json',)
+
+JS_IMPORT_PATTERNS = [
+    re.compile(r'''(?:import|export)\s[^'";]*?\bfrom\s*['"]([^'"\n]+)['"]'''),
+    re.compile(r'''\bimport\s*['"]([^'"\n]+)['"]'''),
+    re.compile(r'''\b(?:require|import)\s*\(\s*['"]([^'"\n]+)['"]\s*\)'''),
+]
+JS_COMMENT_PATTERN = re.compile(r'/\*.*?\*/|//[^\n]*', re.S)
+
+STDLIB_MODULES = set(getattr(sys, 'stdlib_module_names', ())) | set(sys.builtin_module_names)
+
+# 按 blob SHA 缓存的解析结果
+parse_cache = MemoryCache(max_entries=200000, default_ttl=7 * 24 * 3600)
+
+
+def is_source_file(path):
+    """判断是否为需要解析导入语句的源文件"""
+    return path.endswith(SOURCE_EXTENSIONS)
+
+
+def extract_imports(path, source):
+    """提取单个文件中的导入语句
+
+    Python 返回 [(模块名, 相对层级, [导入的名称])]，JS/TS 返回 [(模块说明符, 0, [])]。
+    """
+    if path.endswith(PYTHON_EXTENSIONS):
+        try:
+            tree = ast.parse(source)
+        except (SyntaxError, ValueError):
+            return []
+        imports = []
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                imports.extend((alias.name, 0, []) for alias in node.names)
+            elif isinstance(node, ast.ImportFrom):
+                imports.append((node.module or '', node.level, [alias.name for alias in node.names]))
+        return imports
+
+    source = JS_COMMENT_PATTERN.sub('', source)
+    specifiers = []
+    for pattern in JS_IMPORT_PATTERNS:
+        specifiers.extend(pattern.findall(source))
+    return [(spec, 0, []) for spec in dict.fromkeys(specifiers)]
+
+
+def _parse_batch(items):
+    """进程池任务：解析一批 (path, source)，返回解析结果列表"""
+    return [extract_imports(path, source) for path, source in items]
+
+
+def parse_sources(files, load_sources):
+    """获取各源文件的导入语句
+
+    files 为 [{'path', 'sha'}]，load_sources(paths) 返回 {path: 源码}。
+    已缓存的 blob 不会重新下载和解析。返回 {path: 导入列表}。
+    """
+    return map_blobs(files, load_sources, _parse_batch, parse_cache, f"imports:v{PARSE_CACHE_VERSION}")
+
+
+class ModuleResolver:
+    """将导入语句解析为仓库内的文件路径"""
+
+    def __init__(self, paths):
+        self.paths = set(paths)
+        dirs_with_init = {posixpath.dirname(p) for p in self.paths if p.endswith('/__init__.py') or p == '__init__.py'}
+
+        # Python 模块名 -> 文件路径；同时登记从仓库根目录和从包根目录起算的模块名
+        self.modules = {}
+        for path in self.paths:
+            if not path.endswith('.py'):
+                continue
+            parts = path[:-3].split('/')
+            if parts[-1] == '__init__':
+                parts = parts[:-1]
+            if not parts:
+                continue
+            root = len(parts) - 1
+            while root > 0 and '/'.join(parts[:root]) in dirs_with_init:
+                root -= 1
+            for start in {0, root}:
+                self.modules.setdefault('.'.join(parts[start:]), path)
+
+        self.manifests = {}
+        for path in self.paths:
+            name = posixpath.basename(path)
+            if name in PYTHON_MANIFESTS or name in JS_MANIFESTS:
+                self.manifests.setdefault((posixpath.dirname(path), name in JS_MANIFESTS), path)
+
+    def nearest_manifest(self, path, js):
+        """查找距离文件最近的依赖声明文件"""
+        directory = posixpath.dirname(path)
+        while True:
+            manifest = self.manifests.get((directory, js))
+            if manifest:
+                return manifest
+            if not directory:
+                return None
+            directory = posixpath.dirname(directory)
+
+    def resolve(self, path, imports):
+        """返回文件导入的仓库内路径集合"""
+        if path.endswith(PYTHON_EXTENSIONS):
+            return self._resolve_python(path, imports)
+        return self._resolve_js(path, imports)
+
+    def _resolve_python(self, path, imports):
+        targets = set()
+        package = posixpath.dirname(path).replace('/', '.')
+        for module, level, names in imports:
+            if level:
+                base = package.split('.') if package else []
+                if level > 1:
+                    base = base[:-(level - 1)] if level - 1 <= len(base) else None
+                if base is None:
+                    continue
+                module = '.'.join(base + ([module] if module else []))
+
+            resolved = False
+            # from x import y 中的 y 可能是子模块
+            for name in names:
+                target = self.modules.get(f"{module}.{name}" if module else name)
+                if target:
+                    targets.add(target)
+                    resolved = True
+            target = self.modules.get(module)
+            if target:
+                targets.add(target)
+                resolved = True
+
+            if not resolved and not level and module.split('.')[0] not in STDLIB_MODULES:
+                manifest = self.nearest_manifest(path, js=False)
+                if manifest:
+                    targets.add(manifest)
+
+        targets.discard(path)
+        return targets
+
+    def _resolve_js(self, path, imports):
+        targets = set()
+        directory = posixpath.dirname(path)
+        for spec, _, _ in imports:
+            if spec.startswith('.') or spec.startswith('/'):
+                base = posixpath.normpath(posixpath.join(directory, spec)).lstrip('/')
+                candidates = [base] + [base + ext for ext in JS_EXTENSIONS] + \
+                    [f"{base}/index{ext}" for ext in JS_EXTENSIONS]
+                target = next((c for c in candidates if c in self.paths), None)
+            else:
+                # 第三方包连接到最近的 package.json
+                target = self.nearest_manifest(path, js=True)
+            if target:
+                targets.add(target)
+
+        targets.discard(path)
+        return targets
+
+
+def resolve_import_edges(imports_by_path, all_paths):
+    """将 {path: 导入列表} 解析为依赖边，返回按路径排序的 [(源文件路径, 被依赖文件路径)]"""
+    resolver = ModuleResolver(all_paths)
+
+    edges = []
+    for path in sorted(imports_by_path):
+        for target in sorted(resolver.resolve(path, imports_by_path[path])):
+            edges.append((path, target))
+    return edges
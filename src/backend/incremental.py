@@ -0,0 +1,102 @@
+"""
+增量分析模块
+保存仓库最近一次分析的结果和逐文件结果（导入语句、代码度量）作为基线。再次分析同一仓库的新提交时，
+按 tree SHA 对比新旧文件树：SHA 相同的子树整体跳过，只有 blob SHA 变化的文件需要重新下载和计算，
+依赖边和代码质量数据在基线的基础上修补。
+"""
+import threading
+
+
+class TreeDiff:
+    """两棵文件树之间的文件差异，added、removed、modified 为文件路径集合"""
+
+    def __init__(self):
+        self.added = set()
+        self.removed = set()
+        self.modified = set()
+
+    @property
+    def paths_changed(self):
+        """是否有新增或删除的文件（文件路径集合发生变化）"""
+        return bool(self.added or self.removed)
+
+    def __len__(self):
+        return len(self.added) + len(self.removed) + len(self.modified)
+
+
+def _collect_files(node, paths):
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node['type'] == 'file':
+            paths.add(node['path'])
+        else:
+            stack.extend(node.get('children', []))
+
+
+def diff_file_trees(old_root, new_root):
+    """对比新旧文件树，返回 TreeDiff
+
+    tree SHA 相同的目录不再展开，耗时与变化的目录数成正比；没有 SHA 的目录和文件（如非 git 的本地目录）
+    总是逐项对比并视为已修改。
+    """
+    diff = TreeDiff()
+    stack = [(old_root, new_root)]
+    while stack:
+        old, new = stack.pop()
+        old_children = {child['name']: child for child in old.get('children', [])}
+        for child in new.get('children', []):
+            previous = old_children.pop(child['name'], None)
+            if previous is not None and previous['type'] != child['type']:
+                _collect_files(previous, diff.removed)
+                previous = None
+            if previous is None:
+                _collect_files(child, diff.added)
+            elif not child.get('sha') or child['sha'] != previous.get('sha'):
+                if child['type'] == 'dir':
+                    stack.append((previous, child))
+                else:
+                    diff.modified.add(child['path'])
+        for previous in old_children.values():
+            _collect_files(previous, diff.removed)
+    return diff
+
+
+class AnalysisBase:
+    """增量分析的基线：上一次分析的提交、结果和逐文件结果
+
+    file_data 为 {'imports': {path: 导入列表}, 'metrics': {path: 度量}}，与 result 出自同一次分析；
+    文件在新提交中 blob SHA 未变化时，其结果可以直接沿用。files 为基线文件树中的文件数。
+    """
+
+    def __init__(self, commit, result, file_data, files=0):
+        self.commit = commit
+        self.result = result
+        self.file_data = file_data or {}
+        self.files = files
+        self._diff = None
+        self._lock = threading.Lock()
+
+    @property
+    def file_structure(self):
+        return self.result['fileStructure']
+
+    def diff(self, file_structure):
+        """与新文件树的差异，同一次分析的多个阶段共享计算结果"""
+        with self._lock:
+            if self._diff is None or self._diff[0] is not file_structure:
+                self._diff = (file_structure, diff_file_trees(self.file_structure, file_structure))
+            return self._diff[1]
+
+    def split(self, kind, files, diff):
+        """将 [{'path', 'sha'}] 分为可沿用的结果 {path: 结果} 和需要重新计算的文件列表"""
+        previous = self.file_data.get(kind) or {}
+        reused = {}
+        missing = []
+        for f in files:
+            path = f['path']
+            if path in previous and path not in diff.modified and path not in diff.added:
+                reused[path] = previous[path]
+            else:
+                missing.append(f)
+        return reused, missing
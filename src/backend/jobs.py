@@ -0,0 +1,148 @@
+"""
+异步分析任务模块
+使用有界线程池执行分析任务，记录各阶段进度；相同键的并发请求会合并到同一个进行中的任务（single-flight）。
+"""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """单个分析任务的状态"""
+
+    def __init__(self, key, stages):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = 'queued'
+        self.stages = {name: 'pending' for name in stages}
+        self.result = None
+        self.partial = {}
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        # 每次状态变化递增，供事件流判断是否有更新
+        self.version = 0
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'error')
+
+    def to_dict(self, skip=()):
+        """序列化为接口返回格式
+
+        任务进行中时 partial 包含已完成阶段的结果；skip 中的阶段（客户端已获取或不需要的阶段）
+        在 partial 和最终的 result 中都不返回。
+        """
+        data = {
+            'jobId': self.id,
+            'status': self.status,
+            'stages': dict(self.stages),
+            'version': self.version
+        }
+        if self.status == 'done':
+            if skip and self.result:
+                data['result'] = {stage: value for stage, value in self.result.items() if stage not in skip}
+            else:
+                data['result'] = self.result
+        elif self.partial:
+            data['partial'] = {stage: value for stage, value in self.partial.items() if stage not in skip}
+        if self.error:
+            data['error'] = self.error
+        return data
+
+
+class JobManager:
+    """任务调度器"""
+
+    def __init__(self, max_workers=4, retention=600):
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis-job')
+        self._jobs = {}
+        self._inflight = {}
+        self._cond = threading.Condition()
+
+    def submit(self, key, stages, fn):
+        """提交任务；若相同键的任务仍在进行中，直接返回该任务
+
+        fn(job) 在工作线程中执行，返回值作为任务结果，可通过 update_stage 汇报阶段进度。
+        返回 (job, created)。
+        """
+        with self._cond:
+            self._prune()
+            job = self._inflight.get(key)
+            if job is not None:
+                return job, False
+
+            job = Job(key, stages)
+            self._jobs[job.id] = job
+            self._inflight[key] = job
+
+        self._executor.submit(self._run, job, fn)
+        return job, True
+
+    def complete(self, key, stages, result):
+        """登记一个已完成的任务（例如结果直接命中缓存）"""
+        job = Job(key, stages)
+        job.status = 'done'
+        job.stages = {name: 'done' for name in stages}
+        job.result = result
+        job.finished_at = time.time()
+        with self._cond:
+            self._prune()
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        """按ID查找任务"""
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def update_stage(self, job, stage, status, value=None):
+        """更新任务某个阶段的状态，阶段结束时 value 为该阶段结果"""
+        with self._cond:
+            job.stages[stage] = status
+            if status != 'running':
+                job.partial[stage] = value
+            job.version += 1
+            self._cond.notify_all()
+
+    def wait_for_update(self, job, version, timeout):
+        """阻塞等待任务版本号超过 version 或任务结束，返回最新版本号"""
+        with self._cond:
+            self._cond.wait_for(lambda: job.version > version or job.finished, timeout=timeout)
+            return job.version
+
+    def _run(self, job, fn):
+        with self._cond:
+            job.status = 'running'
+            job.version += 1
+            self._cond.notify_all()
+
+        try:
+            result = fn(job)
+            status, error = 'done', None
+        except Exception as e:
+            logger.error(f"分析任务 {job.key} 执行失败: {str(e)}", exc_info=True)
+            result, status, error = None, 'error', str(e)
+
+        with self._cond:
+            job.result = result
+            job.status = status
+            job.error = error
+            job.finished_at = time.time()
+            job.version += 1
+            if self._inflight.get(job.key) is job:
+                del self._inflight[job.key]
+            self._cond.notify_all()
+
+    def _prune(self):
+        """清理超过保留时间的已完成任务（调用方需持有锁）"""
+        cutoff = time.time() - self.retention
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,337 @@
+"""
+本地仓库获取模块
+直接读取本地工作目录或裸仓库，不经过 GitHub API：
+git 仓库通过 `git ls-tree -r` 列出已提交的文件、`git cat-file --batch` 批量读取内容；
+普通目录通过 os.scandir 遍历文件系统。
+"""
+import hashlib
+import logging
+import os
+import subprocess
+import threading
+from datetime import datetime, timezone
+
+from archive_ingest import git_blob_sha
+from stages import mark_incomplete
+
+logger = logging.getLogger(__name__)
+
+GIT_BINARY = os.environ.get('GIT_BINARY', 'git')  # git 可执行文件
+GIT_TIMEOUT = 120  # 单条 git 命令的超时时间（秒）
+SKIP_DIRS = {'.git', '.hg', '.svn'}  # 遍历文件系统时跳过的目录
+
+
+class LocalRepoError(Exception):
+    """本地路径不存在、不在允许的目录下或无法读取"""
+
+
+def resolve_local_path(path, roots):
+    """将请求中的路径解析为真实路径，并校验其位于允许的根目录下"""
+    if not roots:
+        raise LocalRepoError("未启用本地仓库分析（未配置 LOCAL_REPO_ROOTS）")
+
+    real = os.path.realpath(os.path.expanduser(path))
+    for root in roots:
+        root = os.path.realpath(root)
+        if os.path.commonpath([real, root]) == root:
+            break
+    else:
+        raise LocalRepoError(f"路径 '{path}' 不在允许分析的目录下")
+
+    if not os.path.isdir(real):
+        raise LocalRepoError(f"目录 '{path}' 不存在")
+    return real
+
+
+def _git(path, *args):
+    """在仓库目录下执行 git 命令，返回标准输出字节串"""
+    result = subprocess.run(
+        [GIT_BINARY, '-C', path, *args],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=GIT_TIMEOUT
+    )
+    if result.returncode != 0:
+        raise LocalRepoError(f"git {args[0]} 执行失败: {result.stderr.decode('utf-8', errors='replace').strip()}")
+    return result.stdout
+
+
+def git_repository_root(path):
+    """返回包含 path 的 git 仓库根目录（工作目录的顶层或裸仓库目录）；不在 git 仓库中时返回 None"""
+    try:
+        is_bare, git_dir = _git(path, 'rev-parse', '--is-bare-repository', '--absolute-git-dir').decode().split('\n')[:2]
+        if is_bare == 'true':
+            return os.path.realpath(git_dir)
+        return os.path.realpath(_git(path, 'rev-parse', '--show-toplevel').decode().strip())
+    except (LocalRepoError, OSError, ValueError):
+        return None
+
+
+def resolve_git_commit(path, ref='HEAD'):
+    """返回 ref 指向的提交 SHA；目录不是 git 仓库或尚无提交时返回 None
+
+    path 位于外层 git 仓库的子目录中时同样返回 None（按普通目录处理），
+    否则 git 命令会作用于外层仓库，读到允许的目录之外的文件。
+    """
+    if git_repository_root(path) != os.path.realpath(path):
+        return None
+    try:
+        return _git(path, 'rev-parse', '--verify', '--quiet', f'{ref}^{{commit}}').decode().strip() or None
+    except (LocalRepoError, OSError):
+        return None
+
+
+def check_relative_path(path):
+    """校验仓库内的相对路径，拒绝绝对路径和 '.'、'..' 路径段"""
+    parts = path.replace('\\', '/').split('/')
+    if not path or path.startswith('/') or os.path.isabs(path) or any(part in ('', '.', '..') for part in parts):
+        raise LocalRepoError(f"无效的文件路径 '{path}'")
+    return path
+
+
+def _parse_ls_tree(output):
+    """解析 `git ls-tree -l -z` 的输出，返回与 Git Trees API 相同格式的条目列表"""
+    entries = []
+    for record in output.split(b'\0'):
+        if not record:
+            continue
+        meta, _, path = record.partition(b'\t')
+        _, entry_type, sha, size = meta.decode().split()
+        path = path.decode('utf-8', errors='replace')
+        # 相对于子目录列出时会出现 './' 或 '../' 开头的条目，不属于本仓库
+        if any(part in ('', '.', '..') for part in path.split('/')):
+            continue
+        entries.append({
+            'path': path,
+            'type': entry_type,
+            'sha': sha,
+            'size': int(size) if size != '-' else None
+        })
+    return entries
+
+
+def list_git_entries(path, commit):
+    """列出提交中的全部条目（含目录），路径相对于仓库根目录"""
+    return _parse_ls_tree(_git(path, 'ls-tree', '-r', '-t', '-l', '-z', '--full-tree', commit))
+
+
+def read_git_blobs(path, shas):
+    """通过一个 `git cat-file --batch` 进程批量读取 blob，返回 {sha: 字节串}"""
+    if not shas:
+        return {}
+
+    proc = subprocess.Popen(
+        [GIT_BINARY, '-C', path, 'cat-file', '--batch'],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+
+    # 在单独的线程中写入请求，避免输出缓冲区写满后双方互相等待
+    def write_requests():
+        try:
+            for sha in shas:
+                proc.stdin.write(f"{sha}\n".encode())
+        except BrokenPipeError:
+            pass
+        finally:
+            proc.stdin.close()
+
+    writer = threading.Thread(target=write_requests, daemon=True)
+    writer.start()
+
+    blobs = {}
+    try:
+        for _ in shas:
+            header = proc.stdout.readline()
+            if not header:
+                break
+            parts = header.split()
+            if len(parts) != 3:
+                # "<sha> missing"
+                continue
+            sha, _, size = parts
+            data = proc.stdout.read(int(size))
+            proc.stdout.read(1)  # 内容后的换行符
+            blobs[sha.decode()] = data
+    finally:
+        proc.stdout.close()
+        writer.join()
+        proc.wait()
+    return blobs
+
+
+def scan_directory(path, max_files):
+    """遍历普通目录，返回按路径排序的条目列表；不跟随符号链接
+
+    文件数超过 max_files 时多保留一个文件条目，由调用方据此判断是否截断。
+    """
+    entries = []
+    file_count = 0
+    stack = ['']
+    while stack and file_count <= max_files:
+        prefix = stack.pop()
+        try:
+            with os.scandir(os.path.join(path, prefix)) as it:
+                items = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            logger.warning(f"无法读取目录 '{prefix}': {str(e)}")
+            continue
+
+        subdirs = []
+        for item in items:
+            rel = f"{prefix}/{item.name}" if prefix else item.name
+            if item.is_dir(follow_symlinks=False):
+                if item.name not in SKIP_DIRS:
+                    entries.append({'path': rel, 'type': 'tree', 'sha': None, 'size': None})
+                    subdirs.append(rel)
+            elif item.is_file(follow_symlinks=False):
+                stat = item.stat(follow_symlinks=False)
+                entries.append({'path': rel, 'type': 'blob', 'sha': None, 'size': stat.st_size,
+                                'mtime': stat.st_mtime_ns})
+                file_count += 1
+        stack.extend(reversed(subdirs))
+
+    entries.sort(key=lambda e: e['path'])
+    return entries
+
+
+def _decode_text(data):
+    """解码文本文件，二进制文件返回 None"""
+    if b'\0' in data[:8192]:
+        return None
+    return data.decode('utf-8', errors='replace')
+
+
+class LocalRepo:
+    """本地仓库（git 工作目录、裸仓库或普通目录）
+
+    git 仓库分析 HEAD 指向的提交（未提交的修改不计入），版本号为提交 SHA；
+    普通目录的版本号为文件路径、大小和修改时间的指纹。
+    """
+
+    def __init__(self, path, roots):
+        self.path = resolve_local_path(path, roots)
+        self.name = os.path.basename(self.path.rstrip(os.sep)) or self.path
+        self.commit = resolve_git_commit(self.path)
+        self._entries = None
+        self._entries_lock = threading.Lock()
+        self._shas = None
+
+    @property
+    def is_git(self):
+        return self.commit is not None
+
+    def entries(self, max_files):
+        """列出仓库条目，结果在实例内复用"""
+        with self._entries_lock:
+            if self._entries is None:
+                if self.is_git:
+                    self._entries = list_git_entries(self.path, self.commit)
+                else:
+                    self._entries = scan_directory(self.path, max_files)
+                self._shas = {e['path']: e['sha'] for e in self._entries if e['type'] == 'blob'}
+            return self._entries
+
+    def revision(self, max_files):
+        """返回可作为缓存键的版本号"""
+        if self.is_git:
+            return self.commit
+        digest = hashlib.sha1()
+        for entry in self.entries(max_files):
+            if entry['type'] == 'blob':
+                digest.update(f"{entry['path']}\0{entry['size']}\0{entry['mtime']}\n".encode('utf-8', errors='replace'))
+        return f"fs-{digest.hexdigest()}"
+
+    def info(self):
+        """返回与 GitHub 仓库信息相同字段的本地仓库信息"""
+        created_at = updated_at = None
+        if self.is_git:
+            try:
+                updated_at = _git(self.path, 'log', '-1', '--format=%cI', self.commit).decode().strip() or None
+                first = _git(self.path, 'rev-list', '--max-parents=0', self.commit).split()
+                if first:
+                    created_at = _git(self.path, 'log', '-1', '--format=%cI', first[-1].decode()).decode().strip() or None
+            except LocalRepoError as e:
+                logger.warning(f"读取本地仓库提交时间失败: {str(e)}")
+        else:
+            updated_at = datetime.fromtimestamp(os.stat(self.path).st_mtime, tz=timezone.utc).isoformat()
+
+        return {
+            'name': self.name,
+            'full_name': self.path,
+            'description': f"本地仓库（{self.commit[:12]}）" if self.is_git else "本地目录",
+            'language': None,
+            'stars': 0,
+            'forks': 0,
+            'created_at': created_at,
+            'updated_at': updated_at,
+            'url': None
+        }
+
+    def load_sources(self, paths):
+        """读取一组文件的文本内容，返回 {path: 文本或 None}；读取失败时将当前分析阶段标记为结果不完整"""
+        if self._shas is None:
+            raise LocalRepoError("需要先调用 entries() 列出仓库条目")
+
+        if self.is_git:
+            shas = {path: self._shas.get(path) for path in paths}
+            blobs = read_git_blobs(self.path, sorted({sha for sha in shas.values() if sha}))
+            unreadable = sum(1 for sha in shas.values() if sha and sha not in blobs)
+            if unreadable:
+                mark_incomplete(f"{unreadable} 个 blob 读取失败")
+            return {path: _decode_text(blobs[sha]) if sha in blobs else None for path, sha in shas.items()}
+
+        sources = {}
+        for path in paths:
+            if path not in self._shas:
+                sources[path] = None
+                continue
+            try:
+                with open(os.path.join(self.path, path), 'rb') as f:
+                    sources[path] = _decode_text(f.read())
+            except OSError as e:
+                logger.warning(f"读取本地文件 '{path}' 失败: {str(e)}")
+                mark_incomplete(f"读取本地文件 '{path}' 失败")
+                sources[path] = None
+        return sources
+
+    def list_dir(self, path, tree_sha=None):
+        """列出目录的直接子项，条目的 path 为名称
+
+        git 仓库通过 `git ls-tree` 读取子树（tree_sha 为 None 时读取提交的根目录）；
+        普通目录直接遍历文件系统，不跟随符号链接。
+        """
+        if self.is_git:
+            return _parse_ls_tree(_git(self.path, 'ls-tree', '-l', '-z', tree_sha or self.commit))
+
+        full_path = os.path.realpath(os.path.join(self.path, path))
+        if os.path.commonpath([full_path, self.path]) != self.path or not os.path.isdir(full_path):
+            raise LocalRepoError(f"目录 '{path}' 不存在")
+
+        entries = []
+        with os.scandir(full_path) as it:
+            for item in it:
+                if item.is_dir(follow_symlinks=False):
+                    if item.name not in SKIP_DIRS:
+                        entries.append({'path': item.name, 'type': 'tree', 'sha': None, 'size': None})
+                elif item.is_file(follow_symlinks=False):
+                    entries.append({'path': item.name, 'type': 'blob', 'sha': None,
+                                    'size': item.stat(follow_symlinks=False).st_size})
+        return entries
+
+    def read_file(self, path):
+        """读取单个文件，返回 (blob SHA, 字节串)；路径无效或文件不存在时抛出 LocalRepoError"""
+        check_relative_path(path)
+        if self.is_git:
+            output = _git(self.path, 'ls-tree', '-l', '-z', '--full-tree', self.commit, '--', path)
+            entry = next((e for e in _parse_ls_tree(output) if e['type'] == 'blob'), None)
+            if entry is None:
+                raise LocalRepoError(f"文件 '{path}' 不存在")
+            data = read_git_blobs(self.path, [entry['sha']]).get(entry['sha'])
+            if data is None:
+                raise LocalRepoError(f"无法读取文件 '{path}'")
+            return entry['sha'], data
+
+        full_path = os.path.realpath(os.path.join(self.path, path))
+        if os.path.commonpath([full_path, self.path]) != self.path or not os.path.isfile(full_path):
+            raise LocalRepoError(f"文件 '{path}' 不存在")
+        with open(full_path, 'rb') as f:
+            data = f.read()
+        return git_blob_sha(data), data
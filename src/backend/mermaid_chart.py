@@ -0,0 +1,178 @@
+"""
+Mermaid 项目结构图生成模块
+在本地将文件树确定性地转换为 `flowchart TD` 图表：按层级广度优先展开，
+单子目录链合并为一个节点，超出深度、子节点数或总节点数限制的部分折叠为汇总节点。
+"""
+DIR_STYLE = "fill:#f9f,stroke:#333,stroke-width:1px"
+FILE_STYLE = "fill:#bbf,stroke:#333,stroke-width:1px"
+COLLAPSED_STYLE = "fill:#eee,stroke:#999,stroke-width:1px,stroke-dasharray:3 3"
+
+
+def format_size(size):
+    """将字节数格式化为便于阅读的字符串"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1024
+
+
+def _escape(label):
+    """转义 Mermaid 标签中的特殊字符"""
+    return label.replace('"', '#quot;').replace('\n', ' ')
+
+
+def summarize_tree(root):
+    """自底向上统计每个目录包含的文件数和总大小，返回 {id(目录节点): (文件数, 总字节数)}"""
+    stats = {}
+    order = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node['type'] == 'dir':
+            order.append(node)
+            stack.extend(node.get('children', []))
+
+    for node in reversed(order):
+        files, size = 0, 0
+        for child in node.get('children', []):
+            if child['type'] == 'dir':
+                child_files, child_size = stats[id(child)]
+                files += child_files
+                size += child_size
+            else:
+                files += 1
+                size += child.get('size') or 0
+        stats[id(node)] = (files, size)
+    return stats
+
+
+def _sort_key(stats):
+    # 目录在前，按包含文件数降序；文件按大小降序；同等情况下按名称排序，保证输出确定
+    def key(node):
+        if node['type'] == 'dir':
+            return (0, -stats[id(node)][0], node['name'])
+        return (1, -(node.get('size') or 0), node['name'])
+    return key
+
+
+def _collapse_chain(node):
+    """合并只有一个子目录的目录链，返回 (链末端目录, 显示名称)"""
+    name = node['name']
+    while node['type'] == 'dir':
+        children = node.get('children', [])
+        if len(children) != 1 or children[0]['type'] != 'dir':
+            break
+        node = children[0]
+        name = f"{name}/{node['name']}"
+    return node, name
+
+
+def build_mermaid_chart(root, max_depth=3, max_children=10, max_nodes=150):
+    """将文件树转换为 Mermaid 流程图代码
+
+    max_depth 为最多展开的目录层数，max_children 为每个目录最多显示的子节点数，
+    max_nodes 为图中节点总数上限；被省略的部分以汇总节点显示其文件数和大小。
+    """
+    stats = summarize_tree(root)
+    sort_key = _sort_key(stats)
+    lines = ["flowchart TD"]
+    classes = {'dir': [], 'file': [], 'collapsed': []}
+    count = 0
+
+    def add_node(label, kind, url=None):
+        nonlocal count
+        count += 1
+        node_id = f"n{count}"
+        lines.append(f'{node_id}["{_escape(label)}"]')
+        if url:
+            lines.append(f'click {node_id} href "{url}" _blank')
+        classes[kind].append(node_id)
+        return node_id
+
+    def dir_label(name, node):
+        files, size = stats[id(node)]
+        return f"{name}/ ({files} 个文件, {format_size(size)})"
+
+    root_id = add_node(dir_label(root['name'], root), 'dir', root.get('url'))
+    # 广度优先展开，节点数达到上限时优先保留较浅的层级
+    queue = [(root, root_id, 0)]
+    head = 0
+    while head < len(queue):
+        node, node_id, depth = queue[head]
+        head += 1
+
+        children = sorted(node.get('children', []), key=sort_key)
+        shown = []
+        for child in children[:max_children]:
+            if count + len(shown) >= max_nodes - 1:
+                break
+            shown.append(child)
+
+        for child in shown:
+            if child['type'] == 'dir':
+                tail, name = _collapse_chain(child)
+                expand = depth + 1 < max_depth and bool(tail.get('children'))
+                kind = 'dir' if expand else 'collapsed'
+                child_id = add_node(dir_label(name, tail), kind, tail.get('url'))
+                if expand:
+                    queue.append((tail, child_id, depth + 1))
+            else:
+                child_id = add_node(child['name'], 'file', child.get('url'))
+            lines.append(f"{node_id} --> {child_id}")
+
+        hidden = children[len(shown):]
+        if hidden:
+            files = sum(stats[id(c)][0] if c['type'] == 'dir' else 1 for c in hidden)
+            size = sum(stats[id(c)][1] if c['type'] == 'dir' else (c.get('size') or 0) for c in hidden)
+            dirs = sum(1 for c in hidden if c['type'] == 'dir')
+            if dirs:
+                label = f"… 其余 {len(hidden) - dirs} 个文件、{dirs} 个目录 (共 {files} 个文件, {format_size(size)})"
+            else:
+                label = f"… 其余 {files} 个文件 ({format_size(size)})"
+            lines.append(f"{node_id} --> {add_node(label, 'collapsed')}")
+
+    lines.append(f"classDef dir {DIR_STYLE}")
+    lines.append(f"classDef file {FILE_STYLE}")
+    lines.append(f"classDef collapsed {COLLAPSED_STYLE}")
+    for kind, ids in classes.items():
+        if ids:
+            lines.append(f"class {','.join(ids)} {kind}")
+    return "\n".join(lines)
+
+
+def describe_tree(root, max_depth=3, max_children=10):
+    """生成供 LLM 使用的缩进文件树描述，超出限制的部分以汇总行表示
+
+    描述只包含名称、层级和文件数，文件按名称排序，不含大小：只修改文件内容的提交得到相同的描述，
+    可直接作为 AI 图表的缓存键。
+    """
+    stats = summarize_tree(root)
+
+    def sort_key(node):
+        if node['type'] == 'dir':
+            return (0, -stats[id(node)][0], node['name'])
+        return (1, 0, node['name'])
+
+    lines = []
+
+    def walk(node, name, level):
+        indent = "  " * level
+        if node['type'] != 'dir':
+            lines.append(f"{indent}- {name} (文件)")
+            return
+        files = stats[id(node)][0]
+        lines.append(f"{indent}- {name} (目录, {files} 个文件)")
+        if level >= max_depth:
+            return
+        children = sorted(node.get('children', []), key=sort_key)
+        for child in children[:max_children]:
+            if child['type'] == 'dir':
+                tail, child_name = _collapse_chain(child)
+                walk(tail, child_name, level + 1)
+            else:
+                walk(child, child['name'], level + 1)
+        if len(children) > max_children:
+            lines.append(f"{indent}  - … 其余 {len(children) - max_children} 项")
+
+    walk(root, root['name'], 0)
+    return "\n".join(lines)
@@ -0,0 +1,80 @@
+"""
+进程池模块
+为导入解析、代码度量等 CPU 密集型任务提供共享的进程池，并按批次分发以降低进程间通信开销。
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+PARSE_WORKERS = int(os.environ.get('PARSE_WORKERS', os.cpu_count() or 1))  # 解析进程数，0 表示在当前进程内执行
+PARSE_POOL_THRESHOLD = 64  # 待处理项数超过该值时才使用进程池
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # 父进程的进程池由父进程中的管理线程维护，子进程无法使用，下次调用时重新创建
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_process_pool():
+    """获取进程内共享的进程池"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+    return _pool
+
+
+def map_batched(batch_fn, items):
+    """对 items 批量执行 batch_fn(批次) 并按原顺序返回结果列表
+
+    batch_fn 必须是模块级函数（可被 pickle），接收一批元素并返回等长的结果列表。
+    数量较少时直接在当前进程执行，避免进程间通信的开销。
+    """
+    if PARSE_WORKERS <= 0 or len(items) <= PARSE_POOL_THRESHOLD:
+        return batch_fn(items)
+
+    batch_size = max(16, len(items) // (PARSE_WORKERS * 4))
+    batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    return [result for batch in get_process_pool().map(batch_fn, batches) for result in batch]
+
+
+def map_blobs(files, load_sources, batch_fn, cache, key_prefix):
+    """对一组文件按内容计算结果，结果按 blob SHA 缓存
+
+    files 为 [{'path', 'sha'}]，load_sources(paths) 返回 {path: 源码}；
+    batch_fn 接收 [(path, 源码)] 并返回等长的结果列表。
+    只有未命中缓存的文件才会被加载和计算。返回 {path: 结果}。
+    """
+    results = {}
+    missing = []
+    for f in files:
+        cached = cache.get(f"{key_prefix}:{f['sha']}") if f.get('sha') else None
+        if cached is not None:
+            results[f['path']] = cached
+        else:
+            missing.append(f)
+
+    if not missing:
+        return results
+
+    sources = load_sources([f['path'] for f in missing])
+    items = [(f['path'], sources[f['path']]) for f in missing if sources.get(f['path']) is not None]
+    computed = map_batched(batch_fn, items)
+
+    sha_by_path = {f['path']: f.get('sha') for f in missing}
+    for (path, _), value in zip(items, computed):
+        results[path] = value
+        if sha_by_path.get(path):
+            cache.set(f"{key_prefix}:{sha_by_path[path]}", value)
+
+    return results
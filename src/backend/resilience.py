@@ -0,0 +1,219 @@
+"""
+容错模块
+提供随请求传递的截止时间、带抖动的指数退避重试和熔断器，
+使所有外部调用的耗时受请求剩余时间约束，上游异常时快速失败而不是占满工作线程。
+"""
+import asyncio
+import contextvars
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_deadline = contextvars.ContextVar('deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """请求的截止时间已过"""
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，调用被直接拒绝"""
+
+
+def set_deadline(seconds):
+    """设置当前上下文的截止时间（不晚于已有的截止时间），返回用于恢复的令牌"""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    return _deadline.set(deadline)
+
+
+def reset_deadline(token):
+    """恢复 set_deadline 之前的截止时间"""
+    _deadline.reset(token)
+
+
+@contextmanager
+def deadline_scope(seconds):
+    """在代码块内应用截止时间；seconds 为 None 时不做限制"""
+    if seconds is None:
+        yield
+        return
+    token = set_deadline(seconds)
+    try:
+        yield
+    finally:
+        reset_deadline(token)
+
+
+def remaining_time():
+    """返回当前截止时间的剩余秒数，未设置截止时间时返回 None"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def call_timeout(default):
+    """返回单次外部调用应使用的超时时间：default 与剩余时间中的较小者
+
+    截止时间已过时抛出 DeadlineExceeded。
+    """
+    remaining = remaining_time()
+    if remaining is None:
+        return default
+    if remaining <= 0:
+        raise DeadlineExceeded("请求已超过截止时间")
+    return min(default, remaining)
+
+
+def submit_with_context(executor, fn, *args, **kwargs):
+    """向线程池提交任务并携带当前上下文（包括截止时间）"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def retry_call(fn, *args, attempts=3, base_delay=0.2, max_delay=2.0, retryable=None, name=None, **kwargs):
+    """调用 fn，失败且 retryable(异常) 为真时按带完全抖动的指数退避重试
+
+    只应用于幂等操作。重试等待不会超过当前截止时间，剩余时间不足时直接抛出最后一次的异常。
+    """
+    name = name or getattr(fn, '__name__', repr(fn))
+    for attempt in range(attempts):
+        call_timeout(float('inf'))
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == attempts - 1 or (retryable is not None and not retryable(e)):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+            remaining = remaining_time()
+            if remaining is not None and remaining <= delay:
+                raise
+            logger.warning(f"调用 {name} 失败，{delay:.2f} 秒后第 {attempt + 1} 次重试: {str(e)}")
+            time.sleep(delay)
+
+
+async def retry_call_async(fn, *args, attempts=3, base_delay=0.2, max_delay=2.0, retryable=None, name=None, **kwargs):
+    """retry_call 的协程版本，fn 为返回协程的函数"""
+    name = name or getattr(fn, '__name__', repr(fn))
+    for attempt in range(attempts):
+        call_timeout(float('inf'))
+        try:
+            return await fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == attempts - 1 or (retryable is not None and not retryable(e)):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+            remaining = remaining_time()
+            if remaining is not None and remaining <= delay:
+                raise
+            logger.warning(f"调用 {name} 失败，{delay:.2f} 秒后第 {attempt + 1} 次重试: {str(e)}")
+            await asyncio.sleep(delay)
+
+
+class CircuitBreaker:
+    """熔断器
+
+    连续失败达到 failure_threshold 次后打开，在 reset_timeout 秒内直接拒绝调用；
+    之后进入半开状态，只放行一个试探调用，成功则关闭，失败则重新打开。
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        """判断是否允许发起调用"""
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._probing:
+                self._probing = True
+                return True
+            self._rejected += 1
+            return False
+
+    def check(self):
+        """不允许调用时抛出 CircuitOpenError"""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} 暂时不可用（熔断中）")
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probing:
+                    logger.warning(f"{self.name} 连续失败 {self._failures} 次，熔断 {self.reset_timeout} 秒")
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def call(self, fn, *args, is_failure=None, **kwargs):
+        """通过熔断器调用 fn；is_failure(异常) 为假的异常（如 404）不计为上游故障"""
+        self.check()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if is_failure is None or is_failure(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+    async def call_async(self, fn, *args, is_failure=None, **kwargs):
+        """call 的协程版本，fn 为返回协程的函数"""
+        self.check()
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            # 被取消的调用不计入成败，但要让出半开状态下的试探机会
+            with self._lock:
+                self._probing = False
+            raise
+        except Exception as e:
+            if is_failure is None or is_failure(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self._state(),
+                'failures': self._failures,
+                'rejected': self._rejected
+            }
@@ -0,0 +1,127 @@
+"""
+分析阶段调度模块
+按依赖关系组成阶段图，互不依赖的阶段在线程池中并行执行，并支持单阶段超时与降级结果。
+"""
+import contextvars
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from resilience import deadline_scope, submit_with_context
+
+logger = logging.getLogger(__name__)
+
+_incomplete = contextvars.ContextVar('stage_incomplete', default=None)
+
+
+class Stage:
+    """分析流程中的一个阶段
+
+    fn 接收已完成依赖阶段的结果字典并返回本阶段结果；
+    fallback 同样接收依赖结果，在超时或出错时提供降级结果，为 None 时错误会中止整个流程。
+    """
+
+    def __init__(self, name, fn, deps=(), timeout=None, fallback=None):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.timeout = timeout
+        self.fallback = fallback
+
+
+class StageTimeout(Exception):
+    """阶段执行超时"""
+
+
+def mark_incomplete(reason):
+    """标记当前阶段的结果不完整（如部分源码下载失败）：结果照常返回，但按降级处理；不在阶段中执行时忽略"""
+    reasons = _incomplete.get()
+    if reasons is not None:
+        reasons.append(reason)
+
+
+def _run_stage(stage, deps):
+    """执行阶段，返回 (结果, 不完整的原因列表)"""
+    reasons = []
+    token = _incomplete.set(reasons)
+    try:
+        # 阶段内的外部调用受阶段超时约束，超时后尽快失败并释放线程
+        with deadline_scope(stage.timeout):
+            return stage.fn(deps), reasons
+    finally:
+        _incomplete.reset(token)
+
+
+def run_stage_graph(stages, executor, report=None):
+    """执行阶段图，返回 {阶段名: 结果}
+
+    report(stage, status, value) 为可选回调，阶段开始时 status 为 'running'，
+    结束时为 'done'、'timeout' 或 'fallback'（value 为最终结果）；阶段通过 mark_incomplete 标记结果不完整时
+    status 同样为 'fallback'，value 为阶段返回的部分结果。
+    整体耗时取决于最慢的依赖链，而不是所有阶段耗时之和。
+    超时的阶段线程无法被强制终止，其结果会被忽略；阶段内的外部调用在超时后会因截止时间到达而尽快失败。
+    """
+    by_name = {stage.name: stage for stage in stages}
+    results = {}
+    pending = {}  # future -> (stage, deadline)
+    remaining = list(stages)
+
+    def notify(stage, status, value=None):
+        if report:
+            report(stage.name, status, value)
+
+    def finish(stage, value, status='done'):
+        results[stage.name] = value
+        notify(stage, status, value)
+
+    def degrade(stage, reason):
+        if stage.fallback is None:
+            raise reason
+        logger.warning(f"阶段 {stage.name} 使用降级结果: {str(reason) or type(reason).__name__}")
+        deps = {name: results[name] for name in stage.deps}
+        finish(stage, stage.fallback(deps), 'timeout' if isinstance(reason, StageTimeout) else 'fallback')
+
+    def launch_ready():
+        for stage in list(remaining):
+            if all(dep in results for dep in stage.deps):
+                remaining.remove(stage)
+                deps = {name: results[name] for name in stage.deps}
+                deadline = time.monotonic() + stage.timeout if stage.timeout else None
+                notify(stage, 'running')
+                pending[submit_with_context(executor, _run_stage, stage, deps)] = (stage, deadline)
+
+    for stage in stages:
+        missing = [dep for dep in stage.deps if dep not in by_name]
+        if missing:
+            raise ValueError(f"阶段 {stage.name} 依赖未知阶段: {missing}")
+
+    launch_ready()
+    while pending:
+        deadlines = [deadline for _, deadline in pending.values() if deadline is not None]
+        timeout = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+        done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            stage, _ = pending.pop(future)
+            try:
+                value, reasons = future.result()
+                if reasons:
+                    logger.warning(f"阶段 {stage.name} 结果不完整: {'; '.join(reasons)}")
+                finish(stage, value, 'fallback' if reasons else 'done')
+            except Exception as e:
+                logger.error(f"阶段 {stage.name} 执行出错: {str(e)}", exc_info=True)
+                degrade(stage, e)
+
+        now = time.monotonic()
+        for future, (stage, deadline) in list(pending.items()):
+            if deadline is not None and now >= deadline:
+                del pending[future]
+                future.cancel()
+                degrade(stage, StageTimeout(f"阶段 {stage.name} 超过 {stage.timeout} 秒未完成"))
+
+        launch_ready()
+
+    if remaining:
+        raise ValueError(f"阶段图存在循环依赖: {[stage.name for stage in remaining]}")
+
+    return results
@@ -0,0 +1,205 @@
+"""
+运行指标模块
+进程内的计数器与直方图，以 Prometheus 文本格式导出；另外在请求上下文中记录各阶段和外部调用的耗时，
+用于生成 Server-Timing 响应头。记录一次观测只是在锁内更新几个数字，对请求路径的开销可以忽略。
+"""
+import bisect
+import contextvars
+import math
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)  # 耗时直方图的桶（秒）
+SIZE_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000)  # 文件数等规模直方图的桶
+
+_timings = contextvars.ContextVar('server_timings', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """只增不减的计数器，labelnames 为标签名，inc 时以关键字参数给出标签值"""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, list(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Histogram(Counter):
+    """直方图，按桶统计观测值的分布，并记录总和与次数"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        samples = []
+        for key, (counts, total, count) in items:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", labels + [('le', _format_value(bound))], cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class Registry:
+    """指标注册表
+
+    除了注册的计数器和直方图，还可以添加采集函数：collector() 在导出时调用，
+    返回 [(名称, 类型, 说明, [(标签字典, 值)])]，用于缓存大小等由其他组件维护的数值。
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self):
+        """导出为 Prometheus 文本格式"""
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+
+        families = [(m.name, m.type, m.documentation, m.samples()) for m in metrics]
+        for collector in collectors:
+            for name, metric_type, documentation, values in collector():
+                families.append((name, metric_type, documentation,
+                                 [(name, sorted(labels.items()), value) for labels, value in values]))
+
+        lines = []
+        for name, metric_type, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+# 进程内共享的注册表
+REGISTRY = Registry()
+
+UPSTREAM_REQUESTS = REGISTRY.counter(
+    'repo_analyzer_upstream_requests_total', '对外部服务的请求数', ('service', 'status'))
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    'repo_analyzer_upstream_request_seconds', '对外部服务的请求耗时（秒）', ('service',))
+
+
+def start_server_timing():
+    """开始记录当前请求的耗时条目，返回用于恢复的令牌"""
+    return _timings.set([])
+
+
+def reset_server_timing(token):
+    _timings.reset(token)
+
+
+def record_timing(name, seconds):
+    """在当前请求中记录一条耗时；不在请求上下文中（如后台任务）时忽略
+
+    线程池中的任务通过 submit_with_context 继承请求上下文，记录到同一个列表中。
+    """
+    timings = _timings.get()
+    if timings is not None:
+        # 调用方在操作结束时记录，以当前时刻作为结束时间，用于合并并发调用时计算实际跨度
+        timings.append((name, seconds, time.perf_counter()))
+
+
+def server_timing_header(total=None):
+    """生成 Server-Timing 响应头；没有条目时返回 None
+
+    同名条目合并为一条：并发调用的耗时相加会超过实际经过的时间，因此 dur 为从最早开始到最晚结束的跨度，
+    desc 注明次数和各次耗时之和。
+    """
+    timings = _timings.get() or []
+    merged = {}
+    for name, seconds, end in list(timings):
+        start = end - seconds
+        if name in merged:
+            first, last, busy, count = merged[name]
+            merged[name] = (min(first, start), max(last, end), busy + seconds, count + 1)
+        else:
+            merged[name] = (start, end, seconds, 1)
+    entries = []
+    for name, (first, last, busy, count) in merged.items():
+        entry = f'{name};dur={(last - first) * 1000:.1f}'
+        if count > 1:
+            entry += f';desc="{count}x, sum {busy * 1000:.1f}ms"'
+        entries.append(entry)
+    if total is not None:
+        entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries) or None
+
+
+def observe_upstream(service, status, started):
+    """记录一次外部服务调用：started 为 time.perf_counter() 的起始值，status 为状态码或错误类型"""
+    elapsed = time.perf_counter() - started
+    UPSTREAM_REQUESTS.inc(service=service, status=status)
+    UPSTREAM_SECONDS.observe(elapsed, service=service)
+    record_timing(service, elapsed)
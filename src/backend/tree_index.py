@@ -0,0 +1,90 @@
+"""
+目录索引模块
+按目录逐层加载仓库文件树，每次只获取被请求目录的直接子项：
+GitHub 仓库通过非递归的 Git Trees API 按子树 SHA 获取，本地仓库通过 `git ls-tree` 或 os.scandir 获取。
+索引固定在某个提交上，已加载的目录在有界的 LRU 缓存中复用，供前端展开目录时分页读取。
+"""
+import logging
+from urllib.parse import quote
+
+from caching import MemoryCache
+
+logger = logging.getLogger(__name__)
+
+
+class TreePathNotFound(Exception):
+    """请求的目录在该提交中不存在"""
+
+
+def _sort_key(child):
+    # 目录在前，同类按名称排序
+    return (child['type'] != 'dir', child['name'])
+
+
+class TreeIndex:
+    """固定在某个提交上的目录索引
+
+    loader(path, tree_sha) 返回目录 path 的直接子项列表，每项包含 path（名称）、type（'blob'/'tree'/'commit'）、
+    sha、size；tree_sha 为该目录的子树 SHA（根目录为 None），由上级目录的列表得到。
+    html_url 为 None 时（如本地仓库）子项不带链接。
+    """
+
+    def __init__(self, loader, html_url=None, ref=None, max_dirs=4096, ttl=3600):
+        self.loader = loader
+        self.html_url = html_url
+        self.ref = ref
+        self._dirs = MemoryCache(max_entries=max_dirs, default_ttl=ttl)
+
+    def _child(self, path, entry):
+        name = entry['path']
+        child_path = f"{path}/{name}" if path else name
+        if entry['type'] == 'tree':
+            return {
+                'name': name,
+                'path': child_path,
+                'type': 'dir',
+                'sha': entry.get('sha'),
+                'url': f"{self.html_url}/tree/{self.ref}/{quote(child_path)}" if self.html_url else None
+            }
+        return {
+            'name': name,
+            'path': child_path,
+            'type': 'file',
+            'sha': entry.get('sha'),
+            'size': entry.get('size'),
+            'url': f"{self.html_url}/blob/{self.ref}/{quote(child_path)}" if self.html_url else None
+        }
+
+    def list_dir(self, path):
+        """返回目录的全部直接子项（目录在前，按名称排序）；目录不存在时抛出 TreePathNotFound"""
+        children = self._dirs.get(path)
+        if children is not None:
+            return children
+
+        tree_sha = None
+        if path:
+            # 子树 SHA 来自上级目录的列表，上级目录同样按需加载并缓存
+            parent_path, _, name = path.rpartition('/')
+            entry = next((c for c in self.list_dir(parent_path) if c['name'] == name), None)
+            if entry is None or entry['type'] != 'dir':
+                raise TreePathNotFound(f"目录 '{path}' 不存在")
+            tree_sha = entry['sha']
+
+        # 子模块（commit）等条目不展开
+        children = sorted(
+            (self._child(path, entry) for entry in self.loader(path, tree_sha) if entry['type'] in ('tree', 'blob')),
+            key=_sort_key
+        )
+        self._dirs.set(path, children)
+        return children
+
+    def page(self, path, offset, limit):
+        """分页返回目录的直接子项，nextCursor 为下一页的起始位置，没有更多子项时为 None"""
+        children = self.list_dir(path)
+        end = offset + limit
+        return {
+            'path': path,
+            'entries': children[offset:end],
+            'total': len(children),
+            'nextCursor': str(end) if end < len(children) else None
+        }
@@ -0,0 +1,205 @@
+"""
+仓库文件树获取模块
+基于 Git Trees API 一次性获取整棵文件树，并在单次遍历中构建前端所需的 root/children 结构。
+有上一次分析的文件树时，可以只逐层获取 tree SHA 发生变化的子树。
+"""
+import asyncio
+import logging
+from urllib.parse import quote
+
+from async_runtime import run_async
+from github_client import get_git_tree, get_git_tree_async
+
+logger = logging.getLogger(__name__)
+
+
+def build_file_tree(entries, root_name, html_url, ref, max_files):
+    """根据扁平的路径列表构建嵌套文件树
+
+    entries 为按路径排序的字典序列，每项包含 path、type（'blob' 或 'tree'）、sha、size。
+    html_url 为 None 时（如本地仓库）节点不带链接。
+    返回 (root, truncated)，truncated 表示是否因文件数限制而截断。
+    """
+    root = {
+        'name': root_name,
+        'type': 'dir',
+        'path': '',
+        'url': html_url,
+        'children': []
+    }
+    dir_index = {'': root}
+    file_count = 0
+    truncated = False
+
+    def ensure_dir(path):
+        # 树条目通常先列出目录再列出其内容，这里兜底处理缺失的中间目录
+        node = dir_index.get(path)
+        if node is not None:
+            return node
+        parent_path, _, name = path.rpartition('/')
+        parent = ensure_dir(parent_path)
+        node = {
+            'name': name,
+            'path': path,
+            'type': 'dir',
+            'url': f"{html_url}/tree/{ref}/{quote(path)}" if html_url else None,
+            'children': []
+        }
+        parent['children'].append(node)
+        dir_index[path] = node
+        return node
+
+    for entry in entries:
+        entry_type = entry['type']
+        path = entry['path']
+
+        if entry_type == 'tree':
+            # 目录节点记录 tree SHA，增量分析据此跳过未变化的子树
+            ensure_dir(path)['sha'] = entry.get('sha')
+            continue
+        if entry_type != 'blob':
+            # 子模块（commit）等条目不展开
+            continue
+
+        if file_count >= max_files:
+            truncated = True
+            break
+
+        parent_path, _, name = path.rpartition('/')
+        parent = ensure_dir(parent_path)
+        parent['children'].append({
+            'name': name,
+            'path': path,
+            'type': 'file',
+            'url': f"{html_url}/blob/{ref}/{quote(path)}" if html_url else None,
+            'sha': entry.get('sha'),
+            'size': entry.get('size'),
+            'children': []
+        })
+        file_count += 1
+
+    return root, truncated
+
+
+def _element_to_entry(element, prefix=''):
+    """将 Git Trees API 返回的树条目转换为字典条目"""
+    return {
+        'path': f"{prefix}{element['path']}",
+        'type': element['type'],
+        'sha': element['sha'],
+        'size': element.get('size')
+    }
+
+
+def iter_tree_entries(owner, repo_name, tree_sha, prefix=''):
+    """获取某个 tree 下的全部条目
+
+    优先使用递归 Git Trees API（一次请求）；当 GitHub 返回 truncated 时，
+    退化为逐层获取子树，并对每个子树再次尝试递归请求。
+    """
+    tree = get_git_tree(owner, repo_name, tree_sha, recursive=True)
+    if not tree.get('truncated'):
+        for element in tree['tree']:
+            yield _element_to_entry(element, prefix)
+        return
+
+    logger.info(f"树 {prefix or '/'} 的递归结果被截断，改为逐层获取")
+    shallow = get_git_tree(owner, repo_name, tree_sha, recursive=False)
+    for element in shallow['tree']:
+        entry = _element_to_entry(element, prefix)
+        yield entry
+        if element['type'] == 'tree':
+            yield from iter_tree_entries(owner, repo_name, element['sha'], f"{entry['path']}/")
+
+
+class TreeBudgetExceeded(Exception):
+    """增量获取文件树需要的请求数超过上限"""
+
+
+def iter_node_entries(node):
+    """按递归 Git Trees API 的顺序（先序）列出已构建的文件树中某个目录下的全部条目"""
+    stack = list(reversed(node.get('children', [])))
+    while stack:
+        child = stack.pop()
+        if child['type'] == 'dir':
+            yield {'path': child['path'], 'type': 'tree', 'sha': child.get('sha'), 'size': None}
+            stack.extend(reversed(child.get('children', [])))
+        else:
+            yield {'path': child['path'], 'type': 'blob', 'sha': child.get('sha'), 'size': child.get('size')}
+
+
+async def fetch_changed_entries_async(owner, repo_name, ref, previous, max_requests):
+    """对照上一次的文件树获取 ref 下的全部条目，tree SHA 未变化的子树直接沿用 previous 中的条目
+
+    发生变化的目录逐层展开，同一层的子树并发获取，新出现的目录用一次递归请求获取，
+    请求数与变化的目录数成正比。请求数超过 max_requests 或 GitHub 返回截断的结果时抛出 TreeBudgetExceeded。
+    """
+    budget = [max_requests]
+
+    async def get_tree(sha, recursive):
+        if budget[0] <= 0:
+            raise TreeBudgetExceeded(f"变化的目录过多，超过 {max_requests} 次请求")
+        budget[0] -= 1
+        tree = await get_git_tree_async(owner, repo_name, sha, recursive)
+        if tree.get('truncated'):
+            raise TreeBudgetExceeded(f"树 {sha} 的结果被截断")
+        return tree['tree']
+
+    async def expand(sha, prefix, old_node):
+        elements = await get_tree(sha, recursive=old_node is None)
+        if old_node is None:
+            return [_element_to_entry(element, prefix) for element in elements]
+
+        old_children = {child['name']: child for child in old_node.get('children', [])}
+        parts = []
+        pending = []
+        for element in elements:
+            entry = _element_to_entry(element, prefix)
+            parts.append([entry])
+            if element['type'] != 'tree':
+                continue
+            old = old_children.get(element['path'])
+            if old is not None and old['type'] != 'dir':
+                old = None
+            if old is not None and old.get('sha') == element['sha']:
+                parts.append(list(iter_node_entries(old)))
+            else:
+                pending.append((len(parts), expand(element['sha'], f"{entry['path']}/", old)))
+                parts.append(None)
+
+        for (index, _), entries in zip(pending, await asyncio.gather(*(coro for _, coro in pending))):
+            parts[index] = entries
+        return [entry for part in parts for entry in part]
+
+    return await expand(ref, '', previous)
+
+
+def list_tree_level(owner, repo_name, tree_sha):
+    """获取一个 tree 的直接子项（非递归），条目的 path 为名称"""
+    tree = get_git_tree(owner, repo_name, tree_sha, recursive=False)
+    if tree.get('truncated'):
+        logger.warning(f"仓库 {owner}/{repo_name} 的树 {tree_sha} 子项过多，GitHub 返回的结果已截断")
+    return [_element_to_entry(element) for element in tree['tree']]
+
+
+def fetch_repo_tree(repo, ref, max_files, previous=None, max_requests=0):
+    """获取仓库在指定引用（分支或提交）下的完整文件树，repo 为仓库元数据
+
+    previous 为上一次分析得到的（未截断的）文件树时，只获取 tree SHA 变化的子树，
+    变化过多需要超过 max_requests 次请求时改为一次递归请求获取完整文件树。
+    """
+    owner = repo['owner']['login']
+    entries = None
+    if previous is not None and max_requests > 0:
+        try:
+            entries = run_async(fetch_changed_entries_async(owner, repo['name'], ref, previous, max_requests))
+        except TreeBudgetExceeded as e:
+            logger.info(f"仓库 {repo['full_name']} 无法增量获取文件树（{str(e)}），改为完整获取")
+    if entries is None:
+        # Git Trees API 接受分支名或提交SHA作为 tree_sha，无需额外查询提交
+        entries = iter_tree_entries(owner, repo['name'], ref)
+    root, truncated = build_file_tree(entries, repo['name'], repo['html_url'], ref, max_files)
+    if truncated:
+        logger.warning(f"仓库 {repo['full_name']} 文件数超过限制 {max_files}，结果已截断")
+        root['truncated'] = True
+    return root
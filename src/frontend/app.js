@@ -13,24 +13,34 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // 绑定按钮点击事件
     document.getElementById('analyzeBtn').addEventListener('click', analyzeRepository);
+
+    // 文件树中"解释代码"按钮的点击事件（懒加载的子项同样适用）
+    document.getElementById('fileStructure').addEventListener('click', (event) => {
+        if (event.target.classList.contains('btn-explain')) {
+            handleExplainClick(event.target.dataset.path, event.target.dataset.sha);
+        }
+    });
 });
 
 let currentRepoUrl = '';
 const converter = new showdown.Converter();
 
+// 请求列式的紧凑格式，文件树和依赖图由 D3Visualizations 中的解码器还原
+const COMPACT_ACCEPT = 'application/vnd.repo-analyzer.compact+json, application/json;q=0.9';
+
 // 分析仓库
 async function analyzeRepository() {
     const repoUrl = document.getElementById('repoUrl').value.trim();
     
     if (!repoUrl) {
-        showError('请输入GitHub仓库URL');
+        showError('请输入GitHub仓库URL或本地路径');
         return;
     }
     
     currentRepoUrl = repoUrl;
     
-    if (!isValidGithubUrl(repoUrl)) {
-        showError('请输入有效的GitHub仓库URL');
+    if (!isLocalPath(repoUrl) && !isValidGithubUrl(repoUrl)) {
+        showError('请输入有效的GitHub仓库URL或本地路径');
         return;
     }
     
@@ -40,23 +50,38 @@ async function analyzeRepository() {
     hideResults();
     
     try {
-        // 发送请求到后端
-        const response = await fetch('/analyze', {
+        // 文件树通过 /api/tree 按需加载，与分析任务同时进行
+        const lazyTree = displayLazyFileStructure(repoUrl);
+        
+        // 提交分析任务，后端立即返回任务ID
+        const response = await fetch('/api/jobs', {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'Accept': COMPACT_ACCEPT
             },
-            body: JSON.stringify({ url: repoUrl })
+            body: JSON.stringify({
+                ...repoTarget(repoUrl),
+                useAi: document.getElementById('useAi').checked
+            })
         });
         
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
         
-        const data = await response.json();
+        const job = await response.json();
         
-        // 处理响应数据
-        displayResults(data);
+        // 各阶段完成后立即渲染对应部分，无需等待最慢的阶段（如AI生成图表）
+        const rendered = new Set();
+        if (await lazyTree) {
+            // 已按需加载文件树，不再下载分析结果中的完整文件树
+            rendered.add('fileStructure');
+        }
+        const data = await waitForJob(job, rendered, partial => displayResults(partial, rendered));
+        
+        // 渲染剩余部分
+        displayResults(data, rendered);
     } catch (error) {
         console.error('Error:', error);
         showError(`分析失败: ${error.message}`);
@@ -65,25 +90,82 @@ async function analyzeRepository() {
     }
 }
 
-// 显示分析结果
-function displayResults(data) {
-    // 显示结果区域
-    showResults();
-    
-    // 显示仓库基本信息
-    displayRepoInfo(data.repoInfo);
+// 分析阶段名称
+const STAGE_LABELS = {
+    repoInfo: '仓库信息',
+    fileStructure: '文件结构',
+    dependencyData: '依赖关系',
+    codeQuality: '代码质量',
+    mermaidChart: '项目结构图',
+    graphLayout: '依赖图布局'
+};
+
+// 轮询分析任务，返回最终结果；任务进行中时通过 onPartial 回调已完成阶段的结果
+async function waitForJob(job, rendered, onPartial) {
+    let delay = 500;
     
-    // 显示文件结构
-    displayFileStructure(data.fileStructure);
+    while (job.status !== 'done') {
+        if (job.status === 'error') {
+            throw new Error(job.error || '分析任务失败');
+        }
+        
+        if (job.partial) {
+            onPartial(job.partial);
+        }
+        
+        updateLoadingProgress(job.stages);
+        await new Promise(resolve => setTimeout(resolve, delay));
+        delay = Math.min(delay * 1.5, 2000);
+        
+        // 已渲染的阶段不再重复下载
+        const skip = encodeURIComponent([...rendered].join(','));
+        const response = await fetch(`/api/jobs/${job.jobId}?skip=${skip}`, {
+            headers: { 'Accept': COMPACT_ACCEPT }
+        });
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        job = await response.json();
+    }
     
-    // 显示Mermaid图表
-    displayMermaidChart(data.mermaidChart);
+    return job.result;
+}
+
+// 更新加载提示中的阶段进度
+function updateLoadingProgress(stages) {
+    const finished = Object.values(stages).filter(status => status !== 'pending' && status !== 'running').length;
+    const running = Object.keys(stages).find(stage => stages[stage] === 'running');
+    const total = Object.keys(stages).length;
     
-    // 显示D3.js依赖关系图
-    displayDependencyGraph(data.dependencyData);
+    let text = `正在分析仓库，请稍候... (${finished}/${total})`;
+    if (running) {
+        text += ` 正在处理: ${STAGE_LABELS[running] || running}`;
+    }
+    document.getElementById('loadingText').textContent = text;
+}
+
+// 各阶段结果对应的渲染函数，按渲染顺序排列
+const STAGE_RENDERERS = {
+    repoInfo: repoInfo => displayRepoInfo(repoInfo),
+    fileStructure: fileStructure => displayFileStructure(window.D3Visualizations.decodeFileStructure(fileStructure)),
+    mermaidChart: mermaidChart => displayMermaidChart(mermaidChart),
+    // 依赖数据先暂存，布局阶段完成后再决定使用浏览器实时布局还是服务端布局的聚合视图
+    dependencyData: dependencyData => { pendingDependencyData = dependencyData; },
+    graphLayout: graphLayout => displayDependencyGraph(pendingDependencyData, graphLayout),
+    codeQuality: codeQuality => displayCodeQualityAnalysis(codeQuality)
+};
+
+// 显示分析结果，rendered 记录已渲染的部分，避免重复渲染
+function displayResults(data, rendered = new Set()) {
+    // 显示结果区域
+    showResults();
     
-    // 显示代码质量分析
-    displayCodeQualityAnalysis(data.codeQuality);
+    Object.keys(STAGE_RENDERERS).forEach(stage => {
+        if (data[stage] !== undefined && !rendered.has(stage)) {
+            rendered.add(stage);
+            STAGE_RENDERERS[stage](data[stage]);
+        }
+    });
 }
 
 // 显示仓库基本信息
@@ -97,17 +179,50 @@ function displayRepoInfo(repoInfo) {
     document.getElementById('repoUpdated').textContent = formatDate(repoInfo.updated_at);
 }
 
-// 显示文件结构
+// 创建文件树中的一项，目录链接的点击行为由调用方绑定
+function createTreeItem(child) {
+    const li = document.createElement('li');
+    
+    // 创建链接
+    const a = document.createElement('a');
+    a.href = child.url || '#';
+    a.target = '_blank';
+    
+    // 添加图标
+    const icon = document.createElement('span');
+    icon.className = 'file-icon';
+    
+    if (child.type === 'dir') {
+        icon.textContent = '📁 ';
+        a.className = 'dir';
+    } else {
+        icon.textContent = '📄 ';
+        a.className = 'file';
+    }
+    
+    a.prepend(icon);
+    a.appendChild(document.createTextNode(child.name));
+    
+    li.appendChild(a);
+
+    if (child.type === 'file') {
+        const explainBtn = document.createElement('button');
+        explainBtn.textContent = '解释代码';
+        explainBtn.className = 'btn btn-outline-info btn-sm btn-explain';
+        explainBtn.dataset.path = child.path;
+        if (child.sha) {
+            explainBtn.dataset.sha = child.sha;
+        }
+        li.appendChild(explainBtn);
+    }
+    
+    return li;
+}
+
+// 显示文件结构（分析结果中的完整文件树，懒加载不可用时使用）
 function displayFileStructure(fileStructure) {
     const fileStructureElement = document.getElementById('fileStructure');
     fileStructureElement.innerHTML = '';
-    
-    fileStructureElement.addEventListener('click', (event) => {
-        if (event.target.classList.contains('btn-explain')) {
-            const filePath = event.target.dataset.path;
-            handleExplainClick(filePath);
-        }
-    });
 
     // 递归创建文件树
     function createTree(node, parentElement) {
@@ -115,41 +230,14 @@ function displayFileStructure(fileStructure) {
         parentElement.appendChild(ul);
         
         node.children.forEach(child => {
-            const li = document.createElement('li');
+            const li = createTreeItem(child);
             ul.appendChild(li);
             
-            // 创建链接
-            const a = document.createElement('a');
-            a.href = child.url || '#';
-            a.target = '_blank';
-            
-            // 添加图标
-            const icon = document.createElement('span');
-            icon.className = 'file-icon';
-            
             if (child.type === 'dir') {
-                icon.textContent = '📁 ';
-                a.className = 'dir';
-                a.addEventListener('click', function(e) {
+                li.firstChild.addEventListener('click', function(e) {
                     e.preventDefault();
                     this.parentElement.classList.toggle('expanded');
                 });
-            } else {
-                icon.textContent = '📄 ';
-                a.className = 'file';
-            }
-            
-            a.prepend(icon);
-            a.appendChild(document.createTextNode(child.name));
-            
-            li.appendChild(a);
-
-            if (child.type === 'file') {
-                const explainBtn = document.createElement('button');
-                explainBtn.textContent = '解释代码';
-                explainBtn.className = 'btn btn-outline-info btn-sm btn-explain';
-                explainBtn.dataset.path = child.path;
-                li.appendChild(explainBtn);
             }
             
             // 如果有子节点，递归创建子树
@@ -162,6 +250,107 @@ function displayFileStructure(fileStructure) {
     createTree(fileStructure, fileStructureElement);
 }
 
+// 懒加载文件树使用的仓库参数，以及首次请求后固定的提交
+let treeRepo = '';
+let treeCommit = null;
+
+// 懒加载文件树：只请求根目录的第一页，展开目录时才加载其子项；返回是否成功
+async function displayLazyFileStructure(repoInput) {
+    treeRepo = repoTarget(repoInput).path || repoInput;
+    treeCommit = null;
+    
+    const fileStructureElement = document.getElementById('fileStructure');
+    fileStructureElement.innerHTML = '';
+    const ul = document.createElement('ul');
+    
+    try {
+        await loadTreePage('', ul, null);
+    } catch (error) {
+        console.warn('按需加载文件树失败，改用分析结果中的完整文件树:', error);
+        return false;
+    }
+    
+    fileStructureElement.appendChild(ul);
+    showResults();
+    return true;
+}
+
+// 加载目录的一页子项并追加到列表中，还有更多子项时在末尾添加"加载更多"按钮
+async function loadTreePage(path, ul, cursor) {
+    const params = new URLSearchParams({ repo: treeRepo, path: path });
+    if (cursor) {
+        params.set('cursor', cursor);
+    }
+    if (treeCommit) {
+        // 翻页和展开固定在首次请求时的提交上
+        params.set('ref', treeCommit);
+    }
+    
+    const response = await fetch(`/api/tree?${params}`);
+    if (!response.ok) {
+        const errorData = await response.json().catch(() => ({}));
+        throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
+    }
+    const page = await response.json();
+    treeCommit = page.commit || treeCommit;
+    
+    page.entries.forEach(child => {
+        const li = createTreeItem(child);
+        if (child.type === 'dir') {
+            li.firstChild.addEventListener('click', e => {
+                e.preventDefault();
+                toggleLazyDir(li, child.path);
+            });
+        }
+        ul.appendChild(li);
+    });
+    
+    if (page.nextCursor) {
+        const more = document.createElement('li');
+        const moreBtn = document.createElement('button');
+        moreBtn.className = 'btn btn-link btn-sm p-0';
+        moreBtn.textContent = `加载更多（剩余 ${page.total - Number(page.nextCursor)} 项）`;
+        moreBtn.addEventListener('click', async () => {
+            more.remove();
+            try {
+                await loadTreePage(path, ul, page.nextCursor);
+            } catch (error) {
+                ul.appendChild(more);
+                showError(`加载目录失败: ${error.message}`);
+            }
+        });
+        more.appendChild(moreBtn);
+        ul.appendChild(more);
+    }
+}
+
+// 展开或折叠目录：展开时请求子项，折叠时移除子树，页面中只保留展开部分的节点
+async function toggleLazyDir(li, path) {
+    if (li.dataset.state === 'loading') {
+        return;
+    }
+    
+    if (li.dataset.state === 'loaded') {
+        li.querySelector(':scope > ul').remove();
+        delete li.dataset.state;
+        li.classList.remove('expanded');
+        return;
+    }
+    
+    li.dataset.state = 'loading';
+    const ul = document.createElement('ul');
+    try {
+        await loadTreePage(path, ul, null);
+    } catch (error) {
+        delete li.dataset.state;
+        showError(`加载目录失败: ${error.message}`);
+        return;
+    }
+    li.appendChild(ul);
+    li.dataset.state = 'loaded';
+    li.classList.add('expanded');
+}
+
 // 显示Mermaid图表
 function displayMermaidChart(mermaidCode) {
     const mermaidContainer = document.getElementById('mermaidChart');
@@ -171,10 +360,39 @@ function displayMermaidChart(mermaidCode) {
     mermaid.init(undefined, document.querySelectorAll('.mermaid'));
 }
 
+// 等待布局阶段的依赖数据
+let pendingDependencyData = null;
+
 // 显示D3.js依赖关系图
-function displayDependencyGraph(dependencyData) {
-    // 使用D3Visualizations模块初始化依赖关系图
-    window.D3Visualizations.initDependencyVisualization(dependencyData);
+function displayDependencyGraph(dependencyData, graphLayout) {
+    if (graphLayout) {
+        // 大型依赖图：使用服务端计算的坐标，按缩放级别加载目录聚合视图
+        const repo = repoTarget(currentRepoUrl).path || currentRepoUrl;
+        window.D3Visualizations.initDependencyVisualization(
+            null, params => fetchGraphLevel(repo, graphLayout.ref, params));
+    } else if (dependencyData) {
+        // 使用D3Visualizations模块初始化依赖关系图
+        window.D3Visualizations.initDependencyVisualization(dependencyData);
+    }
+    pendingDependencyData = null;
+}
+
+// 获取依赖图在某个目录深度、某个可见区域内的聚合视图
+async function fetchGraphLevel(repo, ref, { depth, bbox }) {
+    const params = new URLSearchParams({ repo: repo, ref: ref });
+    if (depth !== undefined && depth !== null) {
+        params.set('depth', depth);
+    }
+    if (bbox) {
+        params.set('bbox', bbox.map(value => value.toFixed(1)).join(','));
+    }
+    
+    const response = await fetch(`/api/graph?${params}`);
+    const data = await response.json();
+    if (!response.ok) {
+        throw new Error(data.error || `HTTP error! status: ${response.status}`);
+    }
+    return data;
 }
 
 // 显示代码质量分析
@@ -203,8 +421,22 @@ function isValidGithubUrl(url) {
     return /^https?:\/\/(www\.)?github\.com\/[\w.-]+\/[\w.-]+\/?.*$/.test(url);
 }
 
+// 判断输入是否为服务器上的本地仓库路径（绝对路径或 file:// URL）
+function isLocalPath(input) {
+    return /^(\/|~\/|[A-Za-z]:[\\/]|file:\/\/)/.test(input);
+}
+
+// 构造分析请求中的仓库参数
+function repoTarget(input) {
+    if (isLocalPath(input)) {
+        return { path: input.replace(/^file:\/\//, '') };
+    }
+    return { url: input };
+}
+
 // 显示加载中
 function showLoading() {
+    document.getElementById('loadingText').textContent = '正在分析仓库，请稍候...';
     document.getElementById('loading').classList.remove('d-none');
 }
 
@@ -235,7 +467,10 @@ function hideResults() {
     document.getElementById('results').classList.add('d-none');
 }
 
-async function handleExplainClick(filePath) {
+// 当前进行中的代码解释请求，用于在关闭窗口或切换文件时取消
+let explainController = null;
+
+async function handleExplainClick(filePath, blobSha) {
     if (!currentRepoUrl) {
         alert('无法获取仓库URL，请先分析一个仓库。');
         return;
@@ -246,11 +481,22 @@ async function handleExplainClick(filePath) {
     const loadingEl = document.getElementById('explanationLoading');
     const contentEl = document.getElementById('explanationContent');
     const errorEl = document.getElementById('explanationError');
+    const loadingTextEl = document.getElementById('explanationLoadingText');
+
+    // 取消上一次未完成的请求，关闭窗口时同样取消，后端会随之停止生成
+    if (explainController) {
+        explainController.abort();
+    }
+    const controller = new AbortController();
+    explainController = controller;
+    modalEl.addEventListener('hidden.bs.modal', () => controller.abort(), { once: true });
 
     // Show modal in loading state
     modal.show();
     loadingEl.classList.remove('d-none');
+    loadingTextEl.textContent = '正在生成代码解释，请稍候...';
     contentEl.classList.add('d-none');
+    contentEl.innerHTML = '';
     errorEl.classList.add('d-none');
     document.getElementById('explanationModalLabel').textContent = `代码解释: ${filePath}`;
 
@@ -261,9 +507,14 @@ async function handleExplainClick(filePath) {
                 'Content-Type': 'application/json',
             },
             body: JSON.stringify({
-                repo_url: currentRepoUrl,
-                file_path: filePath
-            })
+                ...(isLocalPath(currentRepoUrl)
+                    ? { repo_path: repoTarget(currentRepoUrl).path }
+                    : { repo_url: currentRepoUrl }),
+                file_path: filePath,
+                sha: blobSha, // 用于命中服务端的解释缓存
+                stream: true
+            }),
+            signal: controller.signal
         });
 
         if (!response.ok) {
@@ -271,15 +522,82 @@ async function handleExplainClick(filePath) {
             throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
         }
 
-        const data = await response.json();
-        
-        contentEl.innerHTML = converter.makeHtml(data.explanation);
-        
+        // 逐行读取 NDJSON，收到内容后立即增量渲染
+        let explanation = '';
+        let renderPending = false;
+        const render = () => {
+            renderPending = false;
+            contentEl.innerHTML = converter.makeHtml(explanation);
+        };
+
+        await readNdjson(response, message => {
+            if (message.error) {
+                throw new Error(message.error);
+            }
+            if (message.progress) {
+                // 大文件分段解释时的进度提示
+                loadingTextEl.textContent = message.progress;
+            }
+            if (message.delta) {
+                if (!explanation) {
+                    loadingEl.classList.add('d-none');
+                    contentEl.classList.remove('d-none');
+                }
+                explanation += message.delta;
+                // 每帧最多渲染一次，避免频繁解析Markdown
+                if (!renderPending) {
+                    renderPending = true;
+                    requestAnimationFrame(render);
+                }
+            }
+        });
+
+        render();
         contentEl.classList.remove('d-none');
     } catch (error) {
+        if (error.name === 'AbortError') {
+            return;
+        }
         errorEl.textContent = `生成解释失败: ${error.message}`;
         errorEl.classList.remove('d-none');
     } finally {
         loadingEl.classList.add('d-none');
+        if (explainController === controller) {
+            explainController = null;
+        }
+    }
+}
+
+// 读取 NDJSON 响应流，每解析出一行调用一次 onMessage
+async function readNdjson(response, onMessage) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    try {
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+
+            let newline;
+            while ((newline = buffer.indexOf('\n')) >= 0) {
+                const line = buffer.slice(0, newline).trim();
+                buffer = buffer.slice(newline + 1);
+                if (line) {
+                    onMessage(JSON.parse(line));
+                }
+            }
+        }
+    } finally {
+        // 提前退出（出错或中止）时释放连接
+        reader.cancel().catch(() => {});
+    }
+
+    buffer += decoder.decode();
+    if (buffer.trim()) {
+        onMessage(JSON.parse(buffer));
     }
 }
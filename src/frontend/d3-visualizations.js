@@ -9,6 +9,18 @@
 // 全局变量
 let dependencyData = null;
 let currentVisualization = null;
+let levelLoader = null;     // 大型依赖图的聚合视图加载函数，为 null 时使用浏览器实时布局
+let lodGeneration = 0;      // 每次清除可视化时递增，已清除的聚合视图忽略迟到的响应
+let buttonsBound = false;
+
+// 支持解码的列式数据格式版本
+const COLUMNAR_VERSION = 1;
+
+// 节点数超过该值时改用 Canvas 绘制，不再为每个节点和连接创建 SVG 元素
+const CANVAS_NODE_THRESHOLD = 2000;
+
+// Canvas 视图中可见节点不超过该数量时才绘制文字标签
+const CANVAS_LABEL_LIMIT = 500;
 
 // 工具提示
 const tooltip = d3.select("body")
@@ -18,35 +30,188 @@ const tooltip = d3.select("body")
 
 /**
  * 初始化依赖关系可视化
- * @param {Object} data - 项目依赖数据
+ * 大型依赖图不下发完整数据，而是传入 loadLevel：节点坐标由服务端计算，按缩放级别加载目录聚合视图
+ * @param {Object} data - 项目依赖数据，使用 loadLevel 时为 null
+ * @param {Function} loadLevel - 可选，loadLevel({depth, bbox}) 返回聚合视图的 Promise
  */
-function initDependencyVisualization(data) {
-    dependencyData = data;
+function initDependencyVisualization(data, loadLevel = null) {
+    dependencyData = data ? decodeDependencyData(data) : null;
+    levelLoader = loadLevel;
     
     // 默认显示力导向图
-    createForceDirectedGraph(data);
+    clearVisualization();
+    showGraphView();
+    
+    // 设置按钮事件监听（只绑定一次，重新分析时沿用）
+    if (buttonsBound) {
+        return;
+    }
+    buttonsBound = true;
     
-    // 设置按钮事件监听
     document.getElementById('forceLayoutBtn').addEventListener('click', () => {
         clearVisualization();
-        createForceDirectedGraph(dependencyData);
+        showGraphView();
     });
     
+    // 聚合视图下，层次结构图和圆形打包图展示当前加载的层级
     document.getElementById('hierarchicalBtn').addEventListener('click', () => {
+        if (!dependencyData) {
+            return;
+        }
         clearVisualization();
         createHierarchicalTree(dependencyData);
     });
     
     document.getElementById('circlePackingBtn').addEventListener('click', () => {
+        if (!dependencyData) {
+            return;
+        }
         clearVisualization();
         createCirclePacking(dependencyData);
     });
 }
 
+/**
+ * 显示依赖关系网络图：大型依赖图使用聚合视图，其余使用力导向图
+ */
+function showGraphView() {
+    if (levelLoader) {
+        createLevelOfDetailGraph(levelLoader);
+    } else if (dependencyData) {
+        createForceDirectedGraph(dependencyData);
+    }
+}
+
+/**
+ * 与服务端 urllib.parse.quote 一致地编码路径（保留 /，并转义 encodeURIComponent 不转义的 !'()*）
+ * @param {string} path - 文件路径
+ * @returns {string} 编码后的路径
+ */
+function quotePath(path) {
+    return path.split('/')
+        .map(segment => encodeURIComponent(segment)
+            .replace(/[!'()*]/g, c => '%' + c.charCodeAt(0).toString(16).toUpperCase()))
+        .join('/');
+}
+
+/**
+ * 还原列式数据中某个节点的链接：优先使用例外表，否则为该类型的前缀加编码后的路径
+ * @param {Object} data - 列式数据
+ * @param {Map} overrides - 节点下标到链接的例外表
+ * @param {number} index - 节点下标
+ * @param {string} type - 节点类型
+ * @param {string} path - 节点路径
+ * @returns {string|null} 链接
+ */
+function columnarUrl(data, overrides, index, type, path) {
+    if (overrides.has(index)) {
+        return overrides.get(index);
+    }
+    const prefix = data.urlPrefix[type];
+    return prefix === undefined ? null : prefix + quotePath(path);
+}
+
+/**
+ * 检查列式数据的格式版本
+ * @param {Object} data - 列式数据
+ */
+function checkColumnarVersion(data) {
+    if (data.version > COLUMNAR_VERSION) {
+        throw new Error(`不支持的数据格式版本: ${data.version}`);
+    }
+}
+
+/**
+ * 解码列式依赖图（服务端返回紧凑格式时），原有的 nodes/links 格式原样返回
+ * 链接的端点直接引用节点对象，力导向图无需再按ID查找节点
+ * @param {Object} data - 依赖图数据
+ * @returns {Object} 包含nodes和links的数据
+ */
+function decodeDependencyData(data) {
+    if (data.encoding !== 'columnar') {
+        return data;
+    }
+    checkColumnarVersion(data);
+    
+    const overrides = new Map(data.urlOverrides);
+    const nodes = new Array(data.segment.length);
+    for (let i = 0; i < nodes.length; i++) {
+        const segment = data.strings[data.segment[i]];
+        const parent = data.idParent[i];
+        const id = parent >= 0 ? `${nodes[parent].id}/${segment}` : segment;
+        const type = data.types[data.type[i]];
+        nodes[i] = {
+            id: id,
+            name: data.strings[data.name[i]],
+            type: type,
+            url: columnarUrl(data, overrides, i, type, id),
+            size: data.size[i]
+        };
+    }
+    
+    const links = new Array(data.source.length);
+    for (let i = 0; i < links.length; i++) {
+        links[i] = {
+            source: nodes[data.source[i]],
+            target: nodes[data.target[i]],
+            value: data.value[i],
+            type: data.linkTypes[data.linkType[i]]
+        };
+    }
+    
+    return { nodes, links };
+}
+
+/**
+ * 解码列式文件树（服务端返回紧凑格式时），原有的嵌套格式原样返回
+ * 节点按先序排列，按下标顺序追加到父节点即可还原子节点顺序
+ * @param {Object} data - 文件树数据
+ * @returns {Object} 嵌套的文件树根节点
+ */
+function decodeFileStructure(data) {
+    if (data.encoding !== 'columnar') {
+        return data;
+    }
+    checkColumnarVersion(data);
+    
+    const overrides = new Map(data.urlOverrides);
+    const nodes = new Array(data.name.length);
+    for (let i = 0; i < nodes.length; i++) {
+        const name = data.strings[data.name[i]];
+        const parent = data.parent[i] >= 0 ? nodes[data.parent[i]] : null;
+        const path = parent ? (parent.path ? `${parent.path}/${name}` : name) : '';
+        const type = data.types[data.type[i]];
+        const node = {
+            name: name,
+            path: path,
+            type: type,
+            url: columnarUrl(data, overrides, i, type, path),
+            children: []
+        };
+        if (type === 'file') {
+            node.sha = data.sha[i];
+            node.size = data.size[i];
+        }
+        nodes[i] = node;
+        if (parent) {
+            parent.children.push(node);
+        }
+    }
+    
+    if (data.truncated) {
+        nodes[0].truncated = true;
+    }
+    return nodes[0];
+}
+
 /**
  * 清除当前可视化
  */
 function clearVisualization() {
+    if (currentVisualization && currentVisualization.simulation) {
+        currentVisualization.simulation.stop();
+    }
+    lodGeneration++;
     d3.select("#dependencyGraph").selectAll("*").remove();
 }
 
@@ -60,6 +225,20 @@ function createForceDirectedGraph(data) {
     const width = container.clientWidth;
     const height = container.clientHeight;
     
+    // 创建力导向模拟
+    const simulation = d3.forceSimulation(data.nodes)
+        .force("link", d3.forceLink(data.links).id(d => d.id).distance(100))
+        .force("charge", d3.forceManyBody().strength(-300))
+        .force("center", d3.forceCenter(width / 2, height / 2))
+        .force("x", d3.forceX())
+        .force("y", d3.forceY());
+    
+    // 节点较多时改用 Canvas 绘制
+    if (data.nodes.length > CANVAS_NODE_THRESHOLD) {
+        createForceDirectedCanvas(data, simulation);
+        return;
+    }
+    
     // 创建SVG
     const svg = d3.select("#dependencyGraph")
         .append("svg")
@@ -72,14 +251,6 @@ function createForceDirectedGraph(data) {
     
     const g = svg.append("g");
     
-    // 创建力导向模拟
-    const simulation = d3.forceSimulation(data.nodes)
-        .force("link", d3.forceLink(data.links).id(d => d.id).distance(100))
-        .force("charge", d3.forceManyBody().strength(-300))
-        .force("center", d3.forceCenter(width / 2, height / 2))
-        .force("x", d3.forceX())
-        .force("y", d3.forceY());
-    
     // 绘制连接线
     const link = g.append("g")
         .attr("stroke", "#999")
@@ -87,6 +258,8 @@ function createForceDirectedGraph(data) {
         .selectAll("line")
         .data(data.links)
         .join("line")
+        .attr("stroke", d => d.type === 'import' ? "#e15759" : null)
+        .attr("stroke-dasharray", d => d.type === 'import' ? "4,2" : null)
         .attr("stroke-width", d => Math.sqrt(d.value || 1));
     
     // 绘制节点
@@ -148,6 +321,610 @@ function createForceDirectedGraph(data) {
     };
 }
 
+/**
+ * 创建大型依赖图的分层聚合视图
+ * 节点坐标由服务端预先计算，浏览器不运行力导向模拟；较深的目录聚合为超级节点，
+ * 每放大一倍展开一层目录，并只请求可见区域内的节点。点击超级节点放大到该目录，点击文件打开链接。
+ * @param {Function} loadLevel - loadLevel({depth, bbox}) 返回聚合视图的 Promise
+ */
+function createLevelOfDetailGraph(loadLevel) {
+    // 获取容器尺寸
+    const container = document.getElementById('dependencyGraph');
+    const width = container.clientWidth;
+    const height = container.clientHeight;
+    const generation = lodGeneration;
+    
+    // 创建SVG
+    const svg = d3.select("#dependencyGraph")
+        .append("svg")
+        .attr("width", width)
+        .attr("height", height)
+        .attr("viewBox", [0, 0, width, height]);
+    
+    const g = svg.append("g");
+    const linkLayer = g.append("g")
+        .attr("stroke", "#999")
+        .attr("stroke-opacity", 0.6);
+    const nodeLayer = g.append("g")
+        .attr("stroke", "#fff")
+        .attr("stroke-width", 1.5);
+    const status = svg.append("text")
+        .attr("x", 10)
+        .attr("y", 20)
+        .style("font-size", "12px")
+        .style("fill", "#666");
+    
+    let baseDepth = 0;          // 完整视图的深度
+    let fitScale = 1;           // 完整视图对应的缩放比例
+    let transform = d3.zoomIdentity;
+    let requestSeq = 0;
+    let lastRequest = null;
+    let refreshTimer = null;
+    
+    const zoom = d3.zoom()
+        .on("zoom", (event) => {
+            transform = event.transform;
+            g.attr("transform", transform);
+            applyScale();
+            // 缩放或平移停止后再请求新的视图
+            clearTimeout(refreshTimer);
+            refreshTimer = setTimeout(refresh, 250);
+        });
+    svg.call(zoom);
+    
+    // 节点和文字保持固定的屏幕尺寸
+    function applyScale() {
+        const k = transform.k;
+        nodeLayer.selectAll("circle").attr("r", d => d.size / k);
+        nodeLayer.selectAll("text")
+            .attr("dx", d => (d.size + 4) / k)
+            .style("font-size", `${12 / k}px`);
+    }
+    
+    function render(level) {
+        // 层次结构图和圆形打包图使用当前层级的数据
+        dependencyData = { nodes: level.nodes, links: level.links };
+        const byId = new Map(level.nodes.map(node => [node.id, node]));
+        
+        linkLayer.selectAll("line")
+            .data(level.links, d => `${d.source}|${d.target}|${d.type}`)
+            .join("line")
+            .attr("vector-effect", "non-scaling-stroke")
+            .attr("stroke", d => d.type === 'import' ? "#e15759" : null)
+            .attr("stroke-dasharray", d => d.type === 'import' ? "4,2" : null)
+            .attr("stroke-width", d => Math.min(Math.sqrt(d.value || 1), 8))
+            .attr("x1", d => byId.get(d.source).x)
+            .attr("y1", d => byId.get(d.source).y)
+            .attr("x2", d => byId.get(d.target).x)
+            .attr("y2", d => byId.get(d.target).y);
+        
+        const node = nodeLayer.selectAll("g")
+            .data(level.nodes, d => d.id)
+            .join(enter => {
+                const item = enter.append("g");
+                item.append("circle")
+                    .attr("vector-effect", "non-scaling-stroke")
+                    .on("mouseover", (event, d) => {
+                        tooltip.transition()
+                            .duration(200)
+                            .style("opacity", .9);
+                        const info = d.collapsed ? `包含 ${d.count} 个文件，点击展开` : (d.info || '');
+                        tooltip.html(`<strong>${d.name}</strong><br/>${d.type || 'file'}<br/>${info}`)
+                            .style("left", (event.pageX + 10) + "px")
+                            .style("top", (event.pageY - 28) + "px");
+                    })
+                    .on("mouseout", () => {
+                        tooltip.transition()
+                            .duration(500)
+                            .style("opacity", 0);
+                    })
+                    .on("click", (event, d) => {
+                        if (d.collapsed) {
+                            zoomTo(d);
+                        } else if (d.url) {
+                            window.open(d.url, '_blank');
+                        }
+                    });
+                item.append("text")
+                    .attr("dy", ".35em")
+                    .attr("stroke", "none")
+                    .style("fill", "#000");
+                return item;
+            });
+        
+        node.attr("class", d => `node ${d.type || ''}`)
+            .attr("transform", d => `translate(${d.x},${d.y})`);
+        node.select("circle")
+            .attr("fill", d => getNodeColor(d))
+            .attr("fill-opacity", d => d.collapsed ? 0.7 : 1);
+        // 文件较多时只标注目录，避免文字重叠
+        node.select("text")
+            .text(d => d.collapsed || level.nodes.length <= 300 ? d.name : '');
+        applyScale();
+        
+        const files = level.nodes.reduce((sum, d) => sum + d.count, 0);
+        status.text(`目录深度 ${level.depth}/${level.maxDepth}，显示 ${level.nodes.length} 个节点（${files} 个文件）`);
+    }
+    
+    async function load(params) {
+        const key = JSON.stringify(params);
+        if (key === lastRequest) {
+            return;
+        }
+        lastRequest = key;
+        const seq = ++requestSeq;
+        status.text('正在加载依赖图...');
+        
+        try {
+            const level = await loadLevel(params);
+            // 忽略已清除的视图或已被后续请求取代的响应
+            if (generation !== lodGeneration || seq !== requestSeq) {
+                return null;
+            }
+            render(level);
+            return level;
+        } catch (error) {
+            if (generation === lodGeneration && seq === requestSeq) {
+                console.error('Error:', error);
+                status.text(`加载依赖图失败: ${error.message}`);
+                lastRequest = null;
+            }
+            return null;
+        }
+    }
+    
+    // 按当前缩放比例计算展开深度，放大后只请求可见区域
+    function refresh() {
+        const zoomLevel = transform.k / fitScale;
+        if (zoomLevel <= 1) {
+            load({ depth: baseDepth, bbox: null });
+            return;
+        }
+        const [x0, y0] = transform.invert([0, 0]);
+        const [x1, y1] = transform.invert([width, height]);
+        const depth = baseDepth + Math.floor(Math.log2(zoomLevel));
+        load({ depth: depth, bbox: [x0, y0, x1, y1].map(value => Math.round(value)) });
+    }
+    
+    function zoomTo(d) {
+        svg.transition()
+            .duration(500)
+            .call(zoom.transform, d3.zoomIdentity
+                .translate(width / 2, height / 2)
+                .scale(transform.k * 2)
+                .translate(-d.x, -d.y));
+    }
+    
+    // 首次加载完整视图，并缩放到适合容器的大小
+    load({}).then(level => {
+        if (!level) {
+            return;
+        }
+        baseDepth = level.depth;
+        lastRequest = JSON.stringify({ depth: baseDepth, bbox: null });
+        const [bx0, by0, bx1, by1] = level.bounds;
+        fitScale = 0.9 * Math.min(width / Math.max(bx1 - bx0, 1), height / Math.max(by1 - by0, 1));
+        zoom.scaleExtent([fitScale / 4, fitScale * 2 ** (level.maxDepth - baseDepth + 3)]);
+        svg.call(zoom.transform, d3.zoomIdentity
+            .translate(width / 2, height / 2)
+            .scale(fitScale)
+            .translate(-(bx0 + bx1) / 2, -(by0 + by1) / 2));
+    });
+    
+    // 保存当前可视化
+    currentVisualization = {
+        type: 'lod'
+    };
+}
+
+/**
+ * 创建 Canvas 视图
+ * 所有节点和连接绘制在同一个 canvas 上，多次重绘请求合并到下一个动画帧；
+ * 悬停和点击通过 d3.quadtree 查找鼠标下的节点，缩放通过 d3.zoom 变换绘图坐标系
+ * @param {Object} options - 视图配置
+ * @param {Array} options.items - 可交互的节点，x、y 为绘图坐标
+ * @param {Function} options.radius - 返回节点半径
+ * @param {Function} options.draw - draw(context, transform, viewport) 绘制全部内容，context 已应用缩放变换
+ * @param {Function} options.describe - 返回节点的 {name, type, info}，用于工具提示
+ * @param {Function} options.drag - 可选，drag(view) 返回节点的拖拽行为
+ * @returns {Object} 视图对象
+ */
+function createCanvasView({ items, radius, draw, describe, drag }) {
+    const container = document.getElementById('dependencyGraph');
+    const width = container.clientWidth;
+    const height = container.clientHeight;
+    const ratio = window.devicePixelRatio || 1;
+    
+    const canvas = d3.select("#dependencyGraph")
+        .append("canvas")
+        .attr("width", width * ratio)
+        .attr("height", height * ratio)
+        .style("width", `${width}px`)
+        .style("height", `${height}px`);
+    const context = canvas.node().getContext("2d");
+    
+    let transform = d3.zoomIdentity;
+    let quadtree = null;
+    let maxRadius = 0;
+    let frame = null;
+    let hovered = null;
+    
+    const view = {
+        canvas: canvas,
+        
+        // 请求重绘，同一帧内只绘制一次
+        redraw() {
+            if (frame !== null) {
+                return;
+            }
+            frame = requestAnimationFrame(() => {
+                frame = null;
+                const [x0, y0] = transform.invert([0, 0]);
+                const [x1, y1] = transform.invert([width, height]);
+                context.save();
+                context.setTransform(ratio, 0, 0, ratio, 0, 0);
+                context.clearRect(0, 0, width, height);
+                context.translate(transform.x, transform.y);
+                context.scale(transform.k, transform.k);
+                draw(context, transform, { x0, y0, x1, y1 });
+                context.restore();
+            });
+        },
+        
+        // 节点位置变化后调用：四叉树在下一次查找时重建
+        invalidate() {
+            quadtree = null;
+            view.redraw();
+        },
+        
+        // 鼠标事件对应的绘图坐标
+        pointer(event) {
+            return transform.invert(d3.pointer(event, canvas.node()));
+        },
+        
+        // 查找覆盖 (x, y) 的节点，嵌套的圆取最内层（半径最小）的节点
+        find(x, y) {
+            if (!quadtree) {
+                quadtree = d3.quadtree(items, d => d.x, d => d.y);
+                maxRadius = d3.max(items, radius) || 0;
+            }
+            const tolerance = 2 / transform.k;
+            const reach = maxRadius + tolerance;
+            let found = null;
+            let foundRadius = Infinity;
+            quadtree.visit((node, qx0, qy0, qx1, qy1) => {
+                if (!node.length) {
+                    do {
+                        const d = node.data;
+                        const r = radius(d);
+                        const dx = d.x - x;
+                        const dy = d.y - y;
+                        if (r < foundRadius && dx * dx + dy * dy <= (r + tolerance) ** 2) {
+                            found = d;
+                            foundRadius = r;
+                        }
+                    } while ((node = node.next));
+                }
+                return qx0 > x + reach || qx1 < x - reach || qy0 > y + reach || qy1 < y - reach;
+            });
+            return found;
+        }
+    };
+    
+    function hideTooltip() {
+        hovered = null;
+        canvas.style("cursor", null);
+        tooltip.transition()
+            .duration(500)
+            .style("opacity", 0);
+    }
+    
+    canvas
+        .on("mousemove", (event) => {
+            const d = view.find(...view.pointer(event));
+            if (!d) {
+                if (hovered) {
+                    hideTooltip();
+                }
+                return;
+            }
+            if (d !== hovered) {
+                hovered = d;
+                canvas.style("cursor", "pointer");
+                const info = describe(d);
+                tooltip.transition()
+                    .duration(200)
+                    .style("opacity", .9);
+                tooltip.html(`<strong>${info.name}</strong><br/>${info.type || 'file'}<br/>${info.info || ''}`);
+            }
+            tooltip.style("left", (event.pageX + 10) + "px")
+                .style("top", (event.pageY - 28) + "px");
+        })
+        .on("mouseleave", hideTooltip)
+        .on("click", (event) => {
+            // 拖拽或平移结束时不视为点击
+            if (event.defaultPrevented) {
+                return;
+            }
+            const d = view.find(...view.pointer(event));
+            if (d && describe(d).url) {
+                window.open(describe(d).url, '_blank');
+            }
+        });
+    
+    // 拖拽需在缩放之前注册，按下节点时拖拽节点，否则平移画布
+    if (drag) {
+        canvas.call(drag(view));
+    }
+    canvas.call(d3.zoom().on("zoom", (event) => {
+        transform = event.transform;
+        view.redraw();
+    }));
+    
+    view.redraw();
+    return view;
+}
+
+/**
+ * 在 Canvas 上绘制文字标签：只绘制可见区域内的节点，可见节点过多时不绘制
+ * @param {CanvasRenderingContext2D} context - 绘图上下文
+ * @param {Object} viewport - 可见区域 {x0, y0, x1, y1}
+ * @param {Array} items - 节点，x、y 为绘图坐标
+ * @param {Function} drawLabel - drawLabel(context, item) 绘制单个标签
+ */
+function drawCanvasLabels(context, viewport, items, drawLabel) {
+    const visible = items.filter(d =>
+        d.x >= viewport.x0 && d.x <= viewport.x1 && d.y >= viewport.y0 && d.y <= viewport.y1);
+    if (visible.length > CANVAS_LABEL_LIMIT) {
+        return;
+    }
+    visible.forEach(d => drawLabel(context, d));
+}
+
+/**
+ * 以 Canvas 绘制力导向图
+ * @param {Object} data - 项目依赖数据，链接端点已由模拟解析为节点对象
+ * @param {Object} simulation - D3力导向模拟
+ */
+function createForceDirectedCanvas(data, simulation) {
+    // 同一样式的图形合并为一条路径绘制
+    const linkGroups = d3.group(data.links,
+        d => `${d.type === 'import' ? 'import' : 'link'}|${Math.sqrt(d.value || 1).toFixed(1)}`);
+    const nodeGroups = d3.group(data.nodes, d => getNodeColor(d));
+    
+    const view = createCanvasView({
+        items: data.nodes,
+        radius: d => d.size || 5,
+        describe: d => d,
+        drag: view => canvasDrag(simulation, view),
+        draw: (context, transform, viewport) => {
+            // 绘制连接线
+            context.globalAlpha = 0.6;
+            linkGroups.forEach((links, key) => {
+                const [type, width] = key.split('|');
+                context.beginPath();
+                links.forEach(d => {
+                    context.moveTo(d.source.x, d.source.y);
+                    context.lineTo(d.target.x, d.target.y);
+                });
+                context.strokeStyle = type === 'import' ? "#e15759" : "#999";
+                context.setLineDash(type === 'import' ? [4, 2] : []);
+                context.lineWidth = Number(width);
+                context.stroke();
+            });
+            context.globalAlpha = 1;
+            context.setLineDash([]);
+            
+            // 绘制节点
+            context.strokeStyle = "#fff";
+            context.lineWidth = 1.5;
+            nodeGroups.forEach((nodes, color) => {
+                context.beginPath();
+                nodes.forEach(d => {
+                    const r = d.size || 5;
+                    context.moveTo(d.x + r, d.y);
+                    context.arc(d.x, d.y, r, 0, 2 * Math.PI);
+                });
+                context.fillStyle = color;
+                context.fill();
+                context.stroke();
+            });
+            
+            // 绘制节点文本标签
+            context.font = "12px sans-serif";
+            context.fillStyle = "#000";
+            context.textBaseline = "middle";
+            drawCanvasLabels(context, viewport, data.nodes, (context, d) => {
+                context.fillText(d.name, d.x + 12, d.y);
+            });
+        }
+    });
+    
+    simulation.on("tick", view.invalidate);
+    
+    // 保存当前可视化
+    currentVisualization = {
+        type: 'force',
+        simulation: simulation
+    };
+}
+
+/**
+ * 创建 Canvas 视图中的节点拖拽行为
+ * @param {Object} simulation - D3力导向模拟
+ * @param {Object} view - Canvas 视图
+ * @returns {Function} 拖拽行为函数
+ */
+function canvasDrag(simulation, view) {
+    function dragstarted(event) {
+        if (!event.active) simulation.alphaTarget(0.3).restart();
+        event.subject.fx = event.subject.x;
+        event.subject.fy = event.subject.y;
+    }
+    
+    function dragged(event) {
+        const [x, y] = view.pointer(event);
+        event.subject.fx = x;
+        event.subject.fy = y;
+    }
+    
+    function dragended(event) {
+        if (!event.active) simulation.alphaTarget(0);
+        event.subject.fx = null;
+        event.subject.fy = null;
+    }
+    
+    return d3.drag()
+        .subject(event => view.find(...view.pointer(event)))
+        .on("start", dragstarted)
+        .on("drag", dragged)
+        .on("end", dragended);
+}
+
+/**
+ * 以 Canvas 绘制径向层次结构树
+ * @param {Object} root - 已完成布局的层次结构根节点
+ * @param {Array} descendants - 根节点的全部后代
+ */
+function createHierarchicalCanvas(root, descendants) {
+    const container = document.getElementById('dependencyGraph');
+    const cx = container.clientWidth / 2;
+    const cy = container.clientHeight / 2;
+    
+    // 极坐标转换为绘图坐标
+    const items = descendants.map(d => ({
+        node: d,
+        x: cx + d.y * Math.sin(d.x),
+        y: cy - d.y * Math.cos(d.x)
+    }));
+    const links = root.links();
+    const nodeGroups = d3.group(items, d => d.node.children ? "#555" : "#999");
+    
+    createCanvasView({
+        items: items,
+        radius: () => 2.5,
+        describe: d => d.node.data,
+        draw: (context, transform, viewport) => {
+            // 绘制径向连接线
+            const link = d3.linkRadial()
+                .angle(d => d.x)
+                .radius(d => d.y)
+                .context(context);
+            context.save();
+            context.translate(cx, cy);
+            context.beginPath();
+            links.forEach(d => link(d));
+            context.globalAlpha = 0.4;
+            context.strokeStyle = "#999";
+            context.lineWidth = 1.5;
+            context.stroke();
+            context.restore();
+            
+            // 绘制节点
+            nodeGroups.forEach((nodes, color) => {
+                context.beginPath();
+                nodes.forEach(d => {
+                    context.moveTo(d.x + 2.5, d.y);
+                    context.arc(d.x, d.y, 2.5, 0, 2 * Math.PI);
+                });
+                context.fillStyle = color;
+                context.fill();
+            });
+            
+            // 绘制节点文本标签，与 SVG 视图的排列方式一致
+            context.font = "10px sans-serif";
+            context.textBaseline = "middle";
+            context.lineJoin = "round";
+            context.lineWidth = 3;
+            context.strokeStyle = "white";
+            context.fillStyle = "#000";
+            drawCanvasLabels(context, viewport, items, (context, d) => {
+                const outward = d.node.x < Math.PI === !d.node.children;
+                context.save();
+                context.translate(d.x, d.y);
+                if (d.node.x >= Math.PI) {
+                    context.rotate(Math.PI);
+                }
+                context.textAlign = outward ? "left" : "right";
+                context.strokeText(d.node.data.name, outward ? 6 : -6, 0);
+                context.fillText(d.node.data.name, outward ? 6 : -6, 0);
+                context.restore();
+            });
+        }
+    });
+    
+    // 保存当前可视化
+    currentVisualization = {
+        type: 'tree'
+    };
+}
+
+/**
+ * 以 Canvas 绘制圆形打包图
+ * @param {Array} descendants - 已完成布局的层次结构节点
+ */
+function createCirclePackingCanvas(descendants) {
+    const parents = descendants.filter(d => d.children);
+    const leafGroups = d3.group(descendants.filter(d => !d.children), d => getNodeColor(d.data));
+    
+    createCanvasView({
+        items: descendants,
+        radius: d => d.r,
+        describe: d => d.data,
+        draw: (context, transform, viewport) => {
+            // 绘制目录圆
+            context.beginPath();
+            parents.forEach(d => {
+                context.moveTo(d.x + d.r, d.y);
+                context.arc(d.x, d.y, d.r, 0, 2 * Math.PI);
+            });
+            context.globalAlpha = 0.1;
+            context.fillStyle = "#fff";
+            context.fill();
+            context.globalAlpha = 1;
+            context.strokeStyle = "#555";
+            context.lineWidth = 1;
+            context.stroke();
+            
+            // 绘制文件圆
+            context.globalAlpha = 0.8;
+            leafGroups.forEach((leaves, color) => {
+                context.beginPath();
+                leaves.forEach(d => {
+                    context.moveTo(d.x + d.r, d.y);
+                    context.arc(d.x, d.y, d.r, 0, 2 * Math.PI);
+                });
+                context.fillStyle = color;
+                context.fill();
+            });
+            context.globalAlpha = 1;
+            
+            // 为足够大的叶子节点添加文本标签，裁剪到圆内
+            context.font = "10px sans-serif";
+            context.textAlign = "center";
+            context.textBaseline = "alphabetic";
+            context.fillStyle = "#000";
+            const labelled = descendants.filter(d => !d.children && d.r * transform.k > 10);
+            drawCanvasLabels(context, viewport, labelled, (context, d) => {
+                const lines = d.data.name.split(/(?=[A-Z][a-z])|\s+/g);
+                context.save();
+                context.beginPath();
+                context.arc(d.x, d.y, d.r, 0, 2 * Math.PI);
+                context.clip();
+                lines.forEach((line, i) => {
+                    context.fillText(line, d.x, d.y + (i - lines.length / 2 + 0.8) * 10);
+                });
+                context.restore();
+            });
+        }
+    });
+    
+    // 保存当前可视化
+    currentVisualization = {
+        type: 'pack'
+    };
+}
+
 /**
  * 创建层次结构树
  * @param {Object} data - 项目依赖数据
@@ -161,6 +938,22 @@ function createHierarchicalTree(data) {
     const width = container.clientWidth;
     const height = container.clientHeight;
     
+    // 创建树形布局
+    const tree = d3.tree()
+        .size([2 * Math.PI, Math.min(width, height) / 2 - 100])
+        .separation((a, b) => (a.parent == b.parent ? 1 : 2) / a.depth);
+    
+    // 计算节点位置
+    const root = d3.hierarchy(hierarchyData);
+    tree(root);
+    
+    // 节点较多时改用 Canvas 绘制
+    const descendants = root.descendants();
+    if (descendants.length > CANVAS_NODE_THRESHOLD) {
+        createHierarchicalCanvas(root, descendants);
+        return;
+    }
+    
     // 创建SVG
     const svg = d3.select("#dependencyGraph")
         .append("svg")
@@ -174,15 +967,6 @@ function createHierarchicalTree(data) {
     const g = svg.append("g")
         .attr("transform", `translate(${width / 2},${height / 2})`);
     
-    // 创建树形布局
-    const tree = d3.tree()
-        .size([2 * Math.PI, Math.min(width, height) / 2 - 100])
-        .separation((a, b) => (a.parent == b.parent ? 1 : 2) / a.depth);
-    
-    // 计算节点位置
-    const root = d3.hierarchy(hierarchyData);
-    tree(root);
-    
     // 创建径向连接线
     const link = g.append("g")
         .attr("fill", "none")
@@ -201,7 +985,7 @@ function createHierarchicalTree(data) {
         .attr("stroke-linejoin", "round")
         .attr("stroke-width", 3)
         .selectAll("g")
-        .data(root.descendants())
+        .data(descendants)
         .join("g")
         .attr("transform", d => `
             translate(${d.y * Math.sin(d.x)},${-d.y * Math.cos(d.x)})
@@ -259,6 +1043,25 @@ function createCirclePacking(data) {
     const width = container.clientWidth;
     const height = container.clientHeight;
     
+    // 创建层次结构
+    const root = d3.hierarchy(hierarchyData)
+        .sum(d => d.size || 1)
+        .sort((a, b) => b.value - a.value);
+    
+    // 创建圆形打包布局
+    const pack = d3.pack()
+        .size([width - 2, height - 2])
+        .padding(3);
+    
+    pack(root);
+    
+    // 节点较多时改用 Canvas 绘制
+    const descendants = root.descendants();
+    if (descendants.length > CANVAS_NODE_THRESHOLD) {
+        createCirclePackingCanvas(descendants);
+        return;
+    }
+    
     // 创建SVG
     const svg = d3.select("#dependencyGraph")
         .append("svg")
@@ -273,22 +1076,10 @@ function createCirclePacking(data) {
     const g = svg.append("g")
         .attr("transform", `translate(${width / 2},${height / 2})`);
     
-    // 创建层次结构
-    const root = d3.hierarchy(hierarchyData)
-        .sum(d => d.size || 1)
-        .sort((a, b) => b.value - a.value);
-    
-    // 创建圆形打包布局
-    const pack = d3.pack()
-        .size([width - 2, height - 2])
-        .padding(3);
-    
-    pack(root);
-    
     // 创建节点
     const node = g.append("g")
         .selectAll("g")
-        .data(root.descendants())
+        .data(descendants)
         .join("g")
         .attr("transform", d => `translate(${d.x - width/2},${d.y - height/2})`);
     
@@ -360,8 +1151,9 @@ function convertToHierarchy(data) {
         };
     });
     
-    // 构建层次结构
-    data.links.forEach(link => {
+    // 构建层次结构（只使用目录包含关系，导入依赖可能成环）
+    const treeLinks = data.links.filter(link => link.type !== 'import');
+    treeLinks.forEach(link => {
         const source = nodeMap[link.source.id || link.source];
         const target = nodeMap[link.target.id || link.target];
         
@@ -372,7 +1164,7 @@ function convertToHierarchy(data) {
     
     // 找出根节点（没有入边的节点）
     const hasIncomingEdge = new Set();
-    data.links.forEach(link => {
+    treeLinks.forEach(link => {
         hasIncomingEdge.add(link.target.id || link.target);
     });
     
@@ -556,20 +1348,23 @@ function createCodeComplexityChart(data) {
         .attr("transform", `translate(${margin.left},${margin.top})`);
     
     // 创建X轴比例尺
+    // 以完整路径区分同名文件，坐标轴只显示文件名
+    const key = d => d.path || d.file;
+    const labels = new Map(data.map(d => [key(d), d.file]));
     const x = d3.scaleBand()
-        .domain(data.map(d => d.file))
+        .domain(data.map(key))
         .range([0, width - margin.left - margin.right])
         .padding(0.2);
     
     // 创建Y轴比例尺
     const y = d3.scaleLinear()
-        .domain([0, d3.max(data, d => d.complexity) * 1.1])
+        .domain([0, (d3.max(data, d => d.complexity) || 1) * 1.1])
         .range([height - margin.top - margin.bottom, 0]);
     
     // 绘制X轴
     svg.append("g")
         .attr("transform", `translate(0,${height - margin.top - margin.bottom})`)
-        .call(d3.axisBottom(x))
+        .call(d3.axisBottom(x).tickFormat(k => labels.get(k)))
         .selectAll("text")
         .attr("transform", "translate(-10,0)rotate(-45)")
         .style("text-anchor", "end")
@@ -611,7 +1406,7 @@ function createCodeComplexityChart(data) {
         .data(data)
         .enter()
         .append("rect")
-        .attr("x", d => x(d.file))
+        .attr("x", d => x(key(d)))
         .attr("y", d => y(d.complexity))
         .attr("width", x.bandwidth())
         .attr("height", d => height - margin.top - margin.bottom - y(d.complexity))
@@ -625,7 +1420,11 @@ function createCodeComplexityChart(data) {
             tooltip.transition()
                 .duration(200)
                 .style("opacity", .9);
-            tooltip.html(`<strong>${d.file}</strong><br/>复杂度: ${d.complexity}<br/>行数: ${d.lines}`)
+            let html = `<strong>${key(d)}</strong><br/>圈复杂度: ${d.complexity}<br/>行数: ${d.lines}`;
+            if (d.sloc !== undefined) {
+                html += `<br/>有效代码行: ${d.sloc}<br/>函数数: ${d.functions}`;
+            }
+            tooltip.html(html)
                 .style("left", (event.pageX + 10) + "px")
                 .style("top", (event.pageY - 28) + "px");
         })
@@ -639,6 +1438,8 @@ function createCodeComplexityChart(data) {
 // 导出函数
 window.D3Visualizations = {
     initDependencyVisualization,
+    decodeDependencyData,
+    decodeFileStructure,
     createLanguageDistributionChart,
     createCodeComplexityChart
 };
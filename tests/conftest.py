@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 后端模块以同级导入的方式组织，测试时将 src/backend 加入导入路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src', 'backend'))
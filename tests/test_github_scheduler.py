@@ -0,0 +1,61 @@
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from caching import MemoryCache
+from github_scheduler import GitHubScheduler
+
+
+class FakeSession:
+    """按 URL 返回指定大小响应体的 requests 会话，所有 200 响应都带 ETag"""
+
+    def __init__(self, sizes):
+        self.sizes = sizes
+
+    def get(self, url, params=None, headers=None, timeout=None, stream=False):
+        response = requests.Response()
+        response.url = url
+        response.status_code = 200
+        response._content = b'x' * self.sizes[url]
+        response.headers = CaseInsensitiveDict({'ETag': f'"{url}"'})
+        return response
+
+
+def make_scheduler(sizes, **kwargs):
+    return GitHubScheduler(FakeSession(sizes), [None], max_concurrency=4, reserve=0, max_wait=0,
+                           etag_entries=1000, **kwargs)
+
+
+def test_etag_cache_is_bounded_by_total_bytes():
+    sizes = {f'https://api.github.com/{i}': 300 for i in range(50)}
+    scheduler = make_scheduler(sizes, etag_max_bytes=1000, etag_max_body=500)
+    for url in sizes:
+        scheduler.get(url)
+
+    stats = scheduler.etags.stats()
+    assert stats['bytes'] <= 1000
+    assert stats['entries'] == 3
+    # 最近请求的响应保留在缓存中
+    assert scheduler.etags.get("https://api.github.com/49?#") is not None
+
+
+def test_etag_cache_skips_large_bodies():
+    sizes = {'https://api.github.com/small': 100, 'https://api.github.com/tree': 5000}
+    scheduler = make_scheduler(sizes, etag_max_bytes=10000, etag_max_body=1000)
+    for url in sizes:
+        scheduler.get(url)
+
+    assert scheduler.etags.stats()['entries'] == 1
+    assert scheduler.etags.stats()['bytes'] == 100
+
+
+def test_memory_cache_tracks_bytes_on_replace_and_delete():
+    cache = MemoryCache(max_entries=10, max_bytes=100, sizeof=len)
+    cache.set('a', 'x' * 40)
+    cache.set('a', 'x' * 60)
+    cache.set('b', 'x' * 30)
+    assert cache.stats()['bytes'] == 90
+    cache.delete('a')
+    assert cache.stats()['bytes'] == 30
+    cache.set('c', 'x' * 200)
+    assert cache.get('c') is None
+    assert cache.stats()['bytes'] == 30
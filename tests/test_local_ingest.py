@@ -0,0 +1,78 @@
+import subprocess
+
+import pytest
+
+from local_ingest import LocalRepo, LocalRepoError, _parse_ls_tree
+from tree_ingest import build_file_tree
+
+
+def git(path, *args):
+    subprocess.run(['git', '-C', str(path), '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+@pytest.fixture
+def nested_repo(tmp_path):
+    """外层 git 仓库中包含一个允许分析的子目录，外层仓库的 secret.py 不在允许范围内"""
+    outer = tmp_path / 'outer'
+    sub = outer / 'sub'
+    (sub / 'pkg').mkdir(parents=True)
+    (outer / 'secret.py').write_text('TOKEN = "secret"\n')
+    (sub / 'main.py').write_text('import pkg.util\n')
+    (sub / 'pkg' / 'util.py').write_text('VALUE = 1\n')
+    git(outer, 'init', '-q')
+    git(outer, 'add', '-A')
+    git(outer, 'commit', '-q', '-m', 'init')
+    return outer, sub
+
+
+def test_subdirectory_of_enclosing_repo_is_not_treated_as_git(nested_repo):
+    outer, sub = nested_repo
+    repo = LocalRepo(str(sub), [str(sub)])
+    assert not repo.is_git
+    paths = {e['path'] for e in repo.entries(100)}
+    assert paths == {'main.py', 'pkg', 'pkg/util.py'}
+
+
+def test_repository_root_is_treated_as_git(nested_repo):
+    outer, _ = nested_repo
+    repo = LocalRepo(str(outer), [str(outer)])
+    assert repo.is_git
+    assert 'sub/pkg/util.py' in {e['path'] for e in repo.entries(100)}
+
+
+@pytest.mark.parametrize('path', ['../secret.py', 'pkg/../../secret.py', './main.py', '/etc/passwd', ''])
+def test_read_file_rejects_paths_outside_repo(nested_repo, path):
+    outer, sub = nested_repo
+    for root in (sub, outer / 'sub'):
+        with pytest.raises(LocalRepoError):
+            LocalRepo(str(root), [str(sub)]).read_file(path)
+
+
+def test_read_file_in_git_repo_rejects_parent_segments(nested_repo):
+    outer, _ = nested_repo
+    repo = LocalRepo(str(outer), [str(outer)])
+    assert repo.read_file('sub/main.py')[1] == b'import pkg.util\n'
+    with pytest.raises(LocalRepoError):
+        repo.read_file('sub/../secret.py')
+
+
+def test_ls_tree_relative_entries_are_dropped():
+    sha = '0' * 40
+    output = (f'100644 blob {sha}      10\t../secret.py\0'
+              f'040000 tree {sha}       -\t./\0'
+              f'100644 blob {sha}      10\tmain.py\0').encode()
+    entries = _parse_ls_tree(output)
+    assert [e['path'] for e in entries] == ['main.py']
+
+    root, _ = build_file_tree(entries, 'sub', None, 'HEAD', 100)
+    assert [child['name'] for child in root['children']] == ['main.py']
+
+
+def test_explain_code_rejects_file_outside_allowed_root(nested_repo, monkeypatch):
+    import app as backend
+
+    _, sub = nested_repo
+    monkeypatch.setattr(backend, 'LOCAL_REPO_ROOTS', [str(sub)])
+    response = backend.app.test_client().post('/api/explain-code', json={'repo_path': str(sub), 'file_path': '../secret.py'})
+    assert response.status_code == 404
@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from stages import Stage, mark_incomplete, run_stage_graph
+
+
+def run(stages):
+    statuses = {}
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = run_stage_graph(stages, executor,
+                                  report=lambda name, status, value: statuses.__setitem__(name, status))
+    return results, statuses
+
+
+def partial(deps):
+    mark_incomplete("2 个文件下载失败")
+    return {'links': [1]}
+
+
+def test_incomplete_stage_keeps_partial_result_but_is_degraded():
+    results, statuses = run([
+        Stage('tree', lambda deps: 'tree'),
+        Stage('deps', partial, deps=['tree'], fallback=lambda deps: {'links': []}),
+        Stage('quality', lambda deps: {'files': 1}, deps=['tree']),
+    ])
+    assert results['deps'] == {'links': [1]}
+    assert statuses == {'tree': 'done', 'deps': 'fallback', 'quality': 'done'}
+
+
+def test_stage_error_uses_fallback():
+    def fail(deps):
+        raise TimeoutError("下载超时")
+
+    results, statuses = run([Stage('deps', fail, fallback=lambda deps: {'links': []})])
+    assert results['deps'] == {'links': []}
+    assert statuses['deps'] == 'fallback'
+
+
+def test_mark_incomplete_outside_stage_is_ignored():
+    mark_incomplete("不在阶段中")